@@ -3,68 +3,129 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 import os
-from werkzeug.security import generate_password_hash
-
-app = Flask(__name__)
-
-# CORS Configuration
-CORS(app, 
-    resources={
-        r"/*": {  # Allow CORS for all routes
-            "origins": ["http://localhost:3000"],
-            "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"],
-            "expose_headers": ["Content-Type", "Authorization"],
-            "supports_credentials": True,
-            "max_age": 3600  # Cache preflight requests for 1 hour
+import click
+from flask.cli import with_appcontext
+from json_provider import OrjsonProvider
+
+db = SQLAlchemy()
+jwt = JWTManager()
+
+def create_app(config=None):
+    """Application factory.
+
+    Building the app does not touch the database, so workers can boot while
+    Postgres is still starting. Seed data is handled by ``flask create-admin``.
+    """
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+
+    # CORS Configuration
+    CORS(app,
+        resources={
+            r"/*": {  # Allow CORS for all routes
+                "origins": ["http://localhost:3000"],
+                "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+                "allow_headers": ["Content-Type", "Authorization", "Cache-Control"],
+                "expose_headers": ["Content-Type", "Authorization", "Content-Disposition"],
+                "supports_credentials": True,
+                "max_age": 3600  # Cache preflight requests for 1 hour
+            }
         }
-    }
-)
+    )
+
+    # Database Configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://user:password@db:5432/library_db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-# Database Configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'postgresql://user:password@db:5432/library_db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # JWT Configuration
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key')
 
-# JWT Configuration
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key')
-jwt = JWTManager(app)
+    if config:
+        app.config.update(config)
 
-db = SQLAlchemy(app)
+    import metrics
+    import slow_queries
+    import profiling
+    import sql_comments
+    import circulation
+    import expiry
+    import backup
+    import retention
+    import library
+    metrics.init_app(app)
+    slow_queries.init_app(app)
+    profiling.init_app(app)
+    sql_comments.init_app(app)
+    circulation.init_app(app)
+    expiry.init_app(app)
+    backup.init_app(app)
+    retention.init_app(app)
+    library.init_app(app)
 
-# Import routes and models
-from routes import *
-from models import *
-from auth_routes import *
+    db.init_app(app)
+    jwt.init_app(app)
+
+    # Import routes and models
+    import models  # noqa: F401
+    from routes import api
+    from auth_routes import auth
+    from monitoring_routes import monitoring
+    app.register_blueprint(api)
+    app.register_blueprint(auth)
+    app.register_blueprint(monitoring)
+
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(create_admin_command)
+
+    return app
 
 # Create tables if they don't exist
 def init_db():
-    with app.app_context():
-        db.create_all()
-
-# Add this after creating the app but before running it
-def create_admin_if_not_exists():
-    try:
-        query = "SELECT COUNT(*) FROM users WHERE username = 'admin'"
-        result = db.session.execute(query).scalar()
-        
-        if result == 0:
-            insert_query = """
-                INSERT INTO users (username, email, password_hash, role)
-                VALUES (:username, :email, :password_hash, 'admin')
-            """
-            db.session.execute(insert_query, {
-                'username': 'admin',
-                'email': 'admin@library.com',
-                'password_hash': generate_password_hash('admin')
-            })
-            db.session.commit()
-            print("Admin user created successfully")
-    except Exception as e:
-        print(f"Error creating admin user: {e}")
-
-# Add this line after db initialization
-create_admin_if_not_exists()
+    db.create_all()
 
-if __name__ == '__main__':
+def create_admin_if_not_exists(password='admin'):
+    from werkzeug.security import generate_password_hash
+
+    query = "SELECT COUNT(*) FROM users WHERE username = 'admin'"
+    result = db.session.execute(query).scalar()
+
+    if result == 0:
+        insert_query = """
+            INSERT INTO users (username, email, password_hash, role)
+            VALUES (:username, :email, :password_hash, 'admin')
+        """
+        db.session.execute(insert_query, {
+            'username': 'admin',
+            'email': 'admin@library.com',
+            'password_hash': generate_password_hash(password)
+        })
+        db.session.commit()
+        return True
+    return False
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create tables that do not exist yet."""
     init_db()
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    click.echo('Database initialized')
+
+@click.command('create-admin')
+@click.option('--password', envvar='ADMIN_PASSWORD', default='admin', show_default=True)
+@with_appcontext
+def create_admin_command(password):
+    """Seed the default admin user (one-shot, idempotent)."""
+    if create_admin_if_not_exists(password):
+        click.echo('Admin user created successfully')
+    else:
+        click.echo('Admin user already exists')
+
+if __name__ == '__main__':
+    # Import through the module name so routes and models share this ``db``
+    from app import create_app, init_db, create_admin_if_not_exists
+
+    app = create_app()
+    with app.app_context():
+        init_db()
+        create_admin_if_not_exists()
+    app.run(host='0.0.0.0', port=5000, debug=True)
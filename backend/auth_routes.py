@@ -1,11 +1,15 @@
-from flask import jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app
 from flask_cors import cross_origin
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
-from app import app, db
+from app import db
 from models import User, Reader, Loan
+from retention import history_source
+from search import keyset_cursor, parse_cursor, search_page, search_params
 from werkzeug.security import check_password_hash, generate_password_hash
 
-@app.route('/api/auth/register', methods=['POST', 'OPTIONS'])
+auth = Blueprint('auth', __name__)
+
+@auth.route('/api/auth/register', methods=['POST', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 def register():
     if request.method == 'OPTIONS':
@@ -46,7 +50,7 @@ def register():
         current_app.logger.error(f"Error registering user: {str(e)}")
         return jsonify({'error': 'Failed to register user'}), 500
 
-@app.route('/api/auth/login', methods=['POST', 'OPTIONS'])
+@auth.route('/api/auth/login', methods=['POST', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 def login():
     if request.method == 'OPTIONS':
@@ -66,7 +70,7 @@ def login():
     )
     return jsonify({'token': access_token, 'role': user.role}), 200
 
-@app.route('/api/users', methods=['GET', 'OPTIONS'])
+@auth.route('/api/users', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def get_users():
@@ -77,17 +81,25 @@ def get_users():
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
-        # Simplified users query
-        query = "SELECT id, username, email, role FROM users ORDER BY username"
-        result = db.session.execute(query)
-        users = [dict(row) for row in result]
-        return jsonify(users)
+        query = """
+            SELECT id, username, email, role
+            FROM users
+            WHERE :q = ''
+            OR LOWER(email) = LOWER(:q)
+            OR username ILIKE :pattern
+            OR email ILIKE :pattern
+            ORDER BY username
+            LIMIT :limit OFFSET :offset
+        """
+        params = search_params()
+        rows = db.session.execute(query, params).fetchall()
+        return jsonify(search_page('users', rows, params))
         
     except Exception as e:
         current_app.logger.error(f"Error fetching users: {str(e)}")
         return jsonify({'error': 'Failed to fetch users'}), 500
 
-@app.route('/api/users/<int:user_id>/promote', methods=['POST', 'OPTIONS'])
+@auth.route('/api/users/<int:user_id>/promote', methods=['POST', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def promote_user(user_id):
@@ -108,7 +120,7 @@ def promote_user(user_id):
     
     return jsonify({'message': 'User role updated successfully'})
 
-@app.route('/api/users/<int:user_id>', methods=['DELETE', 'OPTIONS'])
+@auth.route('/api/users/<int:user_id>', methods=['DELETE', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def delete_user(user_id):
@@ -122,12 +134,28 @@ def delete_user(user_id):
     if user.role == 'admin':
         return jsonify({'error': 'Cannot delete admin users'}), 400
     
-    db.session.delete(user)
+    # Detach the reader profile and registration requests in the same
+    # statement as the delete, instead of letting the ORM load every backref
+    # just to null their foreign keys
+    delete_query = """
+        WITH detached_reader AS (
+            UPDATE readers SET user_id = NULL
+            WHERE user_id = :user_id
+        ),
+        detached_requests AS (
+            UPDATE reader_registration_requests
+            SET user_id = CASE WHEN user_id = :user_id THEN NULL ELSE user_id END,
+                processed_by = CASE WHEN processed_by = :user_id THEN NULL ELSE processed_by END
+            WHERE user_id = :user_id OR processed_by = :user_id
+        )
+        DELETE FROM users WHERE id = :user_id
+    """
+    db.session.execute(delete_query, {'user_id': user_id})
     db.session.commit()
     
     return jsonify({'message': 'User deleted successfully'})
 
-@app.route('/api/users/<int:user_id>/details', methods=['GET', 'OPTIONS'])
+@auth.route('/api/users/<int:user_id>/details', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def get_user_details(user_id):
@@ -138,11 +166,33 @@ def get_user_details(user_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
-        # Combined user and reader details in one query
+        # Loan counts come precomputed from reader_summary; the full history
+        # is paged separately from /api/users/<id>/loans. Overdue depends on
+        # today's date, so it is counted here over the reader's active loans.
         user_query = """
-            SELECT u.*, r.card_number, r.registration_date
+            SELECT u.id, u.username, u.email, u.role, u.created_at,
+                   r.card_number, r.registration_date,
+                   s.total_loans, s.active_loans, s.last_activity,
+                   o.overdue_loans
             FROM users u
             LEFT JOIN readers r ON u.id = r.user_id
+            LEFT JOIN reader_summary s ON r.id = s.id
+            LEFT JOIN LATERAL (
+                -- Each loan is due when the reservation it was checked out
+                -- against ends, not when an older booking of the same title did
+                SELECT COUNT(*) as overdue_loans
+                FROM loans l
+                WHERE l.reader_id = r.id
+                AND l.status = 'borrowed'
+                AND EXISTS (
+                    SELECT 1 FROM reservations res
+                    WHERE res.copy_id = l.copy_id
+                    AND res.reader_id = l.reader_id
+                    AND res.status = 'completed'
+                    AND CAST(l.loan_date AS date) BETWEEN res.start_date AND res.end_date
+                    AND res.end_date < CURRENT_DATE
+                )
+            ) o ON r.id IS NOT NULL
             WHERE u.id = :user_id
         """
         user = db.session.execute(user_query, {'user_id': user_id}).first()
@@ -150,37 +200,73 @@ def get_user_details(user_id):
         if not user:
             return jsonify({'error': 'User not found'}), 404
 
-        # Simplified loan history query
-        loans_query = """
-            SELECT b.title, l.loan_date, l.return_date, l.status
-            FROM loans l
-            JOIN books b ON l.book_id = b.id
-            JOIN readers r ON l.reader_id = r.id
-            WHERE r.user_id = :user_id
-            ORDER BY l.loan_date DESC
-        """
-        loans = db.session.execute(loans_query, {'user_id': user_id})
-        
-        loan_history = [{
-            'book_title': loan.title,
-            'loan_date': loan.loan_date.isoformat(),
-            'return_date': loan.return_date.isoformat() if loan.return_date else None,
-            'status': loan.status
-        } for loan in loans]
-        
         return jsonify({
             'id': user.id,
             'username': user.username,
             'email': user.email,
             'role': user.role,
-            'created_at': user.created_at.isoformat(),
+            'created_at': user.created_at,
             'reader_profile': {
                 'card_number': user.card_number,
-                'registration_date': user.registration_date.isoformat() if user.registration_date else None
+                'registration_date': user.registration_date
             } if user.card_number else None,
-            'loan_history': loan_history
+            'loan_stats': {
+                'total_loans': user.total_loans or 0,
+                'active_loans': user.active_loans or 0,
+                'overdue_loans': user.overdue_loans or 0,
+                'last_activity': user.last_activity
+            } if user.card_number else None
         })
 
     except Exception as e:
         current_app.logger.error(f"Error fetching user details: {str(e)}")
         return jsonify({'error': 'Failed to fetch user details'}), 500
+
+@auth.route('/api/users/<int:user_id>/loans', methods=['GET', 'OPTIONS'])
+@cross_origin(supports_credentials=True)
+@jwt_required()
+def get_user_loans(user_id):
+    if request.method == 'OPTIONS':
+        return '', 200
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    per_page = 20
+    try:
+        after, after_id = parse_cursor()
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    try:
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        loans = history_source('loans', 'id, book_id, reader_id, loan_date, return_date, status', include_archived)
+
+        # Walks idx_loans_reader_history backwards from the cursor
+        query = f"""
+            SELECT l.id, b.title as book_title, l.loan_date, l.return_date, l.status
+            FROM {loans} l
+            JOIN books b ON l.book_id = b.id
+            WHERE l.reader_id = (SELECT id FROM readers WHERE user_id = :user_id)
+            AND (CAST(:after AS timestamp) IS NULL OR (l.loan_date, l.id) < (CAST(:after AS timestamp), :after_id))
+            ORDER BY l.loan_date DESC, l.id DESC
+            LIMIT :limit
+        """
+        rows = db.session.execute(query, {
+            'user_id': user_id,
+            'after': after,
+            'after_id': after_id,
+            'limit': per_page + 1
+        }).fetchall()
+
+        loans = [dict(row) for row in rows[:per_page]]
+        has_next = len(rows) > per_page
+        return jsonify({
+            'loans': loans,
+            'has_next': has_next,
+            'next_cursor': keyset_cursor(loans[-1], 'loan_date') if has_next else None,
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching user loans: {str(e)}")
+        return jsonify({'error': 'Failed to fetch user loans'}), 500
@@ -0,0 +1,411 @@
+"""Streaming ``pg_dump`` for the admin backup download.
+
+By default pg_dump writes a compressed custom-format archive (``-Fc -Z``) to
+its stdout and the response forwards it to the client chunk by chunk, so
+nothing is staged on the backend's disk and the download starts as soon as
+pg_dump has produced its first bytes. Restore it with ``pg_restore``, which
+can itself run in parallel with ``--jobs``.
+
+pg_dump only dumps in parallel (``--jobs``) in directory format, and a
+directory cannot be written to a pipe. ``format=directory`` therefore dumps
+into ``BACKUP_STAGING_DIR`` and then streams that directory as a tar of the
+already-compressed table files, removing the staging copy when the download
+ends. It is only offered when a staging directory is configured.
+
+Progress goes to the application log: pg_dump's ``--verbose`` output (a line
+per table) and the bytes sent so far every ``BACKUP_PROGRESS_BYTES``.
+
+Restores go the other way with ``pg_restore --jobs``, from an upload
+(``POST /api/admin/database/restore``, run on a background thread) or from
+``flask restore-database``. A single parallel pg_restore run already loads
+every table before it builds indexes, constraints and triggers, so those are
+created once over the full data instead of being maintained row by row.
+pg_restore needs a seekable archive for ``--jobs``, so uploads are saved
+under the staging directory first. Per-item progress and timings are kept in
+a ``status.json`` next to the archive rather than in the database being
+restored, so any worker can answer a status poll.
+"""
+import fcntl
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from metrics import BACKUP_BYTES
+
+FORMATS = ('custom', 'directory')
+CHUNK_SIZE = 64 * 1024
+# application_name of pg_dump/pg_restore sessions; /api/sync leaves their
+# long transactions out of its horizon
+APPLICATION_NAME = 'library-backup'
+
+
+class BackupError(Exception):
+    """pg_dump (or tar) could not produce the backup."""
+
+
+class RestoreInProgress(Exception):
+    """Another restore already holds the staging directory's restore lock."""
+
+
+class _Process:
+    """A child process whose stderr is drained and logged on a side thread.
+
+    pg_dump ``--verbose`` writes far more than a pipe buffer holds, so stderr
+    has to be read concurrently with stdout or the dump would stall.
+    """
+
+    def __init__(self, command, env, logger, stdout=subprocess.PIPE, on_line=None):
+        self.name = command[0]
+        self.logger = logger
+        self.on_line = on_line
+        self.tail = deque(maxlen=20)
+        self.popen = subprocess.Popen(command, stdout=stdout, stderr=subprocess.PIPE, env=env)
+        self.reader = threading.Thread(target=self._drain, daemon=True)
+        self.reader.start()
+
+    def _drain(self):
+        for line in iter(self.popen.stderr.readline, b''):
+            line = line.decode(errors='replace').rstrip()
+            self.tail.append(line)
+            self.logger.info(f"{self.name}: {line}")
+            if self.on_line:
+                self.on_line(line)
+
+    def wait(self):
+        returncode = self.popen.wait()
+        self.reader.join(timeout=5)
+        if returncode != 0:
+            raise BackupError(f"{self.name} exited with {returncode}: " + ' | '.join(self.tail))
+
+    def kill(self):
+        if self.popen.poll() is None:
+            self.popen.kill()
+            self.popen.wait()
+
+
+def _connection():
+    db_name = os.getenv('POSTGRES_DB', 'library')
+    db_user = os.getenv('POSTGRES_USER', 'postgres')
+    db_host = os.getenv('POSTGRES_HOST', 'db')
+    db_password = os.getenv('POSTGRES_PASSWORD')
+
+    if not all([db_name, db_user, db_host, db_password]):
+        raise BackupError("Missing database configuration")
+
+    args = ['-h', db_host, '-U', db_user, '-d', db_name]
+    return args, {**os.environ, 'PGPASSWORD': db_password, 'PGAPPNAME': APPLICATION_NAME}
+
+
+def _stream(process, first, filename, fmt, logger, progress_every, cleanup=None):
+    sent = 0
+    reported = 0
+    chunk = first
+    try:
+        while chunk:
+            sent += len(chunk)
+            BACKUP_BYTES.labels(fmt).inc(len(chunk))
+            if sent - reported >= progress_every:
+                logger.info(f"Backup {filename}: {sent} bytes sent")
+                reported = sent
+            yield chunk
+            chunk = process.popen.stdout.read1(CHUNK_SIZE)
+        # Raising here drops the connection before the final chunk, so the
+        # client sees a failed download rather than a silently short archive
+        process.wait()
+        logger.info(f"Backup {filename} finished: {sent} bytes")
+    except BackupError as e:
+        logger.error(f"Backup {filename} failed after {sent} bytes: {str(e)}")
+        raise
+    finally:
+        # Also runs when the client disconnects and the response is closed
+        process.kill()
+        if cleanup:
+            cleanup()
+
+
+def _start(process, filename, fmt, logger, progress_every, cleanup=None):
+    # Wait for the first bytes so that a dump which fails straight away (bad
+    # credentials, unreachable host) is still reported as an error response
+    try:
+        first = process.popen.stdout.read1(CHUNK_SIZE)
+        if not first:
+            process.wait()
+            raise BackupError(f"{process.name} produced no output")
+    except BaseException:
+        process.kill()
+        if cleanup:
+            cleanup()
+        raise
+    return _stream(process, first, filename, fmt, logger, progress_every, cleanup)
+
+
+def start_backup(fmt='custom', compress=None, jobs=1):
+    """Start a dump and return ``(filename, mimetype, chunks)``.
+
+    ``chunks`` is a generator to hand to a streaming response; closing it
+    stops pg_dump. Raises ValueError for a format this server does not offer
+    and :class:`BackupError` if the dump cannot start.
+    """
+    config = current_app.config
+    logger = current_app.logger
+    progress_every = config['BACKUP_PROGRESS_BYTES']
+    compress = config['BACKUP_COMPRESSION'] if compress is None else min(max(compress, 0), 9)
+    jobs = min(max(jobs, 1), config['BACKUP_MAX_JOBS'])
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    staging_root = config['BACKUP_STAGING_DIR']
+    if fmt == 'directory' and not staging_root:
+        raise ValueError("Directory-format backups need BACKUP_STAGING_DIR")
+
+    connection, env = _connection()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+    if fmt == 'custom':
+        filename = f'library_backup_{timestamp}.dump'
+        command = ['pg_dump', '--verbose', '--format=custom', f'--compress={compress}'] + connection
+        process = _Process(command, env, logger)
+        return filename, 'application/octet-stream', _start(process, filename, fmt, logger, progress_every)
+
+    filename = f'library_backup_{timestamp}.tar'
+    staging = tempfile.mkdtemp(prefix='library_backup_', dir=staging_root)
+
+    def cleanup():
+        shutil.rmtree(staging, ignore_errors=True)
+
+    try:
+        command = ['pg_dump', '--verbose', '--format=directory', f'--compress={compress}',
+                   f'--jobs={jobs}', '--file', os.path.join(staging, 'dump')] + connection
+        dump = _Process(command, env, logger, stdout=subprocess.DEVNULL)
+        try:
+            dump.wait()
+        finally:
+            dump.kill()
+        logger.info(f"Backup {filename}: pg_dump finished with {jobs} jobs, streaming archive")
+        process = _Process(['tar', '-C', staging, '-cf', '-', 'dump'], env, logger)
+    except BaseException:
+        cleanup()
+        raise
+    return filename, 'application/x-tar', _start(process, filename, fmt, logger, progress_every, cleanup)
+
+
+_LAUNCHING = re.compile(r'launching item (\d+) (.+)$')
+_FINISHED = re.compile(r'finished item (\d+) ')
+# Serially restored items (all of them without --jobs, the pre-data ones
+# with it) are only announced when they start; each ends when the next begins
+_SERIAL = re.compile(r'(?:processing data for table|creating (\S+(?: \S+)?)) "(.+)"$')
+
+
+class RestoreProgress:
+    """Per-item timings of one pg_restore run, saved to ``status.json``."""
+
+    def __init__(self, job_dir, job_id, filename, jobs, echo=None):
+        self.path = os.path.join(job_dir, 'status.json')
+        self.echo = echo
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.running = {}
+        self.serial = None
+        self.parallel = False
+        self.state = {
+            'id': job_id,
+            'status': 'running',
+            'filename': filename,
+            'jobs': jobs,
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'elapsed_seconds': 0,
+            'error': None,
+            'running': [],
+            'finished': [],
+        }
+        self.save()
+
+    def _start(self, key, item, now):
+        self.running[key] = (item, now)
+
+    def _finish(self, key, now):
+        item, started = self.running.pop(key)
+        seconds = round(now - started, 3)
+        self.state['finished'].append({'item': item, 'seconds': seconds})
+        if self.echo:
+            self.echo(f'{item}: {seconds:.1f}s')
+
+    def line(self, line):
+        now = time.monotonic()
+        with self.lock:
+            launching = _LAUNCHING.search(line)
+            finished = _FINISHED.search(line)
+            serial = _SERIAL.search(line)
+            if launching:
+                if not self.parallel and self.serial in self.running:
+                    self._finish(self.serial, now)
+                self.parallel = True
+                self._start(launching.group(1), launching.group(2), now)
+            elif finished and finished.group(1) in self.running:
+                self._finish(finished.group(1), now)
+            elif serial and not self.parallel:
+                if self.serial in self.running:
+                    self._finish(self.serial, now)
+                self.serial = f'serial:{len(self.state["finished"])}'
+                self._start(self.serial, f'{serial.group(1) or "TABLE DATA"} {serial.group(2)}', now)
+            else:
+                return
+            self.save()
+
+    def finish(self, error=None):
+        now = time.monotonic()
+        with self.lock:
+            if self.serial in self.running:
+                self._finish(self.serial, now)
+            self.state['status'] = 'failed' if error else 'completed'
+            self.state['error'] = error
+            self.state['finished_at'] = datetime.now().isoformat()
+            self.save()
+
+    def save(self):
+        self.state['elapsed_seconds'] = round(time.monotonic() - self.started, 3)
+        self.state['running'] = [item for item, _ in self.running.values()]
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp, self.path)
+
+
+def _staging_root():
+    return current_app.config['BACKUP_STAGING_DIR'] or tempfile.gettempdir()
+
+
+def _lock_restores(root):
+    # flock is dropped by the kernel if the worker dies, so a crashed restore
+    # cannot leave a stale lock behind
+    fd = os.open(os.path.join(root, 'restore.lock'), os.O_CREAT | os.O_RDWR)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        raise RestoreInProgress("A restore is already running")
+    return fd
+
+
+def _new_job(root, filename, jobs, echo=None):
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(root, f'restore_{job_id}')
+    os.makedirs(job_dir)
+    return job_dir, RestoreProgress(job_dir, job_id, filename, jobs, echo)
+
+
+def restore_database(path, jobs, progress, logger):
+    """Restore the custom-format archive at ``path`` over the current database.
+
+    Existing objects are dropped first (``--clean --if-exists``). Raises
+    :class:`BackupError` if pg_restore fails; ``progress`` records the
+    outcome either way.
+    """
+    try:
+        connection, env = _connection()
+        command = ['pg_restore', '--verbose', f'--jobs={jobs}', '--clean', '--if-exists',
+                   '--no-owner'] + connection + [path]
+        process = _Process(command, env, logger, stdout=subprocess.DEVNULL, on_line=progress.line)
+        try:
+            process.wait()
+        finally:
+            process.kill()
+    except Exception as e:
+        progress.finish(str(e))
+        raise
+    progress.finish()
+    logger.info(f"Restore {progress.state['id']} finished in {progress.state['elapsed_seconds']}s")
+
+
+def _run_restore_job(dump_path, jobs, progress, logger, lock):
+    try:
+        restore_database(dump_path, jobs, progress, logger)
+    except Exception as e:
+        logger.error(f"Restore {progress.state['id']} failed: {str(e)}")
+    finally:
+        try:
+            os.remove(dump_path)
+        finally:
+            os.close(lock)
+
+
+def start_restore(upload, jobs=None):
+    """Save an uploaded archive and restore it on a background thread.
+
+    Returns the job id for :func:`restore_status`. Raises ValueError if the
+    upload is not a custom-format archive and :class:`RestoreInProgress` if
+    another restore is running.
+    """
+    config = current_app.config
+    logger = current_app.logger
+    jobs = min(max(jobs or config['BACKUP_MAX_JOBS'], 1), config['BACKUP_MAX_JOBS'])
+    if upload.stream.read(5) != b'PGDMP':
+        raise ValueError("Expected a custom-format pg_dump archive")
+    upload.stream.seek(0)
+
+    root = _staging_root()
+    lock = _lock_restores(root)
+    try:
+        job_dir, progress = _new_job(root, upload.filename, jobs)
+        dump_path = os.path.join(job_dir, 'library.dump')
+        upload.save(dump_path)
+        threading.Thread(
+            target=_run_restore_job, args=(dump_path, jobs, progress, logger, lock), daemon=True
+        ).start()
+    except BaseException:
+        os.close(lock)
+        raise
+    return progress.state['id']
+
+
+def restore_status(job_id):
+    """The saved progress of a restore, or None for an unknown job id."""
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return None
+    try:
+        with open(os.path.join(_staging_root(), f'restore_{job_id}', 'status.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+@click.command('restore-database')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--jobs', type=int, help='Parallel pg_restore jobs (default BACKUP_MAX_JOBS).')
+@with_appcontext
+def restore_database_command(path, jobs):
+    """Restore a custom-format backup over the configured database."""
+    jobs = max(jobs or current_app.config['BACKUP_MAX_JOBS'], 1)
+    root = _staging_root()
+    lock = _lock_restores(root)
+    try:
+        _, progress = _new_job(root, os.path.basename(path), jobs, echo=click.echo)
+        click.echo(f"Restoring {path} with {jobs} jobs (status: restore_{progress.state['id']})")
+        restore_database(path, jobs, progress, current_app.logger)
+    finally:
+        os.close(lock)
+
+    slowest = sorted(progress.state['finished'], key=lambda entry: entry['seconds'], reverse=True)[:10]
+    click.echo(f"Restored in {progress.state['elapsed_seconds']:.1f}s; slowest items:")
+    for entry in slowest:
+        click.echo(f"  {entry['seconds']:8.1f}s  {entry['item']}")
+
+
+def init_app(app):
+    app.config.setdefault('BACKUP_COMPRESSION', int(os.environ.get('BACKUP_COMPRESSION', 6)))
+    app.config.setdefault('BACKUP_MAX_JOBS', int(os.environ.get('BACKUP_MAX_JOBS', 4)))
+    app.config.setdefault('BACKUP_PROGRESS_BYTES', int(os.environ.get('BACKUP_PROGRESS_BYTES', 64 * 1024 * 1024)))
+    app.config.setdefault('BACKUP_STAGING_DIR', os.environ.get('BACKUP_STAGING_DIR'))
+    app.cli.add_command(restore_database_command)
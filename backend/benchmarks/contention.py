@@ -0,0 +1,332 @@
+"""Concurrency stress harness for the circulation write paths.
+
+Each round resets a handful of hot books to a known state: every copy of a
+hot book is on loan, and a waiting reader holds a pending reservation on the
+first copy covering today. The harness then fires a burst at them at once, through the
+real views (``return_book``, ``create_loan``, ``create_reservation`` and
+``admin_create_reservation``) on a thread pool:
+
+* a few desks return the first copy's loan;
+* several desks check the book out to the waiting reader;
+* readers and staff race to book the same later window.
+
+Once the burst settles, these invariants are checked:
+
+* no copy has more than one borrowed loan;
+* no two non-cancelled reservations of a copy overlap;
+* a copy is 'borrowed' exactly when it has a borrowed loan;
+* ``books.available_copies`` matches the copies on the shelf.
+
+The report covers throughput, latency, the HTTP statuses of each operation,
+the database errors seen (deadlocks, serialization failures, lock timeouts)
+and the invariant violations per round.
+
+Requests run in-process through the Flask test client, so database errors
+can be classified by SQLSTATE, even though the views turn them into 500s.
+The harness rewrites loans and reservations of the hot books, so point
+DATABASE_URL at a disposable dataset (``benchmarks.datagen``).
+
+Usage (from the backend directory):
+
+    python -m benchmarks.contention --rounds 50 --hot-books 4 --concurrency 32 --output contention.json
+    python -m benchmarks.contention --locking none --output contention-unlocked.json
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+from benchmarks.http_load import git_revision, percentile
+
+SQLSTATES = {
+    '40P01': 'deadlock_detected',
+    '40001': 'serialization_failure',
+    '55P03': 'lock_not_available',
+    '57014': 'query_canceled',
+    '23505': 'unique_violation',
+}
+
+INVARIANTS = """
+    SELECT
+        (SELECT COUNT(*) FROM (
+            SELECT copy_id FROM loans
+            WHERE status = 'borrowed' AND book_id = ANY(:books)
+            GROUP BY copy_id HAVING COUNT(*) > 1
+        ) doubled) AS double_loans,
+        (SELECT COUNT(*)
+            FROM reservations a
+            JOIN reservations b ON a.copy_id = b.copy_id AND a.id < b.id
+            WHERE a.book_id = ANY(:books)
+            AND a.status NOT IN ('cancelled', 'expired') AND b.status NOT IN ('cancelled', 'expired')
+            AND a.start_date <= b.end_date AND a.end_date >= b.start_date
+        ) AS overlapping_reservations,
+        (SELECT COUNT(*) FROM book_copies c
+            WHERE c.book_id = ANY(:books)
+            AND (c.status = 'borrowed') != EXISTS (
+                SELECT 1 FROM loans l WHERE l.copy_id = c.id AND l.status = 'borrowed'
+            )
+        ) AS status_mismatches,
+        (SELECT COUNT(*) FROM books b
+            WHERE b.id = ANY(:books)
+            AND b.available_copies != (
+                SELECT COUNT(*) FROM book_copies c WHERE c.book_id = b.id AND c.status = 'available'
+            )
+        ) AS count_mismatches
+"""
+
+
+class ErrorCounter:
+    """Counts database errors by SQLSTATE through the engine's handle_error event."""
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, context):
+        code = getattr(context.original_exception, 'pgcode', None)
+        with self.lock:
+            self.counts[SQLSTATES.get(code, code or 'other')] += 1
+
+
+class Results:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def record(self, operation, elapsed, status):
+        with self.lock:
+            self.latencies[operation].append(elapsed)
+            self.statuses[operation][status] += 1
+
+    def summary(self, wall_seconds):
+        operations = {}
+        for name, values in sorted(self.latencies.items()):
+            values.sort()
+            operations[name] = {
+                'count': len(values),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'mean_ms': round(statistics.fmean(values) * 1000, 2),
+                'statuses': {str(k): v for k, v in sorted(self.statuses[name].items())},
+            }
+        total = sum(op['count'] for op in operations.values())
+        return {
+            'operations_total': total,
+            'throughput_ops': round(total / wall_seconds, 2) if wall_seconds else None,
+            'operations': operations,
+        }
+
+
+class Harness:
+    def __init__(self, app, args):
+        from flask_jwt_extended import create_access_token
+        from app import db
+
+        self.app = app
+        self.args = args
+        self.db = db
+        self.rng = random.Random(args.seed)
+        self.local = threading.local()
+
+        with app.app_context():
+            worker = db.session.execute(
+                "SELECT id FROM users WHERE role IN ('worker', 'admin') ORDER BY role = 'worker' DESC, id LIMIT 1"
+            ).scalar()
+            admin = db.session.execute("SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1").scalar()
+            readers = db.session.execute(
+                "SELECT id, user_id FROM readers WHERE user_id IS NOT NULL ORDER BY id LIMIT :limit",
+                {'limit': args.readers}
+            ).fetchall()
+            books = [row.id for row in db.session.execute(
+                'SELECT id FROM books WHERE total_copies > 0 ORDER BY id LIMIT 10000'
+            )]
+            db.session.remove()
+            if not worker or not admin or len(readers) < 3 or len(books) < args.hot_books:
+                raise SystemExit('Not enough users, readers or books; load a dataset with benchmarks.datagen first')
+
+            def header(user_id, role):
+                token = create_access_token(identity=str(user_id), additional_claims={'role': role})
+                return {'Authorization': f'Bearer {token}'}
+
+            self.worker_headers = header(worker, 'worker')
+            self.admin_headers = header(admin, 'admin')
+            self.readers = [(row.id, header(row.user_id, 'user')) for row in readers]
+
+        self.hot_books = self.rng.sample(books, args.hot_books)
+
+    def client(self):
+        if not hasattr(self.local, 'client'):
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def reset(self):
+        """Put every copy of the hot books on loan, with a pending reservation for the next reader.
+
+        Only the first copy's loan is returned during the burst, so checkouts
+        race for a single copy however many the title has.
+        """
+        today = date.today()
+        plan = {}
+        with self.app.app_context():
+            with self.db.session.begin():
+                self.db.session.execute("""
+                    UPDATE loans SET status = 'returned', return_date = CURRENT_TIMESTAMP
+                    WHERE book_id = ANY(:books) AND status = 'borrowed'
+                """, {'books': self.hot_books})
+                self.db.session.execute("""
+                    UPDATE reservations SET status = 'cancelled'
+                    WHERE book_id = ANY(:books) AND status != 'cancelled'
+                """, {'books': self.hot_books})
+                self.db.session.execute("""
+                    UPDATE book_copies SET status = 'borrowed'
+                    WHERE book_id = ANY(:books) AND status = 'available'
+                """, {'books': self.hot_books})
+                for book_id in self.hot_books:
+                    copy_ids = [row.id for row in self.db.session.execute(
+                        "SELECT id FROM book_copies WHERE book_id = :book_id AND status = 'borrowed' ORDER BY id",
+                        {'book_id': book_id}
+                    )]
+                    waiting = self.rng.choice(self.readers)[0]
+                    loan_ids = [self.db.session.execute("""
+                        INSERT INTO loans (book_id, copy_id, reader_id, loan_date, status)
+                        VALUES (:book_id, :copy_id, :reader_id, CURRENT_TIMESTAMP - INTERVAL '7 days', 'borrowed')
+                        RETURNING id
+                    """, {'book_id': book_id, 'copy_id': copy_id,
+                          'reader_id': self.rng.choice(self.readers)[0]}).scalar() for copy_id in copy_ids]
+                    self.db.session.execute("""
+                        INSERT INTO reservations (book_id, copy_id, reader_id, start_date, end_date, status)
+                        VALUES (:book_id, :copy_id, :reader_id, :start_date, :end_date, 'pending')
+                    """, {'book_id': book_id, 'copy_id': copy_ids[0], 'reader_id': waiting,
+                          'start_date': today, 'end_date': today + timedelta(days=14)})
+                    plan[book_id] = (loan_ids[0], waiting)
+            self.db.session.remove()
+        return plan
+
+    def check(self):
+        with self.app.app_context():
+            row = self.db.session.execute(INVARIANTS, {'books': self.hot_books}).first()
+            self.db.session.remove()
+        return dict(row)
+
+    def burst(self, plan):
+        """Operations for one round; returns come first so checkouts race the release."""
+        today = date.today()
+        returns, others = [], []
+        for book_id, (loan_id, waiting) in plan.items():
+            returns += [('return', ('POST', f'/api/loans/{loan_id}/return', self.worker_headers, None))] * self.args.returns
+            others += [('checkout', ('POST', '/api/loans', self.worker_headers,
+                                     {'book_id': book_id, 'reader_id': waiting}))] * self.args.checkouts
+            for i in range(self.args.reservations):
+                # Windows after the waiting reader's booking, overlapping each other
+                start = today + timedelta(days=15 + self.rng.randint(0, 5))
+                dates = {'book_id': book_id, 'start_date': start.isoformat(),
+                         'end_date': (start + timedelta(days=self.rng.randint(3, 10))).isoformat()}
+                reader_id, headers = self.rng.choice(self.readers)
+                if i % 2:
+                    others.append(('admin_reserve', ('POST', '/api/reservations/admin/create', self.admin_headers,
+                                                     dict(dates, reader_id=reader_id))))
+                else:
+                    others.append(('reserve', ('POST', '/api/reservations', headers, dates)))
+        self.rng.shuffle(others)
+        return returns + others
+
+    def execute(self, results, operation, request):
+        method, path, headers, body = request
+        started = time.perf_counter()
+        response = self.client().open(path, method=method, headers=headers, json=body)
+        results.record(operation, time.perf_counter() - started, response.status_code)
+
+
+def run(args):
+    from app import create_app, db
+
+    app = create_app({
+        'CIRCULATION_LOCK_MODE': args.locking,
+        'SLOW_QUERY_EXPLAIN': False,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': args.concurrency, 'max_overflow': 0},
+    })
+    harness = Harness(app, args)
+    errors = ErrorCounter()
+    results = Results()
+    rounds = []
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'handle_error', errors)
+
+    busy = 0.0
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for number in range(1, args.rounds + 1):
+                plan = harness.reset()
+                operations = harness.burst(plan)
+                started = time.perf_counter()
+                futures = [pool.submit(harness.execute, results, name, request) for name, request in operations]
+                for future in futures:
+                    future.result()
+                busy += time.perf_counter() - started
+                violations = harness.check()
+                rounds.append(dict(violations, round=number))
+                if any(violations.values()):
+                    print(f'round {number}: {violations}')
+    finally:
+        event.remove(engine, 'handle_error', errors)
+
+    totals = Counter()
+    for entry in rounds:
+        totals.update({k: v for k, v in entry.items() if k != 'round'})
+    return {
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'git_revision': git_revision(),
+        'parameters': {k: v for k, v in vars(args).items() if k != 'output'},
+        'hot_books': harness.hot_books,
+        'summary': results.summary(busy),
+        'database_errors': dict(errors.counts),
+        'invariant_violations': dict(totals),
+        'rounds_with_violations': sum(1 for entry in rounds if any(v for k, v in entry.items() if k != 'round')),
+        'rounds': rounds,
+    }
+
+
+def main(argv=None):
+    from circulation import LOCK_MODES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--locking', choices=LOCK_MODES, default='row', help='CIRCULATION_LOCK_MODE to run with')
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--hot-books', type=int, default=4, help='books every burst targets')
+    parser.add_argument('--concurrency', type=int, default=32, help='worker threads and pool connections')
+    parser.add_argument('--returns', type=int, default=2, help='concurrent returns per book per round')
+    parser.add_argument('--checkouts', type=int, default=8, help='concurrent checkouts per book per round')
+    parser.add_argument('--reservations', type=int, default=6, help='competing bookings per book per round')
+    parser.add_argument('--readers', type=int, default=200, help='reader accounts to draw from')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='contention_results.json')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    summary = results['summary']
+    print(f"{'operation':<16} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8}  statuses")
+    for name, stats in summary['operations'].items():
+        print(f"{name:<16} {stats['count']:>7} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+              f"{stats['p99_ms']:>8.1f}  {stats['statuses']}")
+    print(f"locking: {args.locking}, throughput: {summary['throughput_ops']} ops/s")
+    print(f"database errors: {results['database_errors'] or 'none'}")
+    print(f"invariant violations: {results['invariant_violations']} "
+          f"in {results['rounds_with_violations']} of {args.rounds} rounds")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+"""End-to-end HTTP benchmark for the hot endpoints.
+
+Drives a weighted mix of catalog browsing and search, reservation creation,
+checkout and return, reader dashboards and report generation against a
+running backend, then writes per-endpoint p50/p95/p99 latency and throughput
+to a JSON results file. Load a known dataset first (``benchmarks.datagen``),
+because the accounts it creates are the ones used here.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.http_load --concurrency 16 --duration 60 --output results.json
+    python -m benchmarks.http_load --output new.json --compare results.json --tolerance 0.15
+
+With ``--compare``, the run exits non-zero if an endpoint's p95 grew by more
+than the tolerance, or if its server error rate rose.
+"""
+import argparse
+import http.client
+import json
+import math
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_MIX = 'browse=30,search=20,available=10,my_books=10,reserve=10,checkout=8,return=7,report=5'
+SEARCH_WORDS = ('shadow', 'river', 'night', 'garden', 'winter', 'city', 'star', 'secret', 'lost', 'light')
+SEARCH_AUTHORS = ('nowak', 'smith', 'garcia', 'tanaka', 'kim', 'chen', 'patel', 'silva')
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[index]
+
+
+class Client:
+    """Keep-alive JSON client; one per worker thread."""
+
+    def __init__(self, base_url, recorder):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.recorder = recorder
+        self.conn = None
+
+    def _connection(self):
+        if self.conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self.conn = cls(self.host, self.port, timeout=120)
+        return self.conn
+
+    def request(self, method, path, label, token=None, body=None, params=None):
+        if params:
+            path = f'{path}?{urlencode(params)}'
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        started = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            raw = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.conn = None
+            if label:
+                self.recorder.record(label, time.perf_counter() - started, 599)
+            return 599, None
+        elapsed = time.perf_counter() - started
+        if label:
+            self.recorder.record(label, elapsed, status)
+
+        data = None
+        if raw and response.getheader('Content-Type', '').startswith('application/json'):
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                pass
+        return status, data
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+        self.active = False
+
+    def record(self, label, elapsed, status):
+        if not self.active:
+            return
+        with self.lock:
+            self.samples[label].append(elapsed)
+            self.statuses[label][status] += 1
+
+    def summary(self, wall_seconds):
+        endpoints = {}
+        for label, values in sorted(self.samples.items()):
+            values.sort()
+            statuses = dict(self.statuses[label])
+            server_errors = sum(count for status, count in statuses.items() if status >= 500)
+            endpoints[label] = {
+                'count': len(values),
+                'throughput_rps': round(len(values) / wall_seconds, 2),
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+                'mean_ms': round(statistics.fmean(values) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2),
+                'statuses': {str(k): v for k, v in sorted(statuses.items())},
+                'server_error_rate': round(server_errors / len(values), 4),
+            }
+        total = sum(e['count'] for e in endpoints.values())
+        return {
+            'requests': total,
+            'throughput_rps': round(total / wall_seconds, 2),
+            'endpoints': endpoints,
+        }
+
+
+class Workload:
+    def __init__(self, args, tokens, total_books):
+        self.args = args
+        self.tokens = tokens
+        self.total_books = max(total_books, 1)
+        self.pages = max(self.total_books // 9, 1)
+        names, weights = [], []
+        for part in args.mix.split(','):
+            name, weight = part.split('=')
+            names.append(name.strip())
+            weights.append(float(weight))
+        self.names = names
+        self.weights = weights
+
+    def reader_token(self, rng):
+        return rng.choice(self.tokens['readers'])
+
+    # Each operation may issue several requests; every request is recorded
+
+    def browse(self, client, rng):
+        page = min(int(rng.paretovariate(1.2)), self.pages)
+        client.request('GET', '/api/books', 'GET /api/books', params={'page': page})
+
+    def search(self, client, rng):
+        if rng.random() < 0.6:
+            params = {'title': rng.choice(SEARCH_WORDS)}
+        else:
+            params = {'author': rng.choice(SEARCH_AUTHORS)}
+        client.request('GET', '/api/books', 'GET /api/books?search', params=params)
+
+    def available(self, client, rng):
+        client.request('GET', '/api/books/available', 'GET /api/books/available',
+                       token=self.reader_token(rng), params={'title': rng.choice(SEARCH_WORDS)})
+
+    def my_books(self, client, rng):
+        # One dashboard snapshot, then the next history page when there is one,
+        # as MyBooks loads it
+        token = self.reader_token(rng)
+        status, library = client.request('GET', '/api/me/library', 'GET /api/me/library', token=token)
+        if status != 200 or not library or not library['loan_history']['has_next']:
+            return
+        client.request('GET', '/api/me/library', 'GET /api/me/library?cursor', token=token,
+                       params={'cursor': library['loan_history']['next_cursor']})
+
+    def reserve(self, client, rng):
+        start = date.today() + timedelta(days=rng.randint(0, 60))
+        end = start + timedelta(days=rng.choice((7, 14, 21)))
+        client.request('POST', '/api/reservations', 'POST /api/reservations', token=self.reader_token(rng), body={
+            'book_id': rng.randint(1, self.total_books),
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+        })
+
+    def checkout(self, client, rng):
+        token = self.tokens['worker']
+        status, ready = client.request('GET', '/api/loans/books', 'GET /api/loans/books', token=token)
+        if status != 200 or not ready:
+            return
+        candidate = rng.choice(ready)
+        client.request('POST', '/api/loans', 'POST /api/loans', token=token, body={
+            'book_id': candidate['id'],
+            'reader_id': candidate['reader_id'],
+        })
+
+    def return_(self, client, rng):
+        token = self.tokens['worker']
+        status, data = client.request('GET', '/api/loans', 'GET /api/loans', token=token,
+                                      params={'page': rng.randint(1, 5)})
+        if status != 200 or not data:
+            return
+        borrowed = [loan for loan in data.get('loans', []) if loan['status'] == 'borrowed']
+        if borrowed:
+            loan = rng.choice(borrowed)
+            client.request('POST', f"/api/loans/{loan['id']}/return", 'POST /api/loans/<id>/return', token=token)
+
+    def report(self, client, rng):
+        report_type = rng.choice(('loans', 'reservations', 'overdue', 'readers'))
+        period = rng.choice(('today', 'week', 'month'))
+        client.request('GET', '/api/reports/generate', f'GET /api/reports/generate?type={report_type}',
+                       token=self.tokens['admin'], params={'type': report_type, 'period': period})
+
+    def run_one(self, client, rng):
+        name = rng.choices(self.names, self.weights)[0]
+        getattr(self, 'return_' if name == 'return' else name)(client, rng)
+
+
+def login(client, username, password):
+    status, data = client.request('POST', '/api/auth/login', None, body={'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f'Login failed for {username} (HTTP {status}); load a dataset with benchmarks.datagen first')
+    return data['token']
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for label, base in baseline['summary']['endpoints'].items():
+        current = results['summary']['endpoints'].get(label)
+        if not current:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {base['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current['server_error_rate'] > base['server_error_rate'] + 0.01:
+            regressions.append(f"{label}: 5xx rate {base['server_error_rate']:.2%} -> {current['server_error_rate']:.2%}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='unmeasured seconds before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='comma-separated operation=weight pairs')
+    parser.add_argument('--readers', type=int, default=50, help='reader accounts (reader1..readerN) to log in')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dataset-manifest', help='datagen manifest to embed in the results')
+    parser.add_argument('--output', default='http_load_results.json')
+    parser.add_argument('--compare', help='baseline results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative p95 growth')
+    args = parser.parse_args(argv)
+
+    recorder = Recorder()
+    setup = Client(args.base_url, recorder)
+    tokens = {
+        'admin': login(setup, 'bench_admin', args.password),
+        'worker': login(setup, 'bench_worker', args.password),
+        'readers': [login(setup, f'reader{i}', args.password) for i in range(1, args.readers + 1)],
+    }
+    _, catalog = setup.request('GET', '/api/books', None)
+    workload = Workload(args, tokens, (catalog or {}).get('total', 0))
+
+    stop = threading.Event()
+
+    def worker(index):
+        client = Client(args.base_url, recorder)
+        rng = random.Random(f'{args.seed}:{index}')
+        while not stop.is_set():
+            workload.run_one(client, rng)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.warmup)
+    recorder.active = True
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.active = False
+    wall = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    results = {
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'git_revision': git_revision(),
+        'parameters': {k: v for k, v in vars(args).items() if k not in ('password', 'output', 'compare')},
+        'dataset': None,
+        'summary': recorder.summary(wall),
+    }
+    if args.dataset_manifest:
+        with open(args.dataset_manifest) as f:
+            results['dataset'] = json.load(f)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'endpoint':<48} {'count':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'5xx':>6}")
+    for label, stats in results['summary']['endpoints'].items():
+        print(f"{label:<48} {stats['count']:>7} {stats['throughput_rps']:>8.1f} {stats['p50_ms']:>8.1f} "
+              f"{stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['server_error_rate']:>6.1%}")
+    print(f"total: {results['summary']['requests']} requests, {results['summary']['throughput_rps']} req/s")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print('Regressions against', args.compare)
+            for line in regressions:
+                print('  ' + line)
+            raise SystemExit(1)
+        print('No regressions against', args.compare)
+
+
+if __name__ == '__main__':
+    main()
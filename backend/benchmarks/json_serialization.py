@@ -0,0 +1,88 @@
+"""Serialization benchmark for a loans-list response.
+
+Compares the old approach (per-row ``isoformat()`` pass followed by
+``json.dumps(indent=2)``) with the app's orjson-backed JSON provider.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.json_serialization --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import random
+import timeit
+from datetime import datetime, timedelta
+
+import orjson
+
+from json_provider import OrjsonProvider, _default
+
+
+def make_loans(rows, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1, 9, 0, 0)
+    loans = []
+    for i in range(rows):
+        loan_date = start + timedelta(minutes=rng.randrange(0, 60 * 24 * 365 * 4))
+        returned = rng.random() < 0.8
+        due_date = (loan_date + timedelta(days=14)).date()
+        loans.append({
+            'id': i + 1,
+            'title': f'Book title {rng.randrange(100000)}',
+            'reader': f'Reader {rng.randrange(50000)}',
+            'loan_date': loan_date,
+            'return_date': loan_date + timedelta(days=rng.randrange(1, 30)) if returned else None,
+            'status': 'returned' if returned else 'borrowed',
+            'due_date': due_date,
+            'is_overdue': not returned and rng.random() < 0.3,
+            'days_overdue': timedelta(days=rng.randrange(0, 40)) if not returned else None,
+            'total_count': rows,
+        })
+    return loans
+
+
+def legacy_dumps(loans):
+    # Mirrors the per-row conversion the routes used to do before serializing
+    converted = []
+    for row in loans:
+        loan = dict(row)
+        loan['loan_date'] = loan['loan_date'].isoformat()
+        loan['return_date'] = loan['return_date'].isoformat() if loan['return_date'] else None
+        loan['due_date'] = loan['due_date'].isoformat() if loan['due_date'] else None
+        if loan['days_overdue'] is not None:
+            loan['days_overdue'] = loan['days_overdue'].days
+        converted.append(loan)
+    return json.dumps(converted, indent=2).encode('utf-8')
+
+
+def provider_dumps(loans):
+    return orjson.dumps(loans, default=_default, option=OrjsonProvider.option)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    loans = make_loans(args.rows)
+
+    assert orjson.loads(provider_dumps(loans)) == orjson.loads(legacy_dumps(loans))
+
+    results = {}
+    for name, func in (('legacy', legacy_dumps), ('provider', provider_dumps)):
+        timings = timeit.repeat(lambda: func(loans), number=1, repeat=args.repeat)
+        results[name] = {
+            'best_ms': min(timings) * 1000,
+            'mean_ms': sum(timings) / len(timings) * 1000,
+            'bytes': len(func(loans)),
+        }
+
+    for name, stats in results.items():
+        print(f"{name:>9}: best {stats['best_ms']:8.2f} ms  "
+              f"mean {stats['mean_ms']:8.2f} ms  size {stats['bytes']:>10,} B")
+    print(f"  speedup: {results['legacy']['best_ms'] / results['provider']['best_ms']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+"""Query-plan regression harness.
+
+Runs every endpoint in ``routes.py`` and ``auth_routes.py`` through the Flask
+test client against a scaled dataset and captures each SQL statement with the
+parameters it actually ran with. The body of ``check_book_availability()`` is
+read from ``pg_proc``. Each statement is then planned with
+``EXPLAIN (FORMAT JSON)``, and its plan shape and estimated cost are compared
+with a snapshot file.
+
+A run fails when a statement:
+
+* gains a sequential scan on ``books``, ``loans`` or ``reservations`` that the
+  snapshot did not have (or has one and no snapshot entry exists yet), or
+* has an estimated total cost more than ``--cost-threshold`` above the
+  snapshot.
+
+Write-path scenarios use parameters that pass through the full statement but
+fail validation (a returned loan, a conflicting date range, a processed
+request and so on), so a run does not change the dataset.
+
+Usage (from the backend directory, with DATABASE_URL pointing at a
+disposable database):
+
+    python -m benchmarks.query_plans --generate --scale small --update   # record a baseline
+    python -m benchmarks.query_plans                                      # check against it
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import date, datetime, time, timedelta
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from slow_queries import EXPLAINABLE
+from search import keyset_cursor
+from sql_comments import COMMENT
+from sync import encode_token
+
+WATCHED_TABLES = {'books', 'loans', 'reservations'}
+DEFAULT_SNAPSHOT = os.path.join(os.path.dirname(__file__), 'plan_snapshots.json')
+
+
+class StatementCapture:
+    def __init__(self):
+        self.statements = {}
+        self.active = False
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not self.active or executemany or not has_request_context():
+            return
+        sql = COMMENT.sub('', statement).strip()
+        if not EXPLAINABLE.match(sql):
+            return
+        key = statement_key(request.endpoint, sql)
+        self.statements.setdefault(key, {
+            'controller': request.endpoint,
+            'sql': sql,
+            'parameters': parameters,
+        })
+
+
+def normalize(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def statement_key(controller, sql):
+    digest = hashlib.sha1(normalize(sql).encode('utf-8')).hexdigest()[:12]
+    return f'{controller}:{digest}'
+
+
+def plan_shape(node, depth=0):
+    """Flatten a plan tree into indented 'Node Type on relation using index' lines."""
+    label = node['Node Type']
+    if node.get('Relation Name'):
+        label += f" on {node['Relation Name']}"
+    if node.get('Index Name'):
+        label += f" using {node['Index Name']}"
+    lines = ['  ' * depth + label]
+    for child in node.get('Plans', []):
+        lines.extend(plan_shape(child, depth + 1))
+    return lines
+
+
+def seq_scans(node):
+    found = set()
+    if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in WATCHED_TABLES:
+        found.add(node['Relation Name'])
+    for child in node.get('Plans', []):
+        found |= seq_scans(child)
+    return found
+
+
+def function_body_statement(conn, name, arguments):
+    """Extract the RETURN QUERY statement of a plpgsql function as plain SQL."""
+    with conn.cursor() as cur:
+        cur.execute('SELECT prosrc FROM pg_proc WHERE proname = %s', (name,))
+        row = cur.fetchone()
+    if not row:
+        return None
+    match = re.search(r'RETURN QUERY(.*?);\s*END', row[0], re.IGNORECASE | re.DOTALL)
+    if not match:
+        return None
+    sql = match.group(1)
+    for argument in arguments:
+        sql = re.sub(rf'\b{argument}\b', f'%({argument})s', sql)
+    return sql.strip()
+
+
+class Fixtures:
+    """Representative ids looked up from the loaded dataset."""
+
+    def __init__(self, conn):
+        with conn.cursor() as cur:
+            def one(query):
+                cur.execute(query)
+                return cur.fetchone()
+
+            self.admin_id = one("SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1")[0]
+            self.worker_id = one("SELECT id FROM users WHERE role = 'worker' ORDER BY id LIMIT 1")[0]
+            self.reader_user_id, self.reader_id = one("""
+                SELECT r.user_id, r.id FROM readers r
+                JOIN loans l ON l.reader_id = r.id
+                GROUP BY r.id ORDER BY COUNT(*) DESC LIMIT 1
+            """)
+            # Halfway down the reader's history, as a second keyset page would start
+            self.history_cursor = keyset_cursor(dict(zip(('loan_date', 'id'), one(f"""
+                SELECT loan_date, id FROM loans WHERE reader_id = {self.reader_id}
+                ORDER BY loan_date DESC, id DESC
+                LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM loans WHERE reader_id = {self.reader_id})
+            """))), 'loan_date')
+            self.plain_user_id = one("SELECT id FROM users WHERE role = 'user' ORDER BY id DESC LIMIT 1")[0]
+            # Must be recent enough for the duplicate check to reject the new request
+            self.pending_request_user_id = one("""
+                SELECT user_id FROM reader_registration_requests
+                WHERE status = 'pending' AND created_at > CURRENT_DATE - INTERVAL '30 days'
+                LIMIT 1
+            """)[0]
+            self.processed_request_id = one(
+                "SELECT id FROM reader_registration_requests WHERE status <> 'pending' LIMIT 1"
+            )[0]
+            self.returned_loan_id = one("SELECT id FROM loans WHERE status = 'returned' LIMIT 1")[0]
+            self.borrowed_book_id = one("SELECT book_id FROM loans WHERE status = 'borrowed' LIMIT 1")[0]
+            self.completed_reservation_id = one("SELECT id FROM reservations WHERE status = 'completed' LIMIT 1")[0]
+            self.reserved_book_id, self.reserved_start, self.reserved_end = one("""
+                SELECT book_id, start_date, end_date FROM reservations
+                WHERE status = 'pending' AND end_date > CURRENT_DATE
+                ORDER BY end_date DESC LIMIT 1
+            """)
+            self.book = one("""
+                SELECT b.id, b.title, b.isbn, b.publication_year, b.genre,
+                       a.first_name, a.last_name, p.name
+                FROM books b
+                JOIN authors a ON b.author_id = a.id
+                JOIN publishers p ON b.publisher_id = p.id
+                ORDER BY b.id LIMIT 1
+            """)
+            self.admin_username = one(f"SELECT username FROM users WHERE id = {self.admin_id}")[0]
+            self.copy_barcode = one("SELECT barcode FROM book_copies ORDER BY id DESC LIMIT 1")[0]
+
+
+def isbn10(isbn13):
+    """ISBN-10 form of a 978-prefixed ISBN-13, as a scanner might send it."""
+    body = isbn13[3:12]
+    check = (11 - sum((10 - i) * int(d) for i, d in enumerate(body)) % 11) % 11
+    return body + ('X' if check == 10 else str(check))
+
+
+def scenarios(f):
+    """(method, path, role, json body) covering every endpoint that runs SQL."""
+    today = date.today()
+    book_id, title, isbn, year, genre, first_name, last_name, publisher = f.book
+    book_payload = {
+        'title': title, 'isbn': isbn, 'publication_year': year, 'genre': genre,
+        'author_first_name': first_name, 'author_last_name': last_name, 'publisher': publisher,
+    }
+    # Resume each table a month back, so the keyset scans start mid-index
+    month_ago = [datetime.combine(today - timedelta(days=30), time()).isoformat(), 0]
+    since = encode_token({
+        table: {'u': month_ago, 'd': month_ago} for table in ('books', 'loans', 'reservations')
+    })
+    overlap = {
+        'book_id': f.reserved_book_id,
+        'start_date': max(f.reserved_start, today).isoformat(),
+        'end_date': f.reserved_end.isoformat(),
+    }
+    return [
+        # Catalog
+        ('GET', '/api/books', None, None),
+        ('GET', '/api/books?title=shadow', None, None),
+        ('GET', '/api/books?author=nowak&page=2', None, None),
+        ('GET', f'/api/books?isbn={isbn[:7]}', None, None),
+        ('GET', '/api/books?status=available&genre=Fiction', None, None),
+        ('GET', '/api/available-books?title=night', 'reader', None),
+        ('GET', '/api/books/available?title=river', 'reader', None),
+        ('GET', f'/api/books/lookup?code={isbn10(isbn)}&code={isbn}&code={f.copy_barcode}', 'worker', None),
+        ('POST', '/books', 'admin', book_payload),
+        ('PUT', '/api/books/0', 'admin', dict(book_payload, description='')),
+        ('GET', '/api/health', None, None),
+        # Readers and registration
+        ('GET', '/api/unregistered-users', 'admin', None),
+        ('GET', '/api/reader-requests?status=pending', 'admin', None),
+        ('GET', '/api/reader-requests?status=processed&page=3', 'admin', None),
+        ('POST', '/api/reader-requests', 'pending_user', {
+            'first_name': 'A', 'last_name': 'B', 'address': 'C', 'phone_number': 'D'}),
+        ('GET', '/api/reader-requests/check', 'reader', None),
+        ('GET', '/readers', 'admin', None),
+        ('GET', '/api/readers/check-status', 'reader', None),
+        ('POST', f'/api/reader-requests/{f.processed_request_id}/approve', 'worker', None),
+        ('POST', f'/api/reader-requests/{f.processed_request_id}/reject', 'worker', {'reason': 'x'}),
+        # Reservations
+        ('GET', f'/api/reservations/book/{f.reserved_book_id}', None, None),
+        ('POST', '/api/reservations', 'reader', overlap),
+        ('GET', '/api/reservations/user', 'reader', None),
+        ('GET', '/api/reservations/all?page=2', 'admin', None),
+        ('POST', '/api/reservations/admin/create', 'admin', dict(overlap, reader_id=f.reader_id)),
+        ('DELETE', f'/api/reservations/{f.completed_reservation_id}', 'worker', None),
+        ('GET', '/api/users/my-reservations', 'reader', None),
+        # Circulation
+        ('GET', '/api/loans/books', 'worker', None),
+        ('GET', '/api/loans/readers', 'worker', None),
+        ('GET', '/api/loans?page=3', 'worker', None),
+        ('POST', '/api/loans', 'worker', {'book_id': f.borrowed_book_id, 'reader_id': 0}),
+        ('POST', f'/api/loans/{f.returned_loan_id}/return', 'worker', None),
+        ('GET', '/api/users/my-loans', 'reader', None),
+        ('GET', '/api/loans/active', 'reader', None),
+        ('GET', '/api/loans/history', 'reader', None),
+        ('GET', '/api/me/library', 'reader', None),
+        ('GET', f'/api/me/library?cursor={f.history_cursor}', 'reader', None),
+        # Reports
+        ('GET', '/api/reports/active-loans', 'admin', None),
+        ('GET', '/api/reports/overdue-loans', 'admin', None),
+        ('GET', '/api/reports/reader-activity', 'admin', None),
+        ('GET', '/api/reports/popular-books', 'admin', None),
+        ('GET', '/api/reports/user-statistics', 'admin', None),
+        ('GET', '/api/reports/generate?type=loans&period=year', 'admin', None),
+        ('GET', '/api/reports/generate?type=reservations&period=month', 'admin', None),
+        ('GET', '/api/reports/generate?type=readers&period=year', 'admin', None),
+        ('GET', '/api/reports/generate?type=overdue&period=year', 'admin', None),
+        # Users and auth
+        ('POST', '/api/auth/register', None, {
+            'username': f.admin_username, 'email': 'x@example.test', 'password': 'x'}),
+        ('POST', '/api/auth/login', None, {'username': f.admin_username, 'password': 'not-the-password'}),
+        ('GET', '/api/users', 'admin', None),
+        ('POST', f'/api/users/{f.plain_user_id}/promote', 'admin', {'role': 'user'}),
+        ('DELETE', f'/api/users/{f.admin_id}', 'admin', None),
+        ('GET', f'/api/users/{f.reader_user_id}/details', 'admin', None),
+        ('GET', f'/api/users/{f.reader_user_id}/loans', 'admin', None),
+        ('GET', f'/api/users/{f.reader_user_id}/loans?cursor={f.history_cursor}', 'admin', None),
+        # Offline sync
+        ('GET', '/api/sync?tables=books,loans,reservations', 'worker', None),
+        ('GET', f'/api/sync?tables=books,loans,reservations&since={since}', 'worker', None),
+    ], {
+        'check_book_availability': {
+            'p_book_id': f.reserved_book_id,
+            'p_start_date': today,
+            'p_end_date': today + timedelta(days=14),
+        }
+    }
+
+
+def explain(conn, sql, parameters):
+    with conn.cursor() as cur:
+        cur.execute('EXPLAIN (FORMAT JSON) ' + sql, parameters)
+        plan = cur.fetchone()[0][0]['Plan']
+    conn.rollback()
+    return plan
+
+
+def run(args):
+    from flask_jwt_extended import create_access_token
+    from app import create_app, db
+
+    app = create_app({'SLOW_QUERY_EXPLAIN': False})
+    capture = StatementCapture()
+    event.listen(Engine, 'before_cursor_execute', capture)
+
+    with app.app_context():
+        raw = db.engine.raw_connection()
+        try:
+            fixtures = Fixtures(raw)
+            raw.rollback()
+            tokens = {
+                'admin': create_access_token(identity=str(fixtures.admin_id), additional_claims={'role': 'admin'}),
+                'worker': create_access_token(identity=str(fixtures.worker_id), additional_claims={'role': 'worker'}),
+                'reader': create_access_token(identity=str(fixtures.reader_user_id), additional_claims={'role': 'user'}),
+                'pending_user': create_access_token(identity=str(fixtures.pending_request_user_id),
+                                                    additional_claims={'role': 'user'}),
+            }
+
+            requests_, functions = scenarios(fixtures)
+            client = app.test_client()
+            capture.active = True
+            for method, path, role, body in requests_:
+                headers = {'Authorization': f'Bearer {tokens[role]}'} if role else {}
+                response = client.open(path, method=method, json=body, headers=headers)
+                if response.status_code >= 500:
+                    print(f'warning: {method} {path} returned {response.status_code}', file=sys.stderr)
+            capture.active = False
+
+            statements = dict(capture.statements)
+            sql = function_body_statement(raw, 'check_book_availability', list(functions['check_book_availability']))
+            if sql:
+                statements[statement_key('check_book_availability', sql)] = {
+                    'controller': 'check_book_availability()',
+                    'sql': sql,
+                    'parameters': functions['check_book_availability'],
+                }
+
+            results = {}
+            for key, captured in sorted(statements.items()):
+                try:
+                    plan = explain(raw, captured['sql'], captured['parameters'])
+                except Exception as e:
+                    raw.rollback()
+                    print(f'warning: could not plan {key}: {e}', file=sys.stderr)
+                    continue
+                results[key] = {
+                    'controller': captured['controller'],
+                    'sql': normalize(captured['sql'])[:300],
+                    'total_cost': plan['Total Cost'],
+                    'seq_scans': sorted(seq_scans(plan)),
+                    'shape': plan_shape(plan),
+                }
+        finally:
+            raw.close()
+
+    event.remove(Engine, 'before_cursor_execute', capture)
+    return results
+
+
+def check(results, snapshot, cost_threshold):
+    failures, notes = [], []
+    for key, current in results.items():
+        base = snapshot.get(key)
+        if base is None:
+            if current['seq_scans']:
+                failures.append(f"{key}: new statement with seq scan on {', '.join(current['seq_scans'])}")
+            else:
+                notes.append(f'{key}: new statement (not in snapshot)')
+            continue
+        new_scans = set(current['seq_scans']) - set(base['seq_scans'])
+        if new_scans:
+            failures.append(f"{key}: falls back to seq scan on {', '.join(sorted(new_scans))}")
+        if current['total_cost'] > base['total_cost'] * (1 + cost_threshold):
+            failures.append(f"{key}: estimated cost {base['total_cost']:.0f} -> {current['total_cost']:.0f}")
+        elif current['shape'] != base['shape']:
+            notes.append(f'{key}: plan shape changed')
+    for key in snapshot.keys() - results.keys():
+        notes.append(f'{key}: no longer executed')
+    return failures, notes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--snapshot', default=DEFAULT_SNAPSHOT)
+    parser.add_argument('--update', action='store_true', help='accept the current plans as the new snapshot')
+    parser.add_argument('--cost-threshold', type=float, default=0.25, help='allowed relative growth in estimated cost')
+    parser.add_argument('--generate', action='store_true', help='load a fresh dataset with benchmarks.datagen first')
+    parser.add_argument('--scale', default='small', help='datagen scale used with --generate')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        from benchmarks import datagen
+        datagen.main(['--scale', args.scale, '--seed', str(args.seed), '--reset'])
+
+    results = run(args)
+    print(f'Planned {len(results)} statements')
+
+    if args.update or not os.path.exists(args.snapshot):
+        with open(args.snapshot, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Snapshot written to {args.snapshot}')
+        return
+
+    with open(args.snapshot) as f:
+        snapshot = json.load(f)
+    failures, notes = check(results, snapshot, args.cost_threshold)
+    for line in notes:
+        print('note: ' + line)
+    for line in failures:
+        print('FAIL: ' + line)
+    if failures:
+        raise SystemExit(1)
+    print('All plans within budget')
+
+
+if __name__ == '__main__':
+    main()
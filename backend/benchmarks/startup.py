@@ -0,0 +1,66 @@
+"""Worker boot benchmark.
+
+Each sample runs in a fresh interpreter and measures how long it takes to
+import ``app`` and to build an application with ``create_app()``. It also
+reports heavy modules that got imported during boot even though only a few
+endpoints need them.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.startup --runs 10 [--output startup.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('reportlab',)
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'import_ms': (t1 - t0) * 1000, 'boot_ms': (t2 - t1) * 1000, 'heavy': heavy}}))
+"""
+
+
+def sample():
+    out = subprocess.run(
+        [sys.executable, '-c', PROBE.format(heavy=HEAVY_MODULES)],
+        check=True, capture_output=True, text=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--output', help='write the summary as JSON to this file')
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.runs)]
+    summary = {'runs': args.runs, 'heavy_modules_loaded': samples[-1]['heavy']}
+    for key in ('import_ms', 'boot_ms'):
+        values = [s[key] for s in samples]
+        summary[key] = {
+            'median': statistics.median(values),
+            'min': min(values),
+            'max': max(values),
+        }
+
+    print(f"import app:   median {summary['import_ms']['median']:7.1f} ms")
+    print(f"create_app(): median {summary['boot_ms']['median']:7.1f} ms")
+    print(f"heavy modules loaded at boot: {', '.join(summary['heavy_modules_loaded']) or 'none'}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Concurrency control for the checkout, return and reservation write paths.
+
+The circulation CTEs read ``books.status`` and the reservation calendar, then
+write based on what they saw. Without locking, two desks can both see a book
+as available and both check it out. ``CIRCULATION_LOCK_MODE`` selects how
+those transactions are serialized per book:
+
+``row`` (default)
+    ``SELECT ... FOR UPDATE`` on the affected ``books`` rows.
+``advisory``
+    ``pg_advisory_xact_lock(ADVISORY_NAMESPACE, book_id)``. This does not
+    touch the books rows, so catalog edits don't queue behind circulation.
+``serializable``
+    No explicit locks. The transaction runs at SERIALIZABLE and Postgres
+    aborts conflicting writers.
+``none``
+    The original behaviour; kept for comparison in ``benchmarks.contention``.
+
+Whatever frees a copy or a booked window also promotes the book's waitlist
+(:func:`promote_waitlist`) inside the same transaction, under the same lock.
+
+Locks are taken in ascending book id order, so transactions that touch
+several books cannot deadlock each other. Deadlocks and serialization
+failures, for example from the materialized-view refresh triggers, are
+retried a bounded number of times with jittered exponential backoff.
+"""
+import os
+import random
+import time
+
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+
+from app import db
+from metrics import CIRCULATION_RETRIES
+
+LOCK_MODES = ('none', 'row', 'advisory', 'serializable')
+RETRYABLE = {'40001': 'serialization_failure', '40P01': 'deadlock_detected'}
+# First key of the two-key advisory lock form, so book ids can't collide
+# with advisory locks taken elsewhere
+ADVISORY_NAMESPACE = 1001
+
+
+def lock_books(book_ids):
+    """Lock the given books for the rest of the current transaction."""
+    ids = sorted({int(book_id) for book_id in book_ids if book_id is not None})
+    mode = current_app.config['CIRCULATION_LOCK_MODE']
+    if not ids or mode in ('none', 'serializable'):
+        return
+
+    if mode == 'row':
+        db.session.execute(
+            "SELECT id FROM books WHERE id = ANY(:ids) ORDER BY id FOR UPDATE",
+            {'ids': ids}
+        ).fetchall()
+    else:
+        db.session.execute("""
+            SELECT pg_advisory_xact_lock(:namespace, ordered.id)
+            FROM (SELECT unnest(CAST(:ids AS integer[])) AS id ORDER BY 1) ordered
+        """, {'namespace': ADVISORY_NAMESPACE, 'ids': ids}).fetchall()
+
+
+def promote_waitlist(book_id):
+    """Turn waitlist entries for ``book_id`` into reservations where a copy is free.
+
+    Call it after anything that frees a copy or a window, with the book
+    already locked, so the next reader in line gets it in the same
+    transaction. Returns the number of readers promoted.
+    """
+    return db.session.execute(
+        "SELECT promote_waitlist(:book_id)", {'book_id': book_id}
+    ).scalar()
+
+
+class ReservationsStranded(Exception):
+    """Raised when reservations held on a copy cannot move to another copy."""
+
+    def __init__(self, count):
+        super().__init__(f"{count} reservation(s) have no other copy free")
+        self.count = count
+
+
+def reassign_copy_reservations(copy_id):
+    """Move the live reservations held on ``copy_id`` to other free copies.
+
+    Call it once the copy is out of circulation, with its book locked.
+    Raises :class:`ReservationsStranded` if any of them does not fit on
+    another copy, which rolls back the :func:`run_circulation` transaction.
+    """
+    stranded = db.session.execute(
+        "SELECT reassign_copy_reservations(:copy_id)", {'copy_id': copy_id}
+    ).scalar()
+    if stranded:
+        raise ReservationsStranded(stranded)
+
+
+def _retry_reason(error):
+    return RETRYABLE.get(getattr(error.orig, 'pgcode', None))
+
+
+def run_circulation(work):
+    """Run ``work()`` in its own transaction and return its result.
+
+    ``work`` should call :func:`lock_books` before it reads anything it
+    writes based on. The whole transaction is re-run on a deadlock or
+    serialization failure, up to ``CIRCULATION_MAX_RETRIES`` times.
+    """
+    config = current_app.config
+    attempts = config['CIRCULATION_MAX_RETRIES'] + 1
+    for attempt in range(1, attempts + 1):
+        try:
+            with db.session.begin():
+                if config['CIRCULATION_LOCK_MODE'] == 'serializable':
+                    db.session.execute('SET TRANSACTION ISOLATION LEVEL SERIALIZABLE')
+                return work()
+        except DBAPIError as e:
+            reason = _retry_reason(e)
+            if reason is None or attempt == attempts:
+                raise
+            CIRCULATION_RETRIES.labels(reason).inc()
+            current_app.logger.warning(f"Retrying circulation transaction after {reason} (attempt {attempt})")
+            backoff = config['CIRCULATION_RETRY_BACKOFF_MS'] / 1000 * 2 ** (attempt - 1)
+            time.sleep(random.uniform(0, backoff))
+
+
+def init_app(app):
+    app.config.setdefault('CIRCULATION_LOCK_MODE', os.environ.get('CIRCULATION_LOCK_MODE', 'row'))
+    app.config.setdefault('CIRCULATION_MAX_RETRIES', int(os.environ.get('CIRCULATION_MAX_RETRIES', 3)))
+    app.config.setdefault('CIRCULATION_RETRY_BACKOFF_MS', float(os.environ.get('CIRCULATION_RETRY_BACKOFF_MS', 20)))
+    if app.config['CIRCULATION_LOCK_MODE'] not in LOCK_MODES:
+        raise ValueError(f"CIRCULATION_LOCK_MODE must be one of {', '.join(LOCK_MODES)}")
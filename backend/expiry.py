@@ -0,0 +1,111 @@
+"""Sweeper that expires pending reservations nobody picked up.
+
+A reservation stays 'pending' until it is checked out or cancelled, so
+unfulfilled ones would otherwise sit in every conflict check and calendar
+forever. ``flask expire-reservations`` moves pending reservations and
+waitlist entries whose ``end_date`` has passed to 'expired'.
+
+Each batch is its own short transaction and claims its rows with
+``FOR UPDATE SKIP LOCKED``, so the sweeper never waits on a checkout that is
+holding one of them and two sweepers can run side by side. Run it once from
+cron, or with ``--interval`` as a long-lived process (the ``sweeper`` service
+in docker-compose).
+"""
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import db
+
+EXPIRE_BATCH = """
+    WITH stale AS (
+        SELECT id
+        FROM reservations
+        WHERE status = 'pending'
+        AND end_date < CURRENT_DATE
+        ORDER BY end_date, id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE reservations r
+    SET status = 'expired'
+    FROM stale
+    WHERE r.id = stale.id
+    RETURNING r.id
+"""
+
+EXPIRE_WAITLIST_BATCH = """
+    WITH stale AS (
+        SELECT id
+        FROM reservation_waitlist
+        WHERE status = 'waiting'
+        AND end_date < CURRENT_DATE
+        ORDER BY end_date, id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE reservation_waitlist w
+    SET status = 'expired'
+    FROM stale
+    WHERE w.id = stale.id
+    RETURNING w.id
+"""
+
+
+def _sweep(statement, batch_size, max_batches):
+    expired = 0
+    for _ in range(max_batches):
+        with db.session.begin():
+            count = len(db.session.execute(statement, {'batch_size': batch_size}).fetchall())
+        expired += count
+        if count < batch_size:
+            break
+    return expired
+
+
+def expire_reservations(batch_size=None, max_batches=None):
+    """Expire stale pending reservations in batches; returns how many changed.
+
+    Waitlist entries for windows that have passed are expired as well; they
+    are not counted in the result.
+    """
+    config = current_app.config
+    batch_size = batch_size or config['RESERVATION_EXPIRY_BATCH_SIZE']
+    max_batches = max_batches or config['RESERVATION_EXPIRY_MAX_BATCHES']
+
+    expired = _sweep(EXPIRE_BATCH, batch_size, max_batches)
+    _sweep(EXPIRE_WAITLIST_BATCH, batch_size, max_batches)
+    return expired
+
+
+@click.command('expire-reservations')
+@click.option('--batch-size', type=int, help='Rows per transaction.')
+@click.option('--max-batches', type=int, help='Upper bound on batches per sweep.')
+@click.option('--interval', type=float, default=0, help='Seconds between sweeps; 0 sweeps once and exits.')
+@with_appcontext
+def expire_reservations_command(batch_size, max_batches, interval):
+    """Move pending reservations past their end date to 'expired'."""
+    while True:
+        try:
+            expired = expire_reservations(batch_size, max_batches)
+            if expired:
+                current_app.logger.info(f"Expired {expired} stale reservations")
+            click.echo(f'Expired {expired} reservations')
+        except Exception as e:
+            if not interval:
+                raise
+            current_app.logger.error(f"Error expiring reservations: {str(e)}")
+        finally:
+            db.session.remove()
+        if not interval:
+            return
+        time.sleep(interval)
+
+
+def init_app(app):
+    app.config.setdefault('RESERVATION_EXPIRY_BATCH_SIZE', int(os.environ.get('RESERVATION_EXPIRY_BATCH_SIZE', 1000)))
+    app.config.setdefault('RESERVATION_EXPIRY_MAX_BATCHES', int(os.environ.get('RESERVATION_EXPIRY_MAX_BATCHES', 100)))
+    app.cli.add_command(expire_reservations_command)
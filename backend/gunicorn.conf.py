@@ -0,0 +1,23 @@
+# Picked up automatically by gunicorn when started from this directory.
+import os
+import shutil
+
+# Backup downloads stream for as long as pg_dump runs. A gthread worker keeps
+# heartbeating from its main thread while a request thread streams, whereas a
+# sync worker would be killed as hung once ``timeout`` passes.
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def on_starting(server):
+    # Drop samples left over from a previous run of the multiprocess metrics
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
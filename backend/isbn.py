@@ -0,0 +1,38 @@
+"""ISBN-10/ISBN-13/EAN normalization for scanner input.
+
+Mirrors the ``normalize_isbn`` SQL function that fills ``books.isbn13``, so a
+scanned code and the stored ISBN of the same edition compare equal whichever
+form either of them was written in.
+"""
+import re
+
+_SEPARATORS = re.compile(r'[\s\-]')
+
+
+def _isbn13_check(digits12):
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits12))
+    return str((10 - total % 10) % 10)
+
+
+def _isbn10_valid(code):
+    if not re.fullmatch(r'\d{9}[\dX]', code):
+        return False
+    total = sum((10 - i) * (10 if c == 'X' else int(c)) for i, c in enumerate(code))
+    return total % 11 == 0
+
+
+def normalize_isbn(code):
+    """Canonical ISBN-13 for ``code``, or None if it is not a valid ISBN.
+
+    Accepts ISBN-10 (with an optional ``X`` check digit) and ISBN-13/EAN-13
+    in the 978/979 Bookland range, with or without hyphens and spaces.
+    """
+    if not code:
+        return None
+    code = _SEPARATORS.sub('', str(code)).upper()
+    if len(code) == 10 and _isbn10_valid(code):
+        body = '978' + code[:9]
+        return body + _isbn13_check(body)
+    if len(code) == 13 and code.isdigit() and code[:3] in ('978', '979') and _isbn13_check(code[:12]) == code[12]:
+        return code
+    return None
@@ -0,0 +1,45 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import JSONProvider
+
+
+def _default(value):
+    # orjson handles datetime, date, time and UUID natively; these are the
+    # remaining types that come back from our raw SQL queries.
+    if isinstance(value, timedelta):
+        return value.days
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(JSONProvider):
+    """App-wide JSON provider backed by orjson.
+
+    Output is compact by default; set ``JSON_PRETTY = True`` in the app config
+    to get indented output while debugging.
+    """
+
+    option = orjson.OPT_NON_STR_KEYS
+
+    def _option(self):
+        if self._app.config.get('JSON_PRETTY'):
+            return self.option | orjson.OPT_INDENT_2
+        return self.option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self._option()).decode('utf-8')
+
+    def dumpb(self, obj):
+        return orjson.dumps(obj, default=_default, option=self._option())
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj), mimetype='application/json')
@@ -0,0 +1,147 @@
+"""Reader dashboard snapshot for ``GET /api/me/library``.
+
+MyBooks and ReserveBook used to make one request per panel (reader status,
+active loans, loan history, reservations, waitlist), each resolving
+``readers WHERE user_id = :user_id`` again. Here the reader is resolved once
+and every panel is aggregated with ``json_agg`` in a single statement, so the
+page is one round trip and one snapshot: a loan cannot show up as both active
+and returned because it changed between two calls.
+
+Reservations are limited to the live (pending, not yet ended) ones. The loan
+history is the only panel that grows without bound; it is returned one keyset
+page at a time (``?cursor=``, in the :mod:`search` format) and reads the
+archive only with ``include_archived=true``.
+"""
+import os
+
+from app import db
+from retention import history_source
+
+HISTORY_PAGE = 20
+
+LIBRARY_QUERY = """
+    WITH me AS (
+        SELECT r.id as reader_id
+        FROM users u
+        LEFT JOIN readers r ON r.user_id = u.id
+        WHERE u.id = :user_id
+    )
+    SELECT
+        me.reader_id IS NOT NULL as is_reader,
+        EXISTS(
+            SELECT 1 FROM reader_registration_requests
+            WHERE user_id = :user_id
+            AND status = 'pending'
+            AND created_at > CURRENT_DATE - INTERVAL '30 days'
+        ) as has_pending_request,
+        (
+            SELECT COALESCE(json_agg(active ORDER BY active.loan_date DESC, active.id DESC), '[]')
+            FROM (
+                SELECT l.id, b.title, CONCAT(a.first_name, ' ', a.last_name) as author,
+                       l.loan_date, due.end_date as due_date,
+                       due.end_date < CURRENT_DATE as is_overdue
+                FROM loans l
+                JOIN books b ON l.book_id = b.id
+                JOIN authors a ON b.author_id = a.id
+                LEFT JOIN LATERAL (
+                    -- Same rule as the staff view: the reservation this copy
+                    -- was checked out against
+                    SELECT res.end_date
+                    FROM reservations res
+                    WHERE res.copy_id = l.copy_id
+                    AND res.reader_id = l.reader_id
+                    AND res.status = 'completed'
+                    AND CAST(l.loan_date AS date) BETWEEN res.start_date AND res.end_date
+                    ORDER BY res.end_date DESC
+                    LIMIT 1
+                ) due ON true
+                WHERE l.reader_id = me.reader_id
+                AND l.status = 'borrowed'
+            ) active
+        ) as active_loans,
+        (
+            SELECT COALESCE(json_agg(history ORDER BY history.loan_date DESC, history.id DESC), '[]')
+            FROM (
+                SELECT l.id, b.title, CONCAT(a.first_name, ' ', a.last_name) as author,
+                       l.loan_date, l.return_date,
+                       to_char(l.loan_date, 'YYYY-MM-DD"T"HH24:MI:SS.US') || ',' || l.id as cursor
+                FROM {loans} l
+                JOIN books b ON l.book_id = b.id
+                JOIN authors a ON b.author_id = a.id
+                WHERE l.reader_id = me.reader_id
+                AND l.status = 'returned'
+                AND (CAST(:after AS timestamp) IS NULL OR (l.loan_date, l.id) < (CAST(:after AS timestamp), :after_id))
+                ORDER BY l.loan_date DESC, l.id DESC
+                LIMIT :history_limit
+            ) history
+        ) as loan_history,
+        (
+            SELECT COALESCE(json_agg(booking ORDER BY booking.start_date DESC, booking.id DESC), '[]')
+            FROM (
+                SELECT res.id, b.title as book_title, CONCAT(a.first_name, ' ', a.last_name) as author,
+                       res.start_date, res.end_date, res.status, b.status as book_status
+                FROM reservations res
+                JOIN books b ON res.book_id = b.id
+                JOIN authors a ON b.author_id = a.id
+                WHERE res.reader_id = me.reader_id
+                AND res.status = 'pending'
+                AND res.end_date >= CURRENT_DATE
+            ) booking
+        ) as reservations,
+        (
+            SELECT COALESCE(json_agg(entry ORDER BY entry.created_at DESC, entry.id DESC), '[]')
+            FROM (
+                SELECT w.id, b.title as book_title, w.start_date, w.end_date, w.status,
+                       w.reservation_id, w.created_at,
+                       CASE WHEN w.status = 'waiting' THEN (
+                           SELECT COUNT(*) FROM reservation_waitlist ahead
+                           WHERE ahead.book_id = w.book_id
+                           AND ahead.status = 'waiting'
+                           AND (ahead.created_at, ahead.id) <= (w.created_at, w.id)
+                       ) END as position
+                FROM reservation_waitlist w
+                JOIN books b ON w.book_id = b.id
+                WHERE w.reader_id = me.reader_id
+                AND w.status IN ('waiting', 'promoted')
+                AND w.end_date >= CURRENT_DATE
+            ) entry
+        ) as waitlist
+    FROM me
+"""
+
+
+def reader_library(user_id, after=None, after_id=None, include_archived=False):
+    """Everything the reader dashboard shows for ``user_id``, or None if no such user."""
+    loans = history_source('loans', 'id, book_id, reader_id, loan_date, return_date, status', include_archived)
+    row = db.session.execute(LIBRARY_QUERY.format(loans=loans), {
+        'user_id': user_id,
+        'after': after,
+        'after_id': after_id,
+        'history_limit': HISTORY_PAGE + 1,
+    }).first()
+    if row is None:
+        return None
+
+    history = row.loan_history[:HISTORY_PAGE]
+    has_next = len(row.loan_history) > HISTORY_PAGE
+    # json_agg trims trailing zeros off fractional seconds, which
+    # datetime.fromisoformat rejects before 3.11, so the cursor is rendered
+    # in SQL with all six digits
+    cursors = [loan.pop('cursor') for loan in history]
+    return {
+        'is_reader': row.is_reader,
+        'has_pending_request': row.has_pending_request,
+        'active_loans': row.active_loans,
+        'loan_history': {
+            'loans': history,
+            'has_next': has_next,
+            'next_cursor': cursors[-1] if has_next else None,
+        },
+        'reservations': row.reservations,
+        'waitlist': row.waitlist,
+    }
+
+
+def init_app(app):
+    # Seconds a browser may reuse its copy before revalidating against the ETag
+    app.config.setdefault('MY_LIBRARY_MAX_AGE', int(os.environ.get('MY_LIBRARY_MAX_AGE', 10)))
@@ -0,0 +1,133 @@
+"""Request, SQL and connection-pool metrics in Prometheus format.
+
+Per-request SQL time and statement counts are accumulated on ``flask.g`` by
+SQLAlchemy cursor events and observed once the response is ready. With
+several gunicorn workers, set ``PROMETHEUS_MULTIPROC_DIR`` so each worker
+writes its samples to a shared directory and ``/api/metrics`` reports the
+aggregate (see ``gunicorn.conf.py``).
+"""
+import os
+import time
+
+from flask import g, request, has_request_context
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status']
+)
+REQUEST_EXCEPTIONS = Counter(
+    'http_request_exceptions_total', 'Requests that raised an unhandled exception',
+    ['method', 'route']
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_seconds', 'SQL execution time spent per request',
+    ['method', 'route'],
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL statements executed per request',
+    ['method', 'route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled database connection',
+    buckets=(.0005, .001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+CIRCULATION_RETRIES = Counter(
+    'circulation_transaction_retries_total', 'Circulation transactions re-run after a retryable database error',
+    ['reason']
+)
+BACKUP_BYTES = Counter(
+    'database_backup_bytes_total', 'Bytes of pg_dump output streamed to backup downloads',
+    ['format']
+)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+
+
+def route_label():
+    # Use the rule rather than the path so ids don't explode label cardinality
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+    if has_request_context() and 'db_time' in g:
+        g.db_time += elapsed
+        g.db_queries += 1
+
+
+def _handle_error(exception_context):
+    # Keep the start-time stack balanced when a statement fails
+    starts = exception_context.connection.info.get('metrics_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def _start_timer():
+    g.request_start = time.perf_counter()
+    g.db_time = 0.0
+    g.db_queries = 0
+
+
+def _record_request(response):
+    if 'request_start' not in g:
+        return response
+    route = route_label()
+    REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(
+        time.perf_counter() - g.request_start
+    )
+    REQUEST_DB_TIME.labels(request.method, route).observe(g.db_time)
+    REQUEST_DB_QUERIES.labels(request.method, route).observe(g.db_queries)
+    return response
+
+
+def _record_exception(exc):
+    if exc is not None and 'request_start' in g:
+        REQUEST_EXCEPTIONS.labels(request.method, route_label()).inc()
+
+
+def render():
+    """Return (body, content_type) for the metrics endpoint."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def init_app(app):
+    engine_options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+    engine_options.setdefault('poolclass', TimedQueuePool)
+
+    for name, listener in (
+        ('before_cursor_execute', _before_cursor_execute),
+        ('after_cursor_execute', _after_cursor_execute),
+        ('handle_error', _handle_error),
+    ):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
+
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+    app.teardown_request(_record_exception)
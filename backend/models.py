@@ -20,15 +20,26 @@ class Book(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     isbn = db.Column(db.String(20), unique=True)
+    isbn13 = db.Column(db.String(13), db.Computed('normalize_isbn(isbn)'))
     publication_year = db.Column(db.Integer)
     genre = db.Column(db.String(100))
-    status = db.Column(db.String(20), default='available')
+    status = db.Column(db.String(20), default='available')  # derived from the copy counts
+    total_copies = db.Column(db.Integer, nullable=False, default=0)
+    available_copies = db.Column(db.Integer, nullable=False, default=0)
     
     author_id = db.Column(db.Integer, db.ForeignKey('authors.id'))
     publisher_id = db.Column(db.Integer, db.ForeignKey('publishers.id'))
     
     loans = db.relationship('Loan', backref='book')
     reservations = db.relationship('Reservation', backref='book')
+    copies = db.relationship('BookCopy', backref='book', lazy='dynamic')
+
+class BookCopy(db.Model):
+    __tablename__ = 'book_copies'
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False)
+    barcode = db.Column(db.String(32), unique=True)  # 'LIB' + id unless supplied
+    status = db.Column(db.String(20), nullable=False, default='available')  # 'available', 'borrowed', 'withdrawn'
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -66,6 +77,7 @@ class Loan(db.Model):
     __tablename__ = 'loans'
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'))
+    copy_id = db.Column(db.Integer, db.ForeignKey('book_copies.id'))
     reader_id = db.Column(db.Integer, db.ForeignKey('readers.id'))
     loan_date = db.Column(db.DateTime, default=datetime.utcnow)
     return_date = db.Column(db.DateTime)
@@ -75,11 +87,24 @@ class Reservation(db.Model):
     __tablename__ = 'reservations'
     id = db.Column(db.Integer, primary_key=True)
     book_id = db.Column(db.Integer, db.ForeignKey('books.id'))
+    copy_id = db.Column(db.Integer, db.ForeignKey('book_copies.id'))
     reader_id = db.Column(db.Integer, db.ForeignKey('readers.id'))
     reservation_date = db.Column(db.DateTime, default=datetime.utcnow)
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     status = db.Column(db.String(20), default='pending')
+    released_on = db.Column(db.Date)  # early return; end_date stays the due date
+
+class ReservationWaitlist(db.Model):
+    __tablename__ = 'reservation_waitlist'
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, db.ForeignKey('books.id', ondelete='CASCADE'), nullable=False)
+    reader_id = db.Column(db.Integer, db.ForeignKey('readers.id', ondelete='CASCADE'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), default='waiting')  # waiting, promoted, cancelled, expired
+    reservation_id = db.Column(db.Integer, db.ForeignKey('reservations.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ReaderRegistrationRequest(db.Model):
     __tablename__ = 'reader_registration_requests'
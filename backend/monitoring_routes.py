@@ -0,0 +1,125 @@
+from flask import Blueprint, Response, jsonify, request, current_app
+from flask_jwt_extended import jwt_required, get_jwt
+from app import db
+import metrics
+from sql_comments import parse_comment
+
+monitoring = Blueprint('monitoring', __name__)
+
+@monitoring.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    # Left unauthenticated like /api/health so Prometheus can scrape it
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@monitoring.route('/api/admin/slow-queries', methods=['GET'])
+@jwt_required()
+def get_slow_queries():
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    limit = request.args.get('limit', 50, type=int)
+    recorder = current_app.extensions['slow_queries']
+    return jsonify({
+        'threshold_ms': current_app.config['SLOW_QUERY_THRESHOLD_MS'],
+        'queries': recorder.records(limit)
+    })
+
+@monitoring.route('/api/admin/slow-queries', methods=['DELETE'])
+@jwt_required()
+def clear_slow_queries():
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    current_app.extensions['slow_queries'].clear()
+    return jsonify({'message': 'Slow query log cleared'}), 200
+
+@monitoring.route('/api/admin/profiles', methods=['GET'])
+@jwt_required()
+def get_profiles():
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    return jsonify(current_app.extensions['profiles'].summaries())
+
+@monitoring.route('/api/admin/profiles/<profile_id>', methods=['GET'])
+@jwt_required()
+def get_profile(profile_id):
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    profile = current_app.extensions['profiles'].get(profile_id)
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+
+    summary, speedscope = profile
+    return Response(
+        speedscope,
+        mimetype='application/json',
+        headers={'Content-Disposition': f"attachment; filename=profile_{summary['endpoint']}_{profile_id}.speedscope.json"}
+    )
+
+@monitoring.route('/api/admin/sql-stats', methods=['GET'])
+@jwt_required()
+def get_sql_stats():
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        query = """
+            SELECT 
+                s.queryid, s.query, s.calls, s.rows,
+                s.total_exec_time, s.mean_exec_time,
+                s.shared_blks_hit, s.shared_blks_read
+            FROM pg_stat_statements s
+            WHERE s.dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+            ORDER BY s.total_exec_time DESC
+        """
+        result = db.session.execute(query)
+
+        routes = {}
+        statements = []
+        for row in result:
+            tags = parse_comment(row.query)
+            key = (tags.get('route', 'untagged'), tags.get('controller'))
+            totals = routes.setdefault(key, {
+                'route': key[0],
+                'controller': key[1],
+                'statements': 0,
+                'calls': 0,
+                'rows': 0,
+                'total_exec_time_ms': 0.0
+            })
+            totals['statements'] += 1
+            totals['calls'] += row.calls
+            totals['rows'] += row.rows
+            totals['total_exec_time_ms'] += row.total_exec_time
+
+            if len(statements) < limit:
+                statements.append({
+                    'queryid': str(row.queryid),
+                    'route': key[0],
+                    'controller': key[1],
+                    'calls': row.calls,
+                    'total_exec_time_ms': row.total_exec_time,
+                    'mean_exec_time_ms': row.mean_exec_time,
+                    'rows': row.rows,
+                    'shared_blks_hit': row.shared_blks_hit,
+                    'shared_blks_read': row.shared_blks_read,
+                    'query': row.query
+                })
+
+        return jsonify({
+            'routes': sorted(routes.values(), key=lambda r: r['total_exec_time_ms'], reverse=True),
+            'statements': statements
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching SQL statistics: {str(e)}")
+        return jsonify({'error': 'Failed to fetch SQL statistics (is pg_stat_statements enabled?)'}), 500
@@ -0,0 +1,112 @@
+"""On-demand request profiling for admins.
+
+An admin can send ``X-Profile: 1`` (or ``?profile=1``) with any request to
+run it under pyinstrument's sampling profiler. The result is stored in a
+small per-process buffer as a speedscope profile (load it at
+https://www.speedscope.app for a flame graph) and the response carries
+``X-Profile-Id`` plus the Python/DB time split.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import current_app, g, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+
+
+class ProfileStore:
+    def __init__(self, maxlen):
+        self._profiles = OrderedDict()
+        self._maxlen = maxlen
+        self._lock = threading.Lock()
+
+    def add(self, summary, speedscope):
+        with self._lock:
+            self._profiles[summary['id']] = (summary, speedscope)
+            while len(self._profiles) > self._maxlen:
+                self._profiles.popitem(last=False)
+
+    def summaries(self):
+        with self._lock:
+            return [summary for summary, _ in reversed(self._profiles.values())]
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+def _requested():
+    return request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'
+
+
+def _is_admin():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt().get('role') == 'admin'
+    except Exception:
+        return False
+
+
+def _start_profiler():
+    if request.method == 'OPTIONS' or not _requested() or not _is_admin():
+        return
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        current_app.logger.warning("Profiling requested but pyinstrument is not installed")
+        return
+
+    g.profiler = Profiler(interval=current_app.config['PROFILER_INTERVAL'])
+    g.profile_db_time_start = g.get('db_time', 0.0)
+    g.profile_db_queries_start = g.get('db_queries', 0)
+    g.profile_started = time.perf_counter()
+    g.profiler.start()
+
+
+def _stop_profiler(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.stop()
+
+    from pyinstrument.renderers import SpeedscopeRenderer
+
+    wall_ms = (time.perf_counter() - g.profile_started) * 1000
+    db_ms = (g.get('db_time', 0.0) - g.profile_db_time_start) * 1000
+    summary = {
+        'id': uuid.uuid4().hex,
+        'recorded_at': datetime.utcnow(),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'wall_ms': round(wall_ms, 3),
+        'db_ms': round(db_ms, 3),
+        'python_ms': round(max(wall_ms - db_ms, 0.0), 3),
+        'db_queries': g.get('db_queries', 0) - g.profile_db_queries_start,
+    }
+    current_app.extensions['profiles'].add(summary, profiler.output(SpeedscopeRenderer()))
+
+    response.headers['X-Profile-Id'] = summary['id']
+    response.headers['X-Profile-Wall-Ms'] = str(summary['wall_ms'])
+    response.headers['X-Profile-Db-Ms'] = str(summary['db_ms'])
+    response.headers['X-Profile-Python-Ms'] = str(summary['python_ms'])
+    return response
+
+
+def _discard_profiler(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None and profiler.is_running:
+        profiler.stop()
+
+
+def init_app(app):
+    app.config.setdefault('PROFILER_INTERVAL', 0.001)
+    app.config.setdefault('PROFILER_BUFFER_SIZE', 20)
+    app.extensions['profiles'] = ProfileStore(app.config['PROFILER_BUFFER_SIZE'])
+
+    app.before_request(_start_profiler)
+    app.after_request(_stop_profiler)
+    app.teardown_request(_discard_profiler)
@@ -0,0 +1,153 @@
+"""Retention: move finished circulation history into archive tables.
+
+Returned loans, finished reservations and processed registration requests
+are never touched again, but they stay in the tables every desk query
+scans and sorts. ``flask archive-history`` moves rows past their table's
+retention period into ``<table>_archive`` (same columns plus
+``archived_at``). History endpoints read the archive only when called with
+``include_archived=true``. Run it nightly from cron; it is safe to run
+alongside normal traffic.
+
+Rows move in batches, each a ``DELETE ... RETURNING`` feeding an
+``INSERT`` in one short transaction. Batches claim rows with ``FOR UPDATE
+SKIP LOCKED`` and run under ``RETENTION_LOCK_TIMEOUT_MS``, so a batch gives
+up rather than queue behind circulation. The move is flagged to
+``record_sync_tombstone`` so /api/sync mirrors keep archived rows instead
+of seeing them as deleted.
+"""
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.exc import DBAPIError
+
+from app import db
+
+LOCK_NOT_AVAILABLE = '55P03'
+
+# table -> (rows eligible once older than :days, column the batches walk).
+# Reservations still referenced by a waitlist entry stay put for the FK.
+RETENTION_POLICIES = {
+    'loans': (
+        "status = 'returned' AND return_date < CURRENT_DATE - make_interval(days => :days)",
+        'return_date',
+    ),
+    'reservations': (
+        "status IN ('completed', 'cancelled', 'expired') "
+        "AND end_date < CURRENT_DATE - make_interval(days => :days) "
+        "AND NOT EXISTS (SELECT 1 FROM reservation_waitlist w WHERE w.reservation_id = reservations.id)",
+        'end_date',
+    ),
+    'reader_registration_requests': (
+        "status IN ('approved', 'rejected') AND processed_at < CURRENT_DATE - make_interval(days => :days)",
+        'processed_at',
+    ),
+}
+
+# Columns copied into each archive, by name: a column added to a live table
+# later lands at a different position in its archive
+ARCHIVE_COLUMNS = {
+    'loans': 'id, book_id, copy_id, reader_id, loan_date, return_date, status, created_at, updated_at',
+    'reservations': ('id, book_id, copy_id, reader_id, reservation_date, start_date, end_date, status, '
+                     'released_on, created_at, updated_at'),
+    'reader_registration_requests': ('id, user_id, first_name, last_name, address, phone_number, status, '
+                                     'created_at, processed_by, processed_at, rejection_reason, updated_at'),
+}
+
+BATCH_SETTINGS = """
+    SELECT set_config('lock_timeout', :lock_timeout, true),
+           set_config('library.archiving', 'on', true)
+"""
+
+
+def history_source(table, columns, include_archived):
+    """FROM-clause source for ``table``, unioned with its archive when asked.
+
+    Both branches select ``columns``, so filters on the outer query are
+    pushed down into each of them.
+    """
+    if not include_archived:
+        return table
+    return f"(SELECT {columns} FROM {table} UNION ALL SELECT {columns} FROM {table}_archive)"
+
+
+def _move_batch(table, batch_size, days, lock_timeout_ms):
+    condition, order_by = RETENTION_POLICIES[table]
+    columns = ARCHIVE_COLUMNS[table]
+    statement = f"""
+        WITH batch AS (
+            SELECT id
+            FROM {table}
+            WHERE {condition}
+            ORDER BY {order_by}, id
+            LIMIT :batch_size
+            FOR UPDATE SKIP LOCKED
+        ),
+        moved AS (
+            DELETE FROM {table} t
+            USING batch
+            WHERE t.id = batch.id
+            RETURNING t.*
+        )
+        INSERT INTO {table}_archive ({columns})
+        SELECT {columns} FROM moved
+        RETURNING id
+    """
+    with db.session.begin():
+        db.session.execute(BATCH_SETTINGS, {'lock_timeout': f'{int(lock_timeout_ms)}ms'})
+        return len(db.session.execute(statement, {'batch_size': batch_size, 'days': days}).fetchall())
+
+
+def archive_table(table, batch_size=None, max_batches=None, pause=0):
+    """Move one table's expired rows to its archive; returns how many moved."""
+    config = current_app.config
+    batch_size = batch_size or config['RETENTION_BATCH_SIZE']
+    max_batches = max_batches or config['RETENTION_MAX_BATCHES']
+    days = config['RETENTION_DAYS'][table]
+
+    moved = 0
+    for _ in range(max_batches):
+        try:
+            count = _move_batch(table, batch_size, days, config['RETENTION_LOCK_TIMEOUT_MS'])
+        except DBAPIError as e:
+            if getattr(e.orig, 'pgcode', None) != LOCK_NOT_AVAILABLE:
+                raise
+            # Whatever was moved so far is committed; the next run picks up the rest
+            current_app.logger.warning(f"Archiving {table} stopped on a lock timeout after {moved} rows")
+            break
+        moved += count
+        if count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return moved
+
+
+@click.command('archive-history')
+@click.option('--table', 'tables', multiple=True, type=click.Choice(list(RETENTION_POLICIES)),
+              help='Limit to these tables (repeatable); defaults to all.')
+@click.option('--batch-size', type=int, help='Rows per transaction.')
+@click.option('--max-batches', type=int, help='Upper bound on batches per table.')
+@click.option('--pause', type=float, default=0, help='Seconds to sleep between batches.')
+@with_appcontext
+def archive_history_command(tables, batch_size, max_batches, pause):
+    """Move history rows past their retention period to the archive tables."""
+    for table in tables or RETENTION_POLICIES:
+        moved = archive_table(table, batch_size, max_batches, pause)
+        if moved:
+            current_app.logger.info(f"Archived {moved} rows from {table}")
+        click.echo(f'Archived {moved} rows from {table}')
+
+
+def init_app(app):
+    app.config.setdefault('RETENTION_BATCH_SIZE', int(os.environ.get('RETENTION_BATCH_SIZE', 1000)))
+    app.config.setdefault('RETENTION_MAX_BATCHES', int(os.environ.get('RETENTION_MAX_BATCHES', 100)))
+    app.config.setdefault('RETENTION_LOCK_TIMEOUT_MS', int(os.environ.get('RETENTION_LOCK_TIMEOUT_MS', 2000)))
+    # Days a finished row stays in the live table; three years by default
+    app.config.setdefault('RETENTION_DAYS', {
+        table: int(os.environ.get(f'RETENTION_{table.upper()}_DAYS', 3 * 365))
+        for table in RETENTION_POLICIES
+    })
+    app.cli.add_command(archive_history_command)
@@ -1,25 +1,26 @@
-from flask import request, jsonify, send_file, current_app
+from flask import Blueprint, Response, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from app import app, db
-from models import Book, Author, Publisher, Reader, Loan, Reservation, User, ReaderRegistrationRequest
+from app import db
+from circulation import (
+    ReservationsStranded, lock_books, promote_waitlist, reassign_copy_reservations, run_circulation
+)
+from search import keyset_cursor, parse_cursor, search_page, search_params
+from isbn import normalize_isbn
+from sync import SYNC_TABLES, export_changes
+from retention import history_source
+from library import reader_library
+from backup import RestoreInProgress, restore_status, start_backup, start_restore
 from datetime import datetime, timedelta, date
 from flask_cors import cross_origin
-import subprocess
-import os
-import tempfile
-import csv
+from sqlalchemy.exc import IntegrityError
 from io import StringIO, BytesIO
-from sqlalchemy import func, desc
-from werkzeug.security import check_password_hash
-from flask_jwt_extended import create_access_token
-from werkzeug.security import generate_password_hash
-import json
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-
-@app.route('/api/books', methods=['GET', 'OPTIONS'])
+
+# reportlab and csv are imported inside the report views that need them so
+# that worker boot stays cheap.
+
+api = Blueprint('api', __name__)
+
+@api.route('/api/books', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required(optional=True)
 def get_books():
@@ -40,6 +41,7 @@ def get_books():
             SELECT 
                 b.id, b.title, b.isbn, b.publication_year, 
                 b.genre, b.status, b.description,
+                b.total_copies, b.available_copies,
                 CONCAT(a.first_name, ' ', a.last_name) as author,
                 p.name as publisher,
                 COUNT(*) OVER() as total_count
@@ -48,7 +50,7 @@ def get_books():
             LEFT JOIN publishers p ON b.publisher_id = p.id
             WHERE (:title = '' OR LOWER(b.title) LIKE :title_pattern)
             AND (:author = '' OR LOWER(CONCAT(a.first_name, ' ', a.last_name)) LIKE :author_pattern)
-            AND (:isbn = '' OR b.isbn LIKE :isbn_pattern)
+            AND (:isbn = '' OR b.isbn13 = :isbn13 OR (:isbn13 = '' AND b.isbn LIKE :isbn_pattern))
             AND (:status = '' OR b.status = :status)
             AND (:genre = '' OR b.genre = :genre)
             ORDER BY b.title
@@ -59,6 +61,8 @@ def get_books():
             'title': title,
             'author': author,
             'isbn': isbn,
+            # A complete ISBN in any form is an exact index lookup
+            'isbn13': normalize_isbn(isbn) or '',
             'status': status,
             'genre': genre,
             'title_pattern': f'%{title}%',
@@ -81,6 +85,8 @@ def get_books():
                 'genre': row.genre,
                 'status': row.status,
                 'description': row.description,
+                'total_copies': row.total_copies,
+                'available_copies': row.available_copies,
                 'author': row.author,
                 'publisher': row.publisher
             })
@@ -105,7 +111,84 @@ def get_books():
             'pages': 0
         }), 500
 
-@app.route('/api/available-books', methods=['GET'])
+@api.route('/api/books/lookup', methods=['GET', 'OPTIONS'])
+@cross_origin(supports_credentials=True)
+@jwt_required()
+def lookup_books():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    claims = get_jwt()
+    if claims.get('role') not in ['admin', 'worker']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    codes = [code.strip() for code in request.args.getlist('code') if code.strip()]
+    if not codes:
+        return jsonify({'error': 'At least one code is required'}), 400
+    if len(codes) > 100:
+        return jsonify({'error': 'At most 100 codes per lookup'}), 400
+
+    try:
+        # Every scanned code is tried both as an ISBN/EAN and as a copy
+        # barcode; the whole batch resolves in one query
+        isbns = {code: normalize_isbn(code) for code in codes}
+        query = """
+            SELECT
+                'isbn' as matched_by, b.isbn13 as code,
+                b.id, b.title, b.isbn, b.status, b.total_copies, b.available_copies,
+                CONCAT(a.first_name, ' ', a.last_name) as author,
+                NULL::integer as copy_id, NULL::varchar as copy_status
+            FROM books b
+            JOIN authors a ON b.author_id = a.id
+            WHERE b.isbn13 = ANY(CAST(:isbns AS text[]))
+            UNION ALL
+            SELECT
+                'barcode', c.barcode,
+                b.id, b.title, b.isbn, b.status, b.total_copies, b.available_copies,
+                CONCAT(a.first_name, ' ', a.last_name),
+                c.id, c.status
+            FROM book_copies c
+            JOIN books b ON c.book_id = b.id
+            JOIN authors a ON b.author_id = a.id
+            WHERE c.barcode = ANY(CAST(:barcodes AS text[]))
+        """
+        result = db.session.execute(query, {
+            'isbns': sorted({isbn for isbn in isbns.values() if isbn}),
+            'barcodes': sorted({code.upper() for code in codes})
+        })
+
+        by_isbn, by_barcode = {}, {}
+        for row in result:
+            book = {
+                'id': row.id,
+                'title': row.title,
+                'author': row.author,
+                'isbn': row.isbn,
+                'status': row.status,
+                'total_copies': row.total_copies,
+                'available_copies': row.available_copies
+            }
+            if row.matched_by == 'isbn':
+                by_isbn[row.code] = book
+            else:
+                by_barcode[row.code] = {'book': book, 'copy': {'id': row.copy_id, 'status': row.copy_status}}
+
+        results = []
+        for code in codes:
+            match = by_barcode.get(code.upper())
+            if match:
+                results.append({'code': code, 'isbn13': None, **match})
+            else:
+                results.append({'code': code, 'isbn13': isbns[code],
+                                'book': by_isbn.get(isbns[code]), 'copy': None})
+
+        return jsonify({'results': results})
+
+    except Exception as e:
+        current_app.logger.error(f"Error looking up codes: {str(e)}")
+        return jsonify({'error': 'Failed to look up codes'}), 500
+
+@api.route('/api/available-books', methods=['GET'])
 @jwt_required()
 def get_available_books():
     try:
@@ -118,6 +201,7 @@ def get_available_books():
         base_query = """
             SELECT 
                 b.id, b.title, b.isbn, b.status,
+                b.total_copies, b.available_copies,
                 CONCAT(a.first_name, ' ', a.last_name) as author,
                 COUNT(*) OVER() as total_count
             FROM books b
@@ -152,7 +236,7 @@ def get_available_books():
         current_app.logger.error(f"Error fetching available books: {str(e)}")
         return jsonify({'error': 'Failed to fetch available books'}), 500
 
-@app.route('/books', methods=['POST'])
+@api.route('/books', methods=['POST'])
 @jwt_required()
 def add_book():
     claims = get_jwt()
@@ -161,6 +245,10 @@ def add_book():
 
     try:
         data = request.json
+        copies = data.get('copies', 1)
+        if not isinstance(copies, int) or copies < 1:
+            return jsonify({'error': 'Number of copies must be a positive integer'}), 400
+
         with db.session.begin():
             # Get or create author and publisher in one query each
             author_query = """
@@ -224,6 +312,12 @@ def add_book():
                 'genre': data['genre']
             }).scalar()
 
+            # Triggers on book_copies keep the title's copy counts and status in sync
+            db.session.execute("""
+                INSERT INTO book_copies (book_id)
+                SELECT :book_id FROM generate_series(1, :copies)
+            """, {'book_id': book_id, 'copies': copies})
+
             return jsonify({
                 'message': 'Book added successfully',
                 'book_id': book_id
@@ -233,7 +327,7 @@ def add_book():
         current_app.logger.error(f"Error adding book: {str(e)}")
         return jsonify({'error': 'Failed to add book'}), 500
 
-@app.route('/api/unregistered-users', methods=['GET'])
+@api.route('/api/unregistered-users', methods=['GET'])
 @jwt_required()
 def get_unregistered_users():
     claims = get_jwt()
@@ -248,89 +342,113 @@ def get_unregistered_users():
             WHERE r.id IS NULL 
             AND u.role = 'user'
             AND u.is_active = true
+            AND (:q = ''
+                OR LOWER(u.email) = LOWER(:q)
+                OR u.username ILIKE :pattern
+                OR u.email ILIKE :pattern)
             ORDER BY u.username
+            LIMIT :limit OFFSET :offset
         """
         
-        result = db.session.execute(query)
-        users = [dict(row) for row in result]
-        
-        return jsonify(users)
+        params = search_params()
+        rows = db.session.execute(query, params).fetchall()
+        return jsonify(search_page('users', rows, params))
     except Exception as e:
         current_app.logger.error(f"Error fetching unregistered users: {str(e)}")
         return jsonify({'error': 'Failed to fetch users'}), 500
 
-@app.route('/api/reader-requests', methods=['GET'])
+READER_REQUEST_COLUMNS = """
+    rr.id, rr.first_name, rr.last_name,
+    rr.address, rr.phone_number, rr.status,
+    rr.created_at, rr.processed_at,
+    u.username, u.email,
+    rr.user_id, rr.rejection_reason
+"""
+
+# Each queue has its own statement so the planner can walk the matching
+# partial index (idx_reader_requests_pending / _processed) in order and stop
+# after one page, instead of sorting every request on a CASE expression.
+PENDING_REQUESTS_PAGE = f"""
+    SELECT {READER_REQUEST_COLUMNS}
+    FROM reader_registration_requests rr
+    JOIN users u ON rr.user_id = u.id
+    WHERE rr.status = 'pending'
+    AND (CAST(:after AS timestamp) IS NULL OR (rr.created_at, rr.id) < (CAST(:after AS timestamp), :after_id))
+    ORDER BY rr.created_at DESC, rr.id DESC
+    LIMIT :limit
+"""
+
+PROCESSED_REQUESTS_PAGE = """
+    SELECT {columns}
+    FROM {source} rr
+    JOIN users u ON rr.user_id = u.id
+    WHERE rr.status = ANY(CAST(:statuses AS text[]))
+    AND (CAST(:after AS timestamp) IS NULL OR (rr.processed_at, rr.id) < (CAST(:after AS timestamp), :after_id))
+    ORDER BY rr.processed_at DESC, rr.id DESC
+    LIMIT :limit
+"""
+
+PROCESSED_STATUSES = {
+    'processed': ['approved', 'rejected'],
+    'approved': ['approved'],
+    'rejected': ['rejected'],
+}
+
+@api.route('/api/reader-requests', methods=['GET'])
 @jwt_required()
 def get_reader_requests():
     claims = get_jwt()
     if claims.get('role') not in ['admin', 'worker']:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    status = request.args.get('status', 'pending')
+    if status != 'pending' and status not in PROCESSED_STATUSES:
+        return jsonify({'error': 'Invalid status'}), 400
+    per_page = 10
     try:
-        status = request.args.get('status', 'pending')
-        page = request.args.get('page', 1, type=int)
-        per_page = 10
-        offset = (page - 1) * per_page
+        after, after_id = parse_cursor()
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
 
-        query = """
-            SELECT 
-                rr.id, rr.first_name, rr.last_name, 
-                rr.address, rr.phone_number, rr.status,
-                rr.created_at, rr.processed_at,
-                u.username, u.email,
-                rr.user_id, rr.rejection_reason,
-                COUNT(*) OVER() as total_count
-            FROM reader_registration_requests rr
-            JOIN users u ON rr.user_id = u.id
-            WHERE CASE 
-                WHEN :status = 'processed' THEN rr.status IN ('approved', 'rejected')
-                ELSE rr.status = :status
-            END
-            ORDER BY CASE 
-                WHEN :status = 'processed' THEN rr.processed_at
-                ELSE rr.created_at
-            END DESC
-            LIMIT :limit OFFSET :offset
-        """
-        
-        current_app.logger.info(f"Executing query with status: {status}")
-        
-        result = db.session.execute(query, {
-            'status': status,
-            'limit': per_page,
-            'offset': offset
-        })
-        
-        requests = []
-        total_count = 0
-        
-        for row in result:
-            request_data = dict(row)
-            if not total_count and hasattr(row, 'total_count'):
-                total_count = row.total_count
-            # Convert datetime fields to ISO format
-            if request_data['created_at']:
-                request_data['created_at'] = request_data['created_at'].isoformat()
-            if request_data['processed_at']:
-                request_data['processed_at'] = request_data['processed_at'].isoformat()
-            requests.append(request_data)
+    try:
+        params = {'after': after, 'after_id': after_id, 'limit': per_page + 1}
+        if status == 'pending':
+            rows = db.session.execute(PENDING_REQUESTS_PAGE, params).fetchall()
+            sort_key = 'created_at'
+        else:
+            # Only processed requests are ever archived
+            include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+            source = history_source(
+                'reader_registration_requests',
+                'id, user_id, first_name, last_name, address, phone_number, status, created_at, processed_at, '
+                'rejection_reason',
+                include_archived
+            )
+            query = PROCESSED_REQUESTS_PAGE.format(columns=READER_REQUEST_COLUMNS, source=source)
+            rows = db.session.execute(query, dict(params, statuses=PROCESSED_STATUSES[status])).fetchall()
+            sort_key = 'processed_at'
 
-        current_app.logger.info(f"Found {len(requests)} {status} reader requests")
-        if requests:
-            current_app.logger.info(f"First request: {requests[0]}")
-        
-        return jsonify({
+        requests = [dict(row) for row in rows[:per_page]]
+        has_next = len(rows) > per_page
+        response = {
             'requests': requests,
-            'totalPages': (total_count + per_page - 1) // per_page,
-            'currentPage': page,
-            'totalCount': total_count
-        })
+            'has_next': has_next,
+            'next_cursor': keyset_cursor(requests[-1], sort_key) if has_next else None,
+        }
+        # The queue length is shown on the moderation tab; count it once per
+        # visit rather than on every page
+        if status == 'pending' and after is None:
+            response['totalCount'] = db.session.execute(
+                "SELECT COUNT(*) FROM reader_registration_requests WHERE status = 'pending'"
+            ).scalar()
+
+        return jsonify(response)
 
     except Exception as e:
         current_app.logger.error(f"Error fetching reader requests: {str(e)}")
         return jsonify({'error': 'Failed to fetch reader requests'}), 500
 
-@app.route('/api/reader-requests', methods=['POST'])
+@api.route('/api/reader-requests', methods=['POST'])
 @jwt_required()
 def create_reader_request():
     try:
@@ -380,7 +498,7 @@ def create_reader_request():
         current_app.logger.error(f"Error creating reader request: {str(e)}")
         return jsonify({'error': 'Failed to create request'}), 500
 
-@app.route('/api/reader-requests/check', methods=['GET'])
+@api.route('/api/reader-requests/check', methods=['GET'])
 @jwt_required()
 def check_pending_request():
     try:
@@ -403,7 +521,7 @@ def check_pending_request():
         current_app.logger.error(f"Error checking pending request: {str(e)}")
         return jsonify({'error': 'Failed to check request status'}), 500
 
-@app.route('/readers', methods=['GET'])
+@api.route('/readers', methods=['GET'])
 @jwt_required()
 def get_readers():
     claims = get_jwt()
@@ -411,26 +529,38 @@ def get_readers():
         return jsonify({'error': 'Unauthorized'}), 403
     
     try:
+        # Page first, then count active loans for that page only
         query = """
+            WITH matched AS (
+                SELECT 
+                    r.id, r.first_name, r.last_name, r.email,
+                    r.card_number, r.phone_number
+                FROM readers r
+                WHERE :q = ''
+                OR r.card_number = :q
+                OR LOWER(r.email) = LOWER(:q)
+                OR (r.first_name || ' ' || r.last_name) ILIKE :pattern
+                OR r.email ILIKE :pattern
+                OR r.card_number ILIKE :pattern
+                ORDER BY COALESCE(r.card_number = :q, false) DESC, r.last_name, r.first_name, r.id
+                LIMIT :limit OFFSET :offset
+            )
             SELECT 
-                r.id, r.first_name, r.last_name, r.email,
-                r.card_number, r.phone_number,
-                COUNT(l.id) as active_loans
-            FROM readers r
-            LEFT JOIN loans l ON r.id = l.reader_id AND l.status = 'borrowed'
-            GROUP BY r.id
-            ORDER BY r.last_name, r.first_name
+                m.*,
+                (SELECT COUNT(*) FROM loans l
+                 WHERE l.reader_id = m.id AND l.status = 'borrowed') as active_loans
+            FROM matched m
+            ORDER BY COALESCE(m.card_number = :q, false) DESC, m.last_name, m.first_name, m.id
         """
         
-        result = db.session.execute(query)
-        readers = [dict(row) for row in result]
-        
-        return jsonify(readers)
+        params = search_params()
+        rows = db.session.execute(query, params).fetchall()
+        return jsonify(search_page('readers', rows, params))
     except Exception as e:
         current_app.logger.error(f"Error fetching readers: {str(e)}")
         return jsonify({'error': 'Failed to fetch readers'}), 500
 
-@app.route('/api/readers/check-status', methods=['GET'])
+@api.route('/api/readers/check-status', methods=['GET'])
 @jwt_required()
 def check_reader_status():
     try:
@@ -459,18 +589,29 @@ def check_reader_status():
         current_app.logger.error(f"Error checking reader status: {str(e)}")
         return jsonify({'error': 'Failed to check reader status'}), 500
 
-@app.route('/api/reservations/book/<int:book_id>', methods=['GET'])
+@api.route('/api/reservations/book/<int:book_id>', methods=['GET'])
 def get_book_reservations(book_id):
     try:
+        # Date ranges in which every copy of the title is already booked
         query = """
-            SELECT 
-                id,
-                start_date,
-                end_date,
-                status
-            FROM reservations
-            WHERE book_id = :book_id
-            AND status != 'cancelled'
+            WITH booked_days AS (
+                SELECT day::date, COUNT(*) as booked
+                FROM reservations r,
+                    generate_series(GREATEST(r.start_date, CURRENT_DATE), LEAST(r.end_date, r.released_on - 1),
+                                    INTERVAL '1 day') day
+                WHERE r.book_id = :book_id
+                AND r.status NOT IN ('cancelled', 'expired')
+                AND LEAST(r.end_date, r.released_on - 1) >= CURRENT_DATE
+                GROUP BY day
+            ),
+            full_days AS (
+                SELECT day, day - CAST(ROW_NUMBER() OVER (ORDER BY day) AS integer) as range_key
+                FROM booked_days
+                WHERE booked >= (SELECT GREATEST(total_copies, 1) FROM books WHERE id = :book_id)
+            )
+            SELECT MIN(day) as start_date, MAX(day) as end_date
+            FROM full_days
+            GROUP BY range_key
             ORDER BY start_date
         """
         
@@ -479,9 +620,9 @@ def get_book_reservations(book_id):
             rows = result.fetchall()
             
             reservations = [{
-                'start_date': row.start_date.isoformat(),
-                'end_date': row.end_date.isoformat(),
-                'status': row.status
+                'start_date': row.start_date,
+                'end_date': row.end_date,
+                'status': 'booked'
             } for row in rows]
             
             return jsonify(reservations)
@@ -490,80 +631,69 @@ def get_book_reservations(book_id):
         current_app.logger.error(f"Error fetching reservations: {str(e)}")
         return jsonify({'error': 'Failed to fetch reservations'}), 500
 
-@app.route('/api/admin/database/backup', methods=['GET'])
+@api.route('/api/admin/database/backup', methods=['GET'])
 @jwt_required()
 def backup_database():
     claims = get_jwt()
     if claims.get('role') != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
     
-    temp_dir = None
-    backup_path = None
-        
+    # Streams pg_dump's output as it is produced; see backup.py
+    fmt = request.args.get('format', 'custom')
+    compress = request.args.get('compress', type=int)
+    jobs = request.args.get('jobs', 1, type=int)
+
     try:
-        # Create a temporary file
-        temp_dir = tempfile.mkdtemp()
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f'library_backup_{timestamp}.sql'
-        backup_path = os.path.join(temp_dir, backup_filename)
-        
-        # Get database connection details from environment variables
-        db_name = os.getenv('POSTGRES_DB', 'library')
-        db_user = os.getenv('POSTGRES_USER', 'postgres')
-        db_host = os.getenv('POSTGRES_HOST', 'db')
-        db_password = os.getenv('POSTGRES_PASSWORD')
-
-        if not all([db_name, db_user, db_host, db_password]):
-            raise Exception("Missing database configuration")
-        
-        # Create the dump
-        command = [
-            'pg_dump',
-            '-h', db_host,
-            '-U', db_user,
-            '-d', db_name,
-            '-f', backup_path
-        ]
-        
-        # Execute pg_dump
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            env={'PGPASSWORD': db_password}
-        )
-        
-        stdout, stderr = process.communicate()
-        
-        if process.returncode != 0:
-            raise Exception(f"Database backup failed: {stderr.decode()}")
-        
-        if not os.path.exists(backup_path):
-            raise Exception("Backup file was not created")
-            
-        # Send the file
-        return send_file(
-            backup_path,
-            as_attachment=True,
-            download_name=backup_filename,
-            mimetype='application/sql'
-        )
-        
+        filename, mimetype, chunks = start_backup(fmt, compress, jobs)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Backup failed: {str(e)}")
         return jsonify({'error': 'Failed to create database backup'}), 500
-        
-    finally:
-        # Cleanup temp files
-        try:
-            if backup_path and os.path.exists(backup_path):
-                os.remove(backup_path)
-            if temp_dir and os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-        except Exception as e:
-            current_app.logger.error(f"Cleanup failed: {str(e)}")
-
-@app.route('/api/reports/active-loans', methods=['GET'])
+
+    response = Response(chunks, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Keep reverse proxies from buffering the whole dump before passing it on
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api.route('/api/admin/database/restore', methods=['POST'])
+@jwt_required()
+def restore_database_backup():
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    upload = request.files.get('file')
+    if not upload:
+        return jsonify({'error': 'No backup file provided'}), 400
+
+    # pg_restore runs in the background; poll the job for progress
+    try:
+        job_id = start_restore(upload, request.form.get('jobs', type=int))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except RestoreInProgress as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        current_app.logger.error(f"Restore failed to start: {str(e)}")
+        return jsonify({'error': 'Failed to start database restore'}), 500
+
+    return jsonify({'job_id': job_id}), 202
+
+@api.route('/api/admin/database/restore/<job_id>', methods=['GET'])
+@jwt_required()
+def get_restore_status(job_id):
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    status = restore_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Restore not found'}), 404
+    return jsonify(status)
+
+@api.route('/api/reports/active-loans', methods=['GET'])
 @jwt_required()
 def get_active_loans_report():
     try:
@@ -602,16 +732,8 @@ def get_active_loans_report():
         result = db.session.execute(query)
         loans = [dict(row) for row in result]
         
-        # Convert datetime objects to ISO format
-        for loan in loans:
-            loan['loan_date'] = loan['loan_date'].isoformat()
-            loan['due_date'] = loan['due_date'].isoformat() if loan['due_date'] else None
-            # Convert interval to integer days if not None
-            if loan['days_overdue'] is not None:
-                loan['days_overdue'] = loan['days_overdue'].days
-        
         # Create a BytesIO object with the JSON data
-        output = BytesIO(json.dumps(loans, indent=2).encode('utf-8'))
+        output = BytesIO(current_app.json.dumps(loans).encode('utf-8'))
         
         return send_file(
             output,
@@ -623,7 +745,7 @@ def get_active_loans_report():
         current_app.logger.error(f"Error generating active loans report: {str(e)}")
         return jsonify({'error': 'Failed to generate report'}), 500
 
-@app.route('/api/reports/overdue-loans', methods=['GET'])
+@api.route('/api/reports/overdue-loans', methods=['GET'])
 @jwt_required()
 def get_overdue_loans_report():
     try:
@@ -652,14 +774,8 @@ def get_overdue_loans_report():
         result = db.session.execute(query)
         overdue = [dict(row) for row in result]
         
-        # Convert datetime objects to ISO format
-        for loan in overdue:
-            loan['loan_date'] = loan['loan_date'].isoformat()
-            loan['due_date'] = loan['due_date'].isoformat()
-            loan['days_overdue'] = int(loan['days_overdue'].days)
-        
         # Create a BytesIO object with the JSON data
-        output = BytesIO(json.dumps(overdue, indent=2).encode('utf-8'))
+        output = BytesIO(current_app.json.dumps(overdue).encode('utf-8'))
         
         return send_file(
             output,
@@ -671,9 +787,11 @@ def get_overdue_loans_report():
         current_app.logger.error(f"Error generating overdue loans report: {str(e)}")
         return jsonify({'error': 'Failed to generate report'}), 500
 
-@app.route('/api/reports/reader-activity', methods=['GET'])
+@api.route('/api/reports/reader-activity', methods=['GET'])
 @jwt_required()
 def get_reader_activity_report():
+    import csv
+
     try:
         query = """
             SELECT 
@@ -723,7 +841,7 @@ def get_reader_activity_report():
         current_app.logger.error(f"Error generating reader activity report: {str(e)}")
         return jsonify({'error': 'Failed to generate report'}), 500
 
-@app.route('/api/reports/popular-books', methods=['GET'])
+@api.route('/api/reports/popular-books', methods=['GET'])
 @jwt_required()
 def get_popular_books_report():
     try:
@@ -751,7 +869,7 @@ def get_popular_books_report():
         books = [dict(row) for row in result]
         
         # Create a BytesIO object with the JSON data
-        output = BytesIO(json.dumps(books, indent=2).encode('utf-8'))
+        output = BytesIO(current_app.json.dumps(books).encode('utf-8'))
         
         return send_file(
             output,
@@ -763,9 +881,11 @@ def get_popular_books_report():
         current_app.logger.error(f"Error generating popular books report: {str(e)}")
         return jsonify({'error': 'Failed to generate report'}), 500
 
-@app.route('/api/reports/user-statistics', methods=['GET'])
+@api.route('/api/reports/user-statistics', methods=['GET'])
 @jwt_required()
 def get_user_statistics_report():
+    import csv
+
     claims = get_jwt()
     if claims.get('role') != 'admin':
         return jsonify({'error': 'Unauthorized'}), 403
@@ -811,7 +931,7 @@ def get_user_statistics_report():
         download_name=f'user_statistics_{datetime.now().strftime("%Y%m%d")}.csv'
     )
 
-@app.route('/api/reader-requests/<int:request_id>/approve', methods=['POST'])
+@api.route('/api/reader-requests/<int:request_id>/approve', methods=['POST'])
 @jwt_required()
 def approve_reader_request(request_id):
     claims = get_jwt()
@@ -861,7 +981,7 @@ def approve_reader_request(request_id):
         current_app.logger.error(f"Error approving reader request: {str(e)}")
         return jsonify({'error': 'Failed to approve request'}), 500
 
-@app.route('/api/reader-requests/<int:request_id>/reject', methods=['POST'])
+@api.route('/api/reader-requests/<int:request_id>/reject', methods=['POST'])
 @jwt_required()
 def reject_reader_request(request_id):
     claims = get_jwt()
@@ -902,7 +1022,144 @@ def reject_reader_request(request_id):
         current_app.logger.error(f"Error rejecting reader request: {str(e)}")
         return jsonify({'error': 'Failed to reject request'}), 500
 
-@app.route('/api/reservations', methods=['POST', 'OPTIONS'])
+MAX_BULK_REQUESTS = 5000
+
+def _bulk_request_ids(data):
+    # None unless the body carries a non-empty list of integer ids
+    ids = (data or {}).get('request_ids')
+    if not isinstance(ids, list) or not ids or len(ids) > MAX_BULK_REQUESTS:
+        return None
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return None
+    return ids
+
+@api.route('/api/reader-requests/bulk-approve', methods=['POST'])
+@jwt_required()
+def bulk_approve_reader_requests():
+    claims = get_jwt()
+    if claims.get('role') not in ['admin', 'worker']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    request_ids = _bulk_request_ids(request.get_json(silent=True))
+    if request_ids is None:
+        return jsonify({'error': f'request_ids must be a list of 1 to {MAX_BULK_REQUESTS} ids'}), 400
+
+    try:
+        with db.session.begin():
+            # One INSERT for every reader, so the reader_summary refresh
+            # trigger fires once per batch instead of once per request. Users
+            # who already have a reader profile (or two requests in the batch)
+            # only get one.
+            query = """
+                WITH requested AS (
+                    SELECT DISTINCT unnest(CAST(:request_ids AS integer[])) AS id
+                ),
+                claimed AS (
+                    SELECT rr.id, rr.user_id, rr.first_name, rr.last_name, rr.address, rr.phone_number
+                    FROM reader_registration_requests rr
+                    JOIN requested q ON rr.id = q.id
+                    WHERE rr.status = 'pending'
+                    FOR UPDATE OF rr
+                ),
+                eligible AS (
+                    SELECT DISTINCT ON (c.user_id) c.*
+                    FROM claimed c
+                    WHERE NOT EXISTS (SELECT 1 FROM readers r WHERE r.user_id = c.user_id)
+                    ORDER BY c.user_id, c.id
+                ),
+                new_readers AS (
+                    INSERT INTO readers (user_id, first_name, last_name, address, phone_number)
+                    SELECT user_id, first_name, last_name, address, phone_number
+                    FROM eligible
+                    RETURNING id, user_id, card_number
+                ),
+                approved AS (
+                    UPDATE reader_registration_requests rr
+                    SET status = 'approved',
+                        processed_by = :processor_id,
+                        processed_at = CURRENT_TIMESTAMP
+                    FROM eligible e
+                    JOIN new_readers nr ON nr.user_id = e.user_id
+                    WHERE rr.id = e.id
+                    RETURNING rr.id, nr.id as reader_id, nr.card_number
+                )
+                SELECT
+                    q.id, a.reader_id, a.card_number,
+                    CASE
+                        WHEN a.id IS NOT NULL THEN NULL
+                        WHEN c.id IS NULL THEN 'Request not found or already processed'
+                        ELSE 'User already has a reader profile'
+                    END as error
+                FROM requested q
+                LEFT JOIN claimed c ON c.id = q.id
+                LEFT JOIN approved a ON a.id = q.id
+                ORDER BY q.id
+            """
+
+            results = [dict(row) for row in db.session.execute(query, {
+                'request_ids': request_ids,
+                'processor_id': get_jwt_identity()
+            })]
+
+        approved = sum(1 for r in results if r['error'] is None)
+        current_app.logger.info(f"Bulk approved {approved} of {len(results)} reader requests")
+        return jsonify({'results': results, 'approved': approved, 'failed': len(results) - approved}), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Error bulk approving reader requests: {str(e)}")
+        return jsonify({'error': 'Failed to approve requests'}), 500
+
+@api.route('/api/reader-requests/bulk-reject', methods=['POST'])
+@jwt_required()
+def bulk_reject_reader_requests():
+    claims = get_jwt()
+    if claims.get('role') not in ['admin', 'worker']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    data = request.get_json(silent=True)
+    request_ids = _bulk_request_ids(data)
+    if request_ids is None:
+        return jsonify({'error': f'request_ids must be a list of 1 to {MAX_BULK_REQUESTS} ids'}), 400
+
+    try:
+        with db.session.begin():
+            query = """
+                WITH requested AS (
+                    SELECT DISTINCT unnest(CAST(:request_ids AS integer[])) AS id
+                ),
+                rejected AS (
+                    UPDATE reader_registration_requests
+                    SET status = 'rejected',
+                        processed_by = :processor_id,
+                        processed_at = CURRENT_TIMESTAMP,
+                        rejection_reason = :reason
+                    WHERE id IN (SELECT id FROM requested)
+                    AND status = 'pending'
+                    RETURNING id
+                )
+                SELECT
+                    q.id,
+                    CASE WHEN r.id IS NULL THEN 'Request not found or already processed' END as error
+                FROM requested q
+                LEFT JOIN rejected r ON r.id = q.id
+                ORDER BY q.id
+            """
+
+            results = [dict(row) for row in db.session.execute(query, {
+                'request_ids': request_ids,
+                'processor_id': get_jwt_identity(),
+                'reason': data.get('reason', '')
+            })]
+
+        rejected = sum(1 for r in results if r['error'] is None)
+        current_app.logger.info(f"Bulk rejected {rejected} of {len(results)} reader requests")
+        return jsonify({'results': results, 'rejected': rejected, 'failed': len(results) - rejected}), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Error bulk rejecting reader requests: {str(e)}")
+        return jsonify({'error': 'Failed to reject requests'}), 500
+
+@api.route('/api/reservations', methods=['POST', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required(optional=True)
 def create_reservation():
@@ -943,52 +1200,90 @@ def create_reservation():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
-        validation = db.session.execute(validation_query, {
-            'book_id': data['book_id'],
-            'start_date': start_date,
-            'end_date': end_date,
-            'user_id': user_id
-        }).first()
-
-        if not validation.book_exists:
-            return jsonify({'error': 'Book not found'}), 404
-        if not validation.reader_id:
-            return jsonify({'error': 'User is not a registered reader'}), 403
-        if validation.book_status != 'available':
-            return jsonify({'error': f'Book is not available (current status: {validation.book_status})'}), 400
-        if validation.has_conflict:
-            return jsonify({'error': f'Book is already reserved by {validation.current_holder}'}), 400
-
-        # Create reservation
         insert_query = """
             INSERT INTO reservations (
-                book_id, reader_id, start_date, end_date, status, created_at
+                book_id, copy_id, reader_id, start_date, end_date, status, created_at
             )
             VALUES (
-                :book_id, :reader_id, :start_date, :end_date, 'pending', CURRENT_TIMESTAMP
+                :book_id, :copy_id, :reader_id, :start_date, :end_date, 'pending', CURRENT_TIMESTAMP
             )
             RETURNING id
         """
-        reservation_id = db.session.execute(insert_query, {
-            'book_id': data['book_id'],
-            'reader_id': validation.reader_id,
-            'start_date': start_date,
-            'end_date': end_date
-        }).scalar()
 
-        db.session.commit()
+        waitlist_query = """
+            WITH new_entry AS (
+                INSERT INTO reservation_waitlist (book_id, reader_id, start_date, end_date)
+                VALUES (:book_id, :reader_id, :start_date, :end_date)
+                ON CONFLICT (book_id, reader_id) WHERE status = 'waiting' DO NOTHING
+                RETURNING id
+            )
+            SELECT
+                id,
+                (SELECT COUNT(*) FROM reservation_waitlist w
+                 WHERE w.book_id = :book_id AND w.status = 'waiting') + 1 as position
+            FROM new_entry
+        """
 
-        return jsonify({
-            'message': 'Reservation created successfully',
-            'reservation_id': reservation_id
-        }), 201
+        def join_waitlist(reader_id):
+            entry = db.session.execute(waitlist_query, {
+                'book_id': data['book_id'],
+                'reader_id': reader_id,
+                'start_date': start_date,
+                'end_date': end_date
+            }).first()
+            if not entry:
+                return jsonify({'error': 'You are already on the waitlist for this book'}), 400
+            return jsonify({
+                'message': 'Added to the waitlist',
+                'waitlist_id': entry.id,
+                'position': entry.position
+            }), 202
+
+        def reserve():
+            # The availability check and the insert must see the same calendar
+            lock_books([data['book_id']])
+            validation = db.session.execute(validation_query, {
+                'book_id': data['book_id'],
+                'start_date': start_date,
+                'end_date': end_date,
+                'user_id': user_id
+            }).first()
+
+            if not validation.book_exists:
+                return jsonify({'error': 'Book not found'}), 404
+            if not validation.reader_id:
+                return jsonify({'error': 'User is not a registered reader'}), 403
+            # Whether a copy is on the shelf today doesn't matter: a free copy
+            # for the window books it, otherwise the reader can join the queue
+            if validation.has_conflict:
+                if data.get('waitlist'):
+                    return join_waitlist(validation.reader_id)
+                return jsonify({
+                    'error': f'Book is already reserved by {validation.current_holder}',
+                    'can_waitlist': True
+                }), 400
+
+            reservation_id = db.session.execute(insert_query, {
+                'book_id': data['book_id'],
+                'copy_id': validation.free_copy_id,
+                'reader_id': validation.reader_id,
+                'start_date': start_date,
+                'end_date': end_date
+            }).scalar()
+
+            return jsonify({
+                'message': 'Reservation created successfully',
+                'reservation_id': reservation_id
+            }), 201
+
+        return run_circulation(reserve)
 
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error creating reservation: {str(e)}")
         return jsonify({'error': 'Failed to create reservation'}), 500
 
-@app.route('/api/reservations/user', methods=['GET'])
+@api.route('/api/reservations/user', methods=['GET'])
 @jwt_required()
 def get_user_reservations():
     try:
@@ -1032,8 +1327,8 @@ def get_user_reservations():
                 'id': row.id,
                 'book_title': row.book_title,
                 'author': row.author_name,
-                'start_date': row.start_date.isoformat(),
-                'end_date': row.end_date.isoformat(),
+                'start_date': row.start_date,
+                'end_date': row.end_date,
                 'status': row.status,
                 'book_status': row.book_status
             } for row in rows]
@@ -1044,7 +1339,7 @@ def get_user_reservations():
         current_app.logger.error(f"Error fetching user reservations: {str(e)}")
         return jsonify({'error': 'Failed to fetch reservations'}), 500
 
-@app.route('/api/loans/books', methods=['GET'])
+@api.route('/api/loans/books', methods=['GET'])
 @jwt_required()
 def get_books_for_loans():
     try:
@@ -1060,24 +1355,14 @@ def get_books_for_loans():
                 JOIN authors a ON b.author_id = a.id
             JOIN reservations res ON b.id = res.book_id
             JOIN readers rd ON res.reader_id = rd.id
-            WHERE b.status = 'available'
+            WHERE b.available_copies > 0
             AND res.status = 'pending'
             AND CURRENT_DATE BETWEEN res.start_date AND res.end_date
-            AND NOT EXISTS (
-                SELECT 1 FROM loans l 
-                WHERE l.book_id = b.id 
-                AND l.status = 'borrowed'
-            )
             ORDER BY res.created_at ASC
         """
         
         result = db.session.execute(query)
         books = [dict(row) for row in result]
-        
-        # Convert datetime objects to ISO format
-        for book in books:
-            book['start_date'] = book['start_date'].isoformat()
-            book['end_date'] = book['end_date'].isoformat()
 
         return jsonify(books)
 
@@ -1085,7 +1370,7 @@ def get_books_for_loans():
         current_app.logger.error(f"Error fetching books for loans: {str(e)}")
         return jsonify({'error': 'Failed to fetch books'}), 500
 
-@app.route('/api/loans/readers', methods=['GET', 'OPTIONS'])
+@api.route('/api/loans/readers', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required(optional=True)
 def get_readers_for_loan():
@@ -1105,24 +1390,24 @@ def get_readers_for_loan():
                 r.card_number
             FROM readers r
             JOIN users u ON r.user_id = u.id
-            ORDER BY r.last_name, r.first_name
+            WHERE :q = ''
+            OR r.card_number = :q
+            OR LOWER(r.email) = LOWER(:q)
+            OR (r.first_name || ' ' || r.last_name) ILIKE :pattern
+            OR r.email ILIKE :pattern
+            OR r.card_number ILIKE :pattern
+            ORDER BY COALESCE(r.card_number = :q, false) DESC, r.last_name, r.first_name, r.id
+            LIMIT :limit OFFSET :offset
         """
         
-        result = db.session.execute(query)
-        readers = [{
-            'id': row.id,
-            'first_name': row.first_name,
-            'last_name': row.last_name,
-            'email': row.email,
-            'card_number': row.card_number
-        } for row in result]
-        
-        return jsonify(readers)
+        params = search_params()
+        rows = db.session.execute(query, params).fetchall()
+        return jsonify(search_page('readers', rows, params))
     except Exception as e:
         current_app.logger.error(f"Error fetching readers: {str(e)}")
         return jsonify({'error': 'Failed to fetch readers'}), 500
 
-@app.route('/api/loans', methods=['GET'])
+@api.route('/api/loans', methods=['GET'])
 @jwt_required()
 def get_loans():
     claims = get_jwt()
@@ -1166,12 +1451,6 @@ def get_loans():
 
         current_app.logger.info(f"Found {total} loans")
 
-        # Convert datetime objects to ISO format
-        for loan in loans:
-            loan['loan_date'] = loan['loan_date'].isoformat() if loan['loan_date'] else None
-            loan['return_date'] = loan['return_date'].isoformat() if loan['return_date'] else None
-            loan['due_date'] = loan['due_date'].isoformat() if loan['due_date'] else None
-
         return jsonify({
             'loans': loans,
             'total': total,
@@ -1183,7 +1462,7 @@ def get_loans():
         current_app.logger.error(f"Error fetching loans: {str(e)}")
         return jsonify({'error': 'Failed to fetch loans'}), 500
 
-@app.route('/api/loans', methods=['POST'])
+@api.route('/api/loans', methods=['POST'])
 @jwt_required()
 def create_loan():
     claims = get_jwt()
@@ -1192,52 +1471,67 @@ def create_loan():
 
     try:
         data = request.json
-        with db.session.begin():
-            # Single query to validate and create loan
-            query = """
-                WITH validation AS (
-                    SELECT 
-                        b.id as book_id,
-                        r.id as reader_id,
-                        res.id as reservation_id,
-                        b.status as book_status,
-                        res.status as reservation_status
-                    FROM books b
-                    JOIN reservations res ON b.id = res.book_id
-                    JOIN readers r ON res.reader_id = r.id
-                    WHERE b.id = :book_id 
-                    AND r.id = :reader_id
-                    AND res.status = 'pending'
-                    AND CURRENT_DATE BETWEEN res.start_date AND res.end_date
-                    LIMIT 1
-                ),
-                new_loan AS (
-                    INSERT INTO loans (book_id, reader_id, loan_date, status)
-                    SELECT book_id, reader_id, CURRENT_TIMESTAMP, 'borrowed'
-                    FROM validation
-                    WHERE book_status = 'available'
-                    AND reservation_status = 'pending'
-                    RETURNING id
-                ),
-                update_book AS (
-                    UPDATE books b
-                    SET status = 'borrowed'
-                    FROM validation v
-                    WHERE b.id = v.book_id
-                    AND EXISTS (SELECT 1 FROM new_loan)
-                ),
-                update_reservation AS (
-                    UPDATE reservations r
-                    SET status = 'completed'
-                    FROM validation v
-                    WHERE r.id = v.reservation_id
-                    AND EXISTS (SELECT 1 FROM new_loan)
+        # Single query to validate and create loan
+        query = """
+            WITH validation AS (
+                SELECT 
+                    res.id as reservation_id,
+                    res.book_id,
+                    res.reader_id,
+                    res.copy_id,
+                    res.end_date
+                FROM reservations res
+                WHERE res.book_id = :book_id 
+                AND res.reader_id = :reader_id
+                AND res.status = 'pending'
+                AND CURRENT_DATE BETWEEN res.start_date AND res.end_date
+                ORDER BY res.start_date
+                LIMIT 1
+            ),
+            allocated_copy AS (
+                -- Prefer the copy held for this reservation; never take a copy
+                -- another reader has booked for any part of this loan
+                SELECT c.id
+                FROM book_copies c
+                JOIN validation v ON c.book_id = v.book_id
+                WHERE c.status = 'available'
+                AND NOT EXISTS (
+                    SELECT 1 FROM reservations other
+                    WHERE other.copy_id = c.id
+                    AND other.id != v.reservation_id
+                    AND other.status NOT IN ('cancelled', 'expired')
+                    AND other.start_date <= v.end_date
+                    AND LEAST(other.end_date, other.released_on - 1) >= CURRENT_DATE
                 )
-                SELECT id, 
-                    (CASE WHEN id IS NULL THEN false ELSE true END) as success
-                FROM new_loan
-            """
-            
+                ORDER BY c.id = v.copy_id DESC, c.id
+                LIMIT 1
+            ),
+            new_loan AS (
+                INSERT INTO loans (book_id, copy_id, reader_id, loan_date, status)
+                SELECT v.book_id, c.id, v.reader_id, CURRENT_TIMESTAMP, 'borrowed'
+                FROM validation v, allocated_copy c
+                RETURNING id, copy_id
+            ),
+            update_copy AS (
+                UPDATE book_copies c
+                SET status = 'borrowed'
+                FROM new_loan nl
+                WHERE c.id = nl.copy_id
+            ),
+            update_reservation AS (
+                UPDATE reservations r
+                SET status = 'completed',
+                    copy_id = nl.copy_id
+                FROM validation v, new_loan nl
+                WHERE r.id = v.reservation_id
+            )
+            SELECT id, 
+                (CASE WHEN id IS NULL THEN false ELSE true END) as success
+            FROM new_loan
+        """
+
+        def checkout():
+            lock_books([data['book_id']])
             result = db.session.execute(query, {
                 'book_id': data['book_id'],
                 'reader_id': data['reader_id']
@@ -1251,46 +1545,68 @@ def create_loan():
                 'loan_id': result.id
             }), 201
 
+        return run_circulation(checkout)
+
     except Exception as e:
         current_app.logger.error(f"Error creating loan: {str(e)}")
         return jsonify({'error': 'Failed to create loan'}), 500
 
-@app.route('/api/loans/<int:loan_id>/return', methods=['POST'])
+@api.route('/api/loans/<int:loan_id>/return', methods=['POST'])
 @jwt_required()
 def return_book(loan_id):
     try:
-        with db.session.begin():
-            query = """
-                WITH loan_update AS (
-                UPDATE loans
-                SET status = 'returned',
-                    return_date = CURRENT_TIMESTAMP
-                WHERE id = :loan_id
-                    AND status = 'borrowed'
-                    RETURNING book_id
-                ),
-                book_update AS (
-                UPDATE books
-                SET status = 'available'
-                    FROM loan_update
-                    WHERE books.id = loan_update.book_id
-                    RETURNING 1
-                )
-                SELECT EXISTS (SELECT 1 FROM loan_update) as success
-            """
-            
+        query = """
+            WITH loan_update AS (
+            UPDATE loans
+            SET status = 'returned',
+                return_date = CURRENT_TIMESTAMP
+            WHERE id = :loan_id
+                AND status = 'borrowed'
+                RETURNING copy_id, reader_id
+            ),
+            copy_update AS (
+            UPDATE book_copies
+            SET status = 'available'
+                FROM loan_update
+                WHERE book_copies.id = loan_update.copy_id
+                RETURNING 1
+            ),
+            released_window AS (
+            -- An early return frees the rest of the booking it was checked
+            -- out against; end_date stays as the due date for history
+            UPDATE reservations r
+            SET released_on = CURRENT_DATE
+                FROM loan_update lu
+                WHERE r.copy_id = lu.copy_id
+                AND r.reader_id = lu.reader_id
+                AND r.status = 'completed'
+                AND r.released_on IS NULL
+                AND CURRENT_DATE BETWEEN r.start_date AND r.end_date
+                RETURNING 1
+            )
+            SELECT EXISTS (SELECT 1 FROM loan_update) as success
+        """
+
+        def give_back():
+            book_id = db.session.execute(
+                "SELECT book_id FROM loans WHERE id = :loan_id", {'loan_id': loan_id}
+            ).scalar()
+            lock_books([book_id])
             result = db.session.execute(query, {'loan_id': loan_id}).scalar()
 
             if not result:
                 return jsonify({'error': 'Invalid return request'}), 400
 
+            promote_waitlist(book_id)
             return jsonify({'message': 'Book returned successfully'}), 200
 
+        return run_circulation(give_back)
+
     except Exception as e:
         current_app.logger.error(f"Error returning book: {str(e)}")
         return jsonify({'error': 'Failed to return book'}), 500
 
-@app.route('/api/reservations/all', methods=['GET', 'OPTIONS'])
+@api.route('/api/reservations/all', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def get_all_reservations():
@@ -1301,14 +1617,18 @@ def get_all_reservations():
         page = request.args.get('page', 1, type=int)
         per_page = 10
         offset = (page - 1) * per_page
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        reservations = history_source(
+            'reservations', 'id, book_id, reader_id, start_date, end_date, status', include_archived
+        )
         
-        query = """
+        query = f"""
             SELECT 
                 res.id, res.start_date, res.end_date, res.status,
                 b.title,
                 CONCAT(r.first_name, ' ', r.last_name) as reader,
                 COUNT(*) OVER() as total_count
-            FROM reservations res
+            FROM {reservations} res
             JOIN books b ON res.book_id = b.id
             JOIN readers r ON res.reader_id = r.id
             ORDER BY res.start_date DESC
@@ -1327,11 +1647,6 @@ def get_all_reservations():
         
         current_app.logger.info(f"Found {total} reservations")
         
-        # Convert datetime objects to ISO format
-        for res in reservations:
-            res['start_date'] = res['start_date'].isoformat() if res['start_date'] else None
-            res['end_date'] = res['end_date'].isoformat() if res['end_date'] else None
-        
         return jsonify({
             'reservations': reservations,
             'total': total,
@@ -1343,7 +1658,7 @@ def get_all_reservations():
         current_app.logger.error(f"Error fetching reservations: {str(e)}")
         return jsonify({'error': 'Failed to fetch reservations'}), 500
 
-@app.route('/api/reservations/admin/create', methods=['POST', 'OPTIONS'])
+@api.route('/api/reservations/admin/create', methods=['POST', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def admin_create_reservation():
@@ -1362,41 +1677,46 @@ def admin_create_reservation():
         except ValueError:
             return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
 
-        with db.session.begin():
-            query = """
-                WITH validation AS (
-                    SELECT b.status
-                    FROM books b
-                    WHERE b.id = :book_id
-                ),
-                conflict_check AS (
+        query = """
+            WITH validation AS (
+                SELECT b.id
+                FROM books b
+                WHERE b.id = :book_id
+            ),
+            free_copy AS (
+                SELECT c.id
+                FROM book_copies c
+                WHERE c.book_id = :book_id
+                AND c.status != 'withdrawn'
+                AND NOT EXISTS (
                     SELECT 1
                     FROM reservations r
-                    WHERE r.book_id = :book_id
-                    AND r.status != 'cancelled'
+                    WHERE r.copy_id = c.id
+                    AND r.status NOT IN ('cancelled', 'expired')
                     AND r.start_date <= :end_date
-                    AND r.end_date >= :start_date
-                ),
-                new_reservation AS (
-                INSERT INTO reservations (
-                        book_id, reader_id, start_date, end_date, status
-                    )
-                    SELECT :book_id, :reader_id, :start_date, :end_date, 'pending'
-                    FROM validation
-                    WHERE status = 'available'
-                    AND NOT EXISTS (SELECT 1 FROM conflict_check)
-                RETURNING id
+                    AND LEAST(r.end_date, r.released_on - 1) >= :start_date
                 )
-                SELECT id, 
-                    CASE 
-                        WHEN NOT EXISTS (SELECT 1 FROM validation) THEN 'Book not found'
-                        WHEN (SELECT status FROM validation) != 'available' THEN 'Book not available'
-                        WHEN EXISTS (SELECT 1 FROM conflict_check) THEN 'Date conflict'
-                        ELSE NULL
-                    END as error
-                FROM new_reservation
-            """
-            
+                ORDER BY c.id
+                LIMIT 1
+            ),
+            new_reservation AS (
+            INSERT INTO reservations (
+                    book_id, copy_id, reader_id, start_date, end_date, status
+                )
+                SELECT :book_id, f.id, :reader_id, :start_date, :end_date, 'pending'
+                FROM validation, free_copy f
+            RETURNING id
+            )
+            SELECT (SELECT id FROM new_reservation) as id,
+                CASE 
+                    WHEN NOT EXISTS (SELECT 1 FROM validation) THEN 'Book not found'
+                    WHEN NOT EXISTS (SELECT 1 FROM free_copy) THEN 'Date conflict'
+                    ELSE NULL
+                END as error
+        """
+
+        def reserve():
+            lock_books([data['book_id']])
             result = db.session.execute(query, {
                 'book_id': data['book_id'],
                 'reader_id': data['reader_id'],
@@ -1406,47 +1726,127 @@ def admin_create_reservation():
 
             if not result or result.error:
                 return jsonify({'error': result.error or 'Failed to create reservation'}), 400
-            
+
             return jsonify({
                 'message': 'Reservation created successfully',
                 'reservation_id': result.id
             }), 201
 
+        return run_circulation(reserve)
+
     except Exception as e:
         current_app.logger.error(f"Error creating reservation: {str(e)}")
         return jsonify({'error': 'Failed to create reservation'}), 500
 
-@app.route('/api/reservations/<int:reservation_id>', methods=['DELETE'])
+@api.route('/api/reservations/<int:reservation_id>', methods=['DELETE'])
 @jwt_required()
 def delete_reservation(reservation_id):
     claims = get_jwt()
     if claims.get('role') not in ['admin', 'worker']:
         return jsonify({'error': 'Unauthorized'}), 403
 
+    query = """
+        UPDATE reservations 
+        SET status = 'cancelled'
+        WHERE id = :reservation_id
+        AND status = 'pending'
+        RETURNING book_id
+    """
+
+    def cancel():
+        book_id = db.session.execute(
+            "SELECT book_id FROM reservations WHERE id = :reservation_id",
+            {'reservation_id': reservation_id}
+        ).scalar()
+        lock_books([book_id])
+        if not db.session.execute(query, {'reservation_id': reservation_id}).scalar():
+            return jsonify({'error': 'Reservation not found or cannot be cancelled'}), 400
+
+        # The freed window goes to the next reader on the waitlist
+        promote_waitlist(book_id)
+        return jsonify({'message': 'Reservation cancelled successfully'}), 200
+
+    try:
+        return run_circulation(cancel)
+    except Exception as e:
+        current_app.logger.error(f"Error cancelling reservation: {str(e)}")
+        return jsonify({'error': 'Failed to cancel reservation'}), 500
+
+@api.route('/api/waitlist/user', methods=['GET'])
+@jwt_required()
+def get_user_waitlist():
+    try:
+        query = """
+            SELECT
+                w.id,
+                b.title as book_title,
+                w.start_date,
+                w.end_date,
+                w.status,
+                w.reservation_id,
+                CASE WHEN w.status = 'waiting' THEN (
+                    SELECT COUNT(*) FROM reservation_waitlist ahead
+                    WHERE ahead.book_id = w.book_id
+                    AND ahead.status = 'waiting'
+                    AND (ahead.created_at, ahead.id) <= (w.created_at, w.id)
+                ) END as position
+            FROM reservation_waitlist w
+            JOIN readers r ON w.reader_id = r.id
+            JOIN books b ON w.book_id = b.id
+            WHERE r.user_id = :user_id
+            AND w.status IN ('waiting', 'promoted')
+            AND w.end_date >= CURRENT_DATE
+            ORDER BY w.created_at DESC
+        """
+        result = db.session.execute(query, {'user_id': get_jwt_identity()})
+
+        return jsonify([{
+            'id': row.id,
+            'book_title': row.book_title,
+            'start_date': row.start_date,
+            'end_date': row.end_date,
+            'status': row.status,
+            'reservation_id': row.reservation_id,
+            'position': row.position
+        } for row in result])
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching waitlist: {str(e)}")
+        return jsonify({'error': 'Failed to fetch waitlist'}), 500
+
+@api.route('/api/waitlist/<int:entry_id>', methods=['DELETE'])
+@jwt_required()
+def leave_waitlist(entry_id):
+    claims = get_jwt()
     try:
+        # Readers may only withdraw their own entries; staff may withdraw any
+        query = """
+            UPDATE reservation_waitlist w
+            SET status = 'cancelled'
+            WHERE w.id = :entry_id
+            AND w.status = 'waiting'
+            AND (:is_staff OR EXISTS (
+                SELECT 1 FROM readers r WHERE r.id = w.reader_id AND r.user_id = :user_id
+            ))
+            RETURNING w.id
+        """
         with db.session.begin():
-            query = """
-                UPDATE reservations 
-                SET status = 'cancelled'
-                WHERE id = :reservation_id
-                AND status != 'completed'
-                RETURNING id
-            """
-            
             result = db.session.execute(query, {
-                'reservation_id': reservation_id
+                'entry_id': entry_id,
+                'is_staff': claims.get('role') in ['admin', 'worker'],
+                'user_id': get_jwt_identity()
             }).scalar()
 
             if not result:
-                return jsonify({'error': 'Reservation not found or cannot be cancelled'}), 400
-            
-            return jsonify({'message': 'Reservation cancelled successfully'}), 200
+                return jsonify({'error': 'Waitlist entry not found'}), 404
+
+            return jsonify({'message': 'Removed from the waitlist'}), 200
 
     except Exception as e:
-        current_app.logger.error(f"Error cancelling reservation: {str(e)}")
-        return jsonify({'error': 'Failed to cancel reservation'}), 500
+        current_app.logger.error(f"Error leaving waitlist: {str(e)}")
+        return jsonify({'error': 'Failed to leave waitlist'}), 500
 
-@app.route('/api/books/<int:book_id>', methods=['PUT', 'OPTIONS'])
+@api.route('/api/books/<int:book_id>', methods=['PUT', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def update_book(book_id):
@@ -1512,7 +1912,138 @@ def update_book(book_id):
         current_app.logger.error(f"Error updating book: {str(e)}")
         return jsonify({'error': 'Failed to update book'}), 500
 
-@app.route('/api/users/my-loans', methods=['GET', 'OPTIONS'])
+@api.route('/api/books/<int:book_id>/copies', methods=['GET', 'OPTIONS'])
+@cross_origin(supports_credentials=True)
+@jwt_required()
+def get_book_copies(book_id):
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    claims = get_jwt()
+    if claims.get('role') not in ['admin', 'worker']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    try:
+        query = """
+            SELECT
+                c.id,
+                c.barcode,
+                c.status,
+                c.created_at,
+                l.id as loan_id,
+                l.loan_date,
+                rd.first_name || ' ' || rd.last_name as borrower
+            FROM book_copies c
+            LEFT JOIN loans l ON l.copy_id = c.id AND l.status = 'borrowed'
+            LEFT JOIN readers rd ON l.reader_id = rd.id
+            WHERE c.book_id = :book_id
+            ORDER BY c.id
+        """
+        result = db.session.execute(query, {'book_id': book_id})
+
+        return jsonify([{
+            'id': row.id,
+            'barcode': row.barcode,
+            'status': row.status,
+            'created_at': row.created_at,
+            'loan_id': row.loan_id,
+            'loan_date': row.loan_date,
+            'borrower': row.borrower
+        } for row in result])
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching book copies: {str(e)}")
+        return jsonify({'error': 'Failed to fetch book copies'}), 500
+
+@api.route('/api/books/<int:book_id>/copies', methods=['POST'])
+@jwt_required()
+def add_book_copies(book_id):
+    claims = get_jwt()
+    if claims.get('role') not in ['admin', 'worker']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    data = request.json or {}
+    # Either pre-printed barcodes, one per copy, or a count of copies that
+    # get library barcodes assigned
+    barcodes = data.get('barcodes')
+    if barcodes is not None:
+        if not isinstance(barcodes, list) or not barcodes or not all(isinstance(b, str) and b.strip() for b in barcodes):
+            return jsonify({'error': 'Barcodes must be a non-empty list of strings'}), 400
+        barcodes = [b.strip().upper() for b in barcodes]
+    else:
+        count = data.get('count', 1)
+        if not isinstance(count, int) or count < 1:
+            return jsonify({'error': 'Number of copies must be a positive integer'}), 400
+        barcodes = [None] * count
+
+    query = """
+        INSERT INTO book_copies (book_id, barcode)
+        SELECT b.id, codes.barcode
+        FROM books b, unnest(CAST(:barcodes AS text[])) AS codes(barcode)
+        WHERE b.id = :book_id
+        RETURNING id, barcode
+    """
+
+    def add_copies():
+        lock_books([book_id])
+        copies = [dict(row) for row in db.session.execute(query, {'book_id': book_id, 'barcodes': barcodes})]
+        if not copies:
+            return jsonify({'error': 'Book not found'}), 404
+        promote_waitlist(book_id)
+        return jsonify({
+            'message': 'Copies added successfully',
+            'copy_ids': [copy['id'] for copy in copies],
+            'copies': copies
+        }), 201
+
+    try:
+        return run_circulation(add_copies)
+    except IntegrityError:
+        return jsonify({'error': 'Barcode already in use'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error adding book copies: {str(e)}")
+        return jsonify({'error': 'Failed to add book copies'}), 500
+
+@api.route('/api/copies/<int:copy_id>', methods=['DELETE'])
+@jwt_required()
+def withdraw_book_copy(copy_id):
+    claims = get_jwt()
+    if claims.get('role') not in ['admin', 'worker']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    # Only copies on the shelf can be withdrawn. Reservations held on the copy
+    # move to another free copy in the same transaction; if one has nowhere to
+    # go, the whole withdrawal is rolled back.
+    query = """
+        UPDATE book_copies
+        SET status = 'withdrawn'
+        WHERE id = :copy_id
+        AND status = 'available'
+        RETURNING id
+    """
+
+    def withdraw():
+        book_id = db.session.execute(
+            "SELECT book_id FROM book_copies WHERE id = :copy_id",
+            {'copy_id': copy_id}
+        ).scalar()
+        if book_id is None:
+            return jsonify({'error': 'Copy not found'}), 404
+        lock_books([book_id])
+        if not db.session.execute(query, {'copy_id': copy_id}).scalar():
+            return jsonify({'error': 'Copy is on loan or already withdrawn'}), 400
+        reassign_copy_reservations(copy_id)
+        return jsonify({'message': 'Copy withdrawn successfully'}), 200
+
+    try:
+        return run_circulation(withdraw)
+    except ReservationsStranded as e:
+        return jsonify({'error': f'{e.count} reservation(s) on this copy cannot be moved to another copy'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error withdrawing book copy: {str(e)}")
+        return jsonify({'error': 'Failed to withdraw book copy'}), 500
+
+@api.route('/api/users/my-loans', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def get_my_loans():
@@ -1521,17 +2052,21 @@ def get_my_loans():
         
     try:
         user_id = get_jwt_identity()
-        
-        query = """
+        # Loans past the retention period only when asked for
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        loans = history_source('loans', 'id, book_id, reader_id, loan_date, return_date, status', include_archived)
+        reservations = history_source('reservations', 'book_id, reader_id, end_date, status', include_archived)
+
+        query = f"""
             SELECT 
                 l.id, b.title, CONCAT(a.first_name, ' ', a.last_name) as author,
                 l.loan_date, l.return_date, l.status, res.end_date as due_date,
                 (l.status = 'borrowed' AND res.end_date < CURRENT_DATE) as is_overdue
-            FROM loans l
+            FROM {loans} l
             JOIN books b ON l.book_id = b.id
             JOIN authors a ON b.author_id = a.id
             JOIN readers r ON l.reader_id = r.id
-            LEFT JOIN reservations res ON l.book_id = res.book_id 
+            LEFT JOIN {reservations} res ON l.book_id = res.book_id 
                 AND l.reader_id = res.reader_id
                 AND res.status = 'completed'
             WHERE r.user_id = :user_id
@@ -1541,19 +2076,45 @@ def get_my_loans():
         result = db.session.execute(query, {'user_id': user_id})
         loans = [dict(row) for row in result]
         
-        # Convert datetime objects to ISO format strings
-        for loan in loans:
-            loan['loan_date'] = loan['loan_date'].isoformat()
-            loan['return_date'] = loan['return_date'].isoformat() if loan['return_date'] else None
-            loan['due_date'] = loan['due_date'].isoformat() if loan['due_date'] else None
-        
         return jsonify(loans)
 
     except Exception as e:
         current_app.logger.error(f"Error fetching user loans: {str(e)}")
         return jsonify({'error': 'Failed to fetch loans'}), 500
 
-@app.route('/api/users/my-reservations', methods=['GET', 'OPTIONS'])
+@api.route('/api/me/library', methods=['GET', 'OPTIONS'])
+@cross_origin(supports_credentials=True)
+@jwt_required()
+def get_my_library():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    try:
+        after, after_id = parse_cursor()
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    try:
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        library = reader_library(get_jwt_identity(), after, after_id, include_archived)
+        if library is None:
+            return jsonify({'error': 'User not found'}), 404
+
+        # Per-user and short-lived: the browser reuses it for a few seconds,
+        # then revalidates and gets a 304 if nothing changed. Pages send
+        # Cache-Control: no-cache to refetch right after their own changes.
+        response = jsonify(library)
+        response.cache_control.private = True
+        response.cache_control.max_age = current_app.config['MY_LIBRARY_MAX_AGE']
+        response.vary.add('Authorization')
+        response.add_etag()
+        return response.make_conditional(request)
+
+    except Exception as e:
+        current_app.logger.error(f"Error fetching reader library: {str(e)}")
+        return jsonify({'error': 'Failed to fetch library'}), 500
+
+@api.route('/api/users/my-reservations', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def get_my_reservations():
@@ -1579,18 +2140,38 @@ def get_my_reservations():
         result = db.session.execute(query, {'user_id': user_id})
         reservations = [dict(row) for row in result]
         
-        # Convert datetime objects to ISO format
-        for res in reservations:
-            res['start_date'] = res['start_date'].isoformat()
-            res['end_date'] = res['end_date'].isoformat()
-        
         return jsonify(reservations)
 
     except Exception as e:
         current_app.logger.error(f"Error fetching user reservations: {str(e)}")
         return jsonify({'error': 'Failed to fetch reservations'}), 500
 
-@app.route('/api/health', methods=['GET', 'OPTIONS'])
+@api.route('/api/sync', methods=['GET', 'OPTIONS'])
+@cross_origin(supports_credentials=True)
+@jwt_required()
+def sync_changes():
+    if request.method == 'OPTIONS':
+        return '', 200
+
+    claims = get_jwt()
+    if claims.get('role') not in ['admin', 'worker']:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    tables = [t.strip() for t in request.args.get('tables', ','.join(SYNC_TABLES)).split(',') if t.strip()]
+    unknown = [t for t in tables if t not in SYNC_TABLES]
+    if unknown:
+        return jsonify({'error': f"Unknown tables: {', '.join(unknown)}"}), 400
+
+    try:
+        # Call again with ?since=<next> until has_more is false
+        return jsonify(export_changes(tables, request.args.get('since'), request.args.get('limit', type=int)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error exporting changes: {str(e)}")
+        return jsonify({'error': 'Failed to export changes'}), 500
+
+@api.route('/api/health', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 def health_check():
     if request.method == 'OPTIONS':
@@ -1610,7 +2191,7 @@ def health_check():
             'error': str(e)
         }), 500
 
-@app.route('/api/books/available', methods=['GET', 'OPTIONS'])
+@api.route('/api/books/available', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required(optional=True)
 def get_available_books_for_reservation():
@@ -1628,20 +2209,16 @@ def get_available_books_for_reservation():
             SELECT 
                 b.id, b.title, b.isbn, b.publication_year, 
                 b.genre, b.status, b.description,
+                b.total_copies, b.available_copies,
                 CONCAT(a.first_name, ' ', a.last_name) as author_name,
                 p.name as publisher,
                 COUNT(*) OVER() as total_count
             FROM books b
             JOIN authors a ON b.author_id = a.id
             LEFT JOIN publishers p ON b.publisher_id = p.id
-            WHERE b.status = 'available'
+            WHERE b.status IN ('available', 'borrowed')
             AND (:title = '' OR LOWER(b.title) LIKE :title_pattern)
             AND (:author = '' OR LOWER(CONCAT(a.first_name, ' ', a.last_name)) LIKE :author_pattern)
-            AND NOT EXISTS (
-                SELECT 1 FROM loans l 
-                WHERE l.book_id = b.id 
-                AND l.status = 'borrowed'
-            )
             ORDER BY b.title
             LIMIT :limit OFFSET :offset
         """
@@ -1668,6 +2245,8 @@ def get_available_books_for_reservation():
                 'genre': row.genre,
                 'status': row.status,
                 'description': row.description,
+                'total_copies': row.total_copies,
+                'available_copies': row.available_copies,
                 'author': row.author_name,
                 'publisher': row.publisher
             })
@@ -1687,7 +2266,7 @@ def get_available_books_for_reservation():
         current_app.logger.error(f"Error fetching available books: {str(e)}")
         return jsonify({'error': 'Failed to fetch books'}), 500
 
-@app.route('/api/loans/active', methods=['GET', 'OPTIONS'])
+@api.route('/api/loans/active', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required(optional=True)
 def get_active_loans():
@@ -1717,19 +2296,13 @@ def get_active_loans():
         result = db.session.execute(query, {'user_id': user_id})
         loans = [dict(row) for row in result]
         
-        # Convert datetime objects to ISO format strings
-        for loan in loans:
-            loan['loan_date'] = loan['loan_date'].isoformat()
-            loan['return_date'] = loan['return_date'].isoformat() if loan['return_date'] else None
-            loan['due_date'] = loan['due_date'].isoformat() if loan['due_date'] else None
-        
         return jsonify(loans)
 
     except Exception as e:
         current_app.logger.error(f"Error fetching active loans: {str(e)}")
         return jsonify({'error': 'Failed to fetch active loans'}), 500
 
-@app.route('/api/loans/history', methods=['GET', 'OPTIONS'])
+@api.route('/api/loans/history', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required(optional=True)
 def get_loan_history():
@@ -1738,17 +2311,21 @@ def get_loan_history():
         
     try:
         user_id = get_jwt_identity()
-        
-        query = """
+        # Loans past the retention period only when asked for
+        include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+        loans = history_source('loans', 'id, book_id, reader_id, loan_date, return_date, status', include_archived)
+        reservations = history_source('reservations', 'book_id, reader_id, end_date, status', include_archived)
+
+        query = f"""
             SELECT 
                 l.id, b.title, CONCAT(a.first_name, ' ', a.last_name) as author,
                 l.loan_date, l.return_date, l.status, res.end_date as due_date,
                 (l.status = 'borrowed' AND res.end_date < CURRENT_DATE) as is_overdue
-            FROM loans l
+            FROM {loans} l
             JOIN books b ON l.book_id = b.id
             JOIN authors a ON b.author_id = a.id
             JOIN readers r ON l.reader_id = r.id
-            LEFT JOIN reservations res ON l.book_id = res.book_id 
+            LEFT JOIN {reservations} res ON l.book_id = res.book_id 
                 AND l.reader_id = res.reader_id
                 AND res.status = 'completed'
             WHERE r.user_id = :user_id
@@ -1759,24 +2336,33 @@ def get_loan_history():
         result = db.session.execute(query, {'user_id': user_id})
         loans = [dict(row) for row in result]
         
-        # Convert datetime objects to ISO format strings
-        for loan in loans:
-            loan['loan_date'] = loan['loan_date'].isoformat()
-            loan['return_date'] = loan['return_date'].isoformat() if loan['return_date'] else None
-            loan['due_date'] = loan['due_date'].isoformat() if loan['due_date'] else None
-        
         return jsonify(loans)
 
     except Exception as e:
         current_app.logger.error(f"Error fetching loan history: {str(e)}")
         return jsonify({'error': 'Failed to fetch loan history'}), 500
 
-@app.route('/api/reports/generate', methods=['GET', 'OPTIONS'])
+def _report_cell(value):
+    # Formats a value for a PDF table cell; JSON responses are handled by the app's JSON provider
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    if isinstance(value, timedelta):
+        return str(value.days)
+    return str(value)
+
+@api.route('/api/reports/generate', methods=['GET', 'OPTIONS'])
 @cross_origin(supports_credentials=True)
 @jwt_required()
 def generate_report():
     if request.method == 'OPTIONS':
         return jsonify({}), 200
+
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
         
     try:
         report_type = request.args.get('type')
@@ -1881,16 +2467,6 @@ def generate_report():
             
         result = db.session.execute(query, {'start_date': start_date, 'end_date': end_date})
         data = [dict(row) for row in result]
-        
-        # Convert datetime objects to string format
-        for row in data:
-            for key, value in row.items():
-                if isinstance(value, datetime):
-                    row[key] = value.strftime('%Y-%m-%d %H:%M:%S')
-                elif isinstance(value, date):
-                    row[key] = value.strftime('%Y-%m-%d')
-                elif isinstance(value, timedelta):
-                    row[key] = value.days
                     
         # Create PDF using reportlab
         buffer = BytesIO()
@@ -1906,7 +2482,7 @@ def generate_report():
         if data:
             table_data = [[Paragraph(str(key), getSampleStyleSheet()['Heading2']) for key in data[0].keys()]]
             for row in data:
-                table_data.append([Paragraph(str(value), getSampleStyleSheet()['Normal']) for value in row.values()])
+                table_data.append([Paragraph(_report_cell(value), getSampleStyleSheet()['Normal']) for value in row.values()])
             
             table = Table(table_data)
             table.setStyle(TableStyle([
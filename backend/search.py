@@ -0,0 +1,64 @@
+"""Query-string handling for the paginated people search endpoints.
+
+``?q=`` is matched exactly against card numbers and e-mail addresses and as a
+substring (backed by pg_trgm indexes) against names, usernames and e-mail.
+Pages are fetched with ``LIMIT per_page + 1`` so the response can say whether
+there is a next page without counting the whole table.
+
+Queues that only ever page forward from the newest row (the reader-request
+moderation lists, a user's loans) use keyset cursors instead of offsets:
+``?cursor=`` carries the sort key and id of the last row shown.
+"""
+from datetime import datetime
+
+from flask import request
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def like_pattern(term):
+    """``%term%`` with LIKE wildcards in the term itself escaped."""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_params():
+    """Bind parameters for a search query: q, pattern, limit and offset."""
+    term = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), 1), MAX_PER_PAGE)
+    return {
+        'q': term,
+        'pattern': like_pattern(term),
+        'page': page,
+        'per_page': per_page,
+        'limit': per_page + 1,
+        'offset': (page - 1) * per_page,
+    }
+
+
+def search_page(key, rows, params):
+    """Response body for one page of ``rows`` fetched with :func:`search_params`."""
+    return {
+        key: [dict(row) for row in rows[:params['per_page']]],
+        'current_page': params['page'],
+        'has_next': len(rows) > params['per_page'],
+    }
+
+
+def keyset_cursor(row, key):
+    """Cursor for the page after ``row``, which is ordered by ``(key, id)``."""
+    return f"{row[key].isoformat()},{row['id']}"
+
+
+def parse_cursor():
+    """``(timestamp, id)`` from ``?cursor=``, ``(None, None)`` without one.
+
+    Raises ValueError for a malformed cursor.
+    """
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return None, None
+    value, _, row_id = cursor.rpartition(',')
+    return datetime.fromisoformat(value), int(row_id)
@@ -0,0 +1,126 @@
+"""Slow-query recorder.
+
+Statements slower than ``SLOW_QUERY_THRESHOLD_MS`` are kept in a bounded,
+per-process ring buffer together with the shape of their bind parameters,
+the route that issued them and an ``EXPLAIN (FORMAT JSON)`` plan.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from flask import current_app, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXPLAINABLE = re.compile(r'^\s*(?:/\*.*?\*/\s*)*(select|with|insert|update|delete)\b', re.IGNORECASE | re.DOTALL)
+
+
+class SlowQueryRecorder:
+    def __init__(self, maxlen):
+        self._records = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self, limit=None):
+        with self._lock:
+            records = list(self._records)
+        records.reverse()
+        return records[:limit] if limit else records
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+
+def parameter_shape(parameters):
+    # Record types only; values may contain personal data
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return None
+
+
+def explain(cursor, statement, parameters):
+    # Runs on the raw DBAPI connection so it doesn't re-enter the engine
+    # events, inside a savepoint so a failing EXPLAIN can't abort the caller's
+    # transaction.
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            explain_cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+            plan = explain_cursor.fetchone()[0]
+            explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+            return plan, None
+        except Exception as e:
+            explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            return None, str(e)
+    except Exception as e:
+        return None, str(e)
+    finally:
+        explain_cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['slow_query_start'].pop()) * 1000
+    if not has_app_context():
+        return
+    recorder = current_app.extensions.get('slow_queries')
+    if recorder is None or elapsed_ms < current_app.config['SLOW_QUERY_THRESHOLD_MS']:
+        return
+
+    record = {
+        'recorded_at': datetime.utcnow(),
+        'duration_ms': round(elapsed_ms, 3),
+        'statement': statement,
+        'parameters': parameter_shape(parameters),
+        'executemany': executemany,
+        'route': None,
+        'endpoint': None,
+        'method': None,
+        'plan': None,
+        'explain_error': None,
+    }
+    if has_request_context():
+        record['route'] = request.url_rule.rule if request.url_rule else request.path
+        record['endpoint'] = request.endpoint
+        record['method'] = request.method
+    if current_app.config['SLOW_QUERY_EXPLAIN'] and not executemany and EXPLAINABLE.match(statement):
+        record['plan'], record['explain_error'] = explain(cursor, statement, parameters)
+
+    recorder.add(record)
+    current_app.logger.warning(
+        f"Slow query ({record['duration_ms']} ms) on {record['method']} {record['route']}"
+    )
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('slow_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def init_app(app):
+    app.config.setdefault('SLOW_QUERY_THRESHOLD_MS', float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200)))
+    app.config.setdefault('SLOW_QUERY_BUFFER_SIZE', int(os.environ.get('SLOW_QUERY_BUFFER_SIZE', 200)))
+    app.config.setdefault('SLOW_QUERY_EXPLAIN', os.environ.get('SLOW_QUERY_EXPLAIN', '1') != '0')
+    app.extensions['slow_queries'] = SlowQueryRecorder(app.config['SLOW_QUERY_BUFFER_SIZE'])
+
+    for name, listener in (
+        ('before_cursor_execute', _before_cursor_execute),
+        ('after_cursor_execute', _after_cursor_execute),
+        ('handle_error', _handle_error),
+    ):
+        if not event.contains(Engine, name, listener):
+            event.listen(Engine, name, listener)
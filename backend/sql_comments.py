@@ -0,0 +1,72 @@
+"""sqlcommenter-style statement tagging.
+
+Every statement issued while handling a request gets a trailing comment
+such as::
+
+    /*controller='api.get_books',request_id='9f1c...',route='%2Fapi%2Fbooks'*/
+
+pg_stat_statements ignores comments when computing ``queryid`` but keeps the
+text of the first execution it saw, so each entry can be traced back to the
+route and view that issued it. Statements that are byte-for-byte identical
+across several routes collapse into one entry attributed to whichever route
+ran first.
+"""
+import re
+import uuid
+from urllib.parse import quote, unquote
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+COMMENT = re.compile(r"/\*((?:\w+='[^']*',?)+)\*/\s*$")
+PAIR = re.compile(r"(\w+)='([^']*)'")
+
+
+def build_comment(tags):
+    # Values are fully URL-encoded, so they can't contain quotes or '*/'
+    return '/*' + ','.join(f"{key}='{quote(str(value), safe='')}'" for key, value in sorted(tags.items())) + '*/'
+
+
+def parse_comment(statement):
+    """Return the tags of a statement tagged by :func:`build_comment`."""
+    match = COMMENT.search(statement)
+    if not match:
+        return {}
+    return {key: unquote(value.replace('%%', '%')) for key, value in PAIR.findall(match.group(1))}
+
+
+def _tag_statement(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context() or 'request_id' not in g:
+        return statement, parameters
+
+    comment = build_comment({
+        'route': request.url_rule.rule if request.url_rule else 'unmatched',
+        'controller': request.endpoint or 'unknown',
+        'request_id': g.request_id,
+    })
+    # psycopg2 applies %-formatting whenever parameters are passed
+    if parameters is not None:
+        comment = comment.replace('%', '%%')
+    return f"{statement.rstrip().rstrip(';')} {comment}", parameters
+
+
+def _assign_request_id():
+    incoming = request.headers.get(REQUEST_ID_HEADER, '')
+    g.request_id = incoming if VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+
+def _expose_request_id(response):
+    if 'request_id' in g:
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+    return response
+
+
+def init_app(app):
+    if not event.contains(Engine, 'before_cursor_execute', _tag_statement):
+        event.listen(Engine, 'before_cursor_execute', _tag_statement, retval=True)
+
+    app.before_request(_assign_request_id)
+    app.after_request(_expose_request_id)
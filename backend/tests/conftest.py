@@ -0,0 +1,142 @@
+"""Fixtures for endpoint tests against a local Postgres database.
+
+Set ``TEST_DATABASE_URL`` to a database the suite is allowed to wipe, e.g.::
+
+    createdb library_test
+    TEST_DATABASE_URL=postgresql://postgres@localhost/library_test python -m pytest
+
+Each test starts from ``database/init.sql`` (schema and seed data) plus the
+default ``admin`` account. Without the variable every test is skipped.
+"""
+import os
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from sql_comments import COMMENT
+
+INIT_SQL = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'init.sql')
+ADMIN_PASSWORD = 'admin'
+
+
+class QueryCounter:
+    """Counts statements and the rows they returned (SELECT or RETURNING)."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        rows = cursor.rowcount if cursor.description is not None else 0
+        self.statements.append((COMMENT.sub('', statement).strip(), max(rows, 0)))
+
+    @property
+    def queries(self):
+        return len(self.statements)
+
+    @property
+    def rows(self):
+        return sum(rows for _, rows in self.statements)
+
+    def report(self):
+        return '\n'.join(f'  [{rows} rows] {" ".join(sql.split())[:160]}' for sql, rows in self.statements)
+
+
+@pytest.fixture(scope='session')
+def app():
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+
+    from app import create_app
+    return create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SLOW_QUERY_EXPLAIN': False,
+    })
+
+
+@pytest.fixture(autouse=True)
+def database(app):
+    from app import db, create_admin_if_not_exists
+
+    with open(INIT_SQL) as f:
+        init_sql = f.read()
+
+    with app.app_context():
+        conn = db.engine.raw_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(init_sql)
+            conn.commit()
+        finally:
+            conn.close()
+        create_admin_if_not_exists(ADMIN_PASSWORD)
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    """auth_headers('jane_smith') -> Authorization header for that seeded user."""
+    from flask_jwt_extended import create_access_token
+    from app import db
+
+    def headers(username):
+        with app.app_context():
+            user = db.session.execute(
+                "SELECT id, role FROM users WHERE username = :username", {'username': username}
+            ).first()
+            db.session.remove()
+            token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
+        return {'Authorization': f'Bearer {token}'}
+
+    return headers
+
+
+@pytest.fixture
+def lookup(app):
+    """Run a scalar query against the test database outside of any budget."""
+    from app import db
+
+    def scalar(query, **params):
+        with app.app_context():
+            value = db.session.execute(query, params).scalar()
+            db.session.remove()
+        return value
+
+    return scalar
+
+
+@pytest.fixture
+def sql_budget(app):
+    """Fail the test if the wrapped requests exceed a statement or row budget.
+
+        with sql_budget(queries=1, rows=9):
+            client.get('/api/books')
+    """
+    from app import db
+
+    with app.app_context():
+        engine = db.engine
+
+    @contextmanager
+    def budget(queries, rows):
+        counter = QueryCounter()
+        event.listen(engine, 'after_cursor_execute', counter)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, 'after_cursor_execute', counter)
+        assert counter.queries <= queries, (
+            f'{counter.queries} statements, budget is {queries}:\n{counter.report()}'
+        )
+        assert counter.rows <= rows, (
+            f'{counter.rows} rows fetched, budget is {rows}:\n{counter.report()}'
+        )
+
+    return budget
@@ -0,0 +1,124 @@
+BOOK = {
+    'title': 'The Left Hand of Darkness',
+    'isbn': '9780441478125',
+    'publication_year': 1969,
+    'genre': 'Science Fiction',
+    'author_first_name': 'Ursula K.',
+    'author_last_name': 'Le Guin',
+    'publisher': 'Ace Books',
+}
+
+
+def test_catalog_page(client, sql_budget):
+    with sql_budget(queries=1, rows=9):
+        response = client.get('/api/books?page=2')
+    assert response.status_code == 200
+    assert response.json['total'] == 20
+
+
+def test_catalog_search(client, sql_budget):
+    with sql_budget(queries=1, rows=9):
+        response = client.get('/api/books?title=the&genre=Science Fiction')
+    assert response.status_code == 200
+
+
+def test_available_books(client, auth_headers, sql_budget):
+    headers = auth_headers('john_doe')
+    with sql_budget(queries=1, rows=10):
+        response = client.get('/api/available-books', headers=headers)
+    assert response.status_code == 200
+    assert response.json['total'] == 18
+
+
+def test_available_books_for_reservation(client, auth_headers, sql_budget):
+    headers = auth_headers('john_doe')
+    with sql_budget(queries=1, rows=9):
+        response = client.get('/api/books/available?author=martin', headers=headers)
+    assert response.status_code == 200
+
+
+def test_add_book(client, auth_headers, sql_budget):
+    headers = auth_headers('admin')
+    with sql_budget(queries=4, rows=3):
+        response = client.post('/books', json=dict(BOOK, copies=3), headers=headers)
+    assert response.status_code == 201
+
+
+def test_update_book(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = 'Dune'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=2, rows=2):
+        response = client.put(f'/api/books/{book_id}', json=dict(BOOK, description=''), headers=headers)
+    assert response.status_code == 200
+
+
+def test_book_reservations(client, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = 'Clean Code'")
+    with sql_budget(queries=1, rows=1):
+        response = client.get(f'/api/reservations/book/{book_id}')
+    assert response.status_code == 200
+
+
+def test_book_copies(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = 'Clean Code'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=1):
+        response = client.get(f'/api/books/{book_id}/copies', headers=headers)
+    assert response.status_code == 200
+    assert response.json[0]['status'] == 'borrowed'
+
+
+def test_add_and_withdraw_copies(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = 'Clean Code'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=3, rows=4):
+        response = client.post(f'/api/books/{book_id}/copies', json={'count': 2}, headers=headers)
+    assert response.status_code == 201
+    assert lookup("SELECT available_copies FROM books WHERE id = :id", id=book_id) == 2
+
+    copy_id = response.json['copy_ids'][0]
+    with sql_budget(queries=4, rows=4):
+        response = client.delete(f'/api/copies/{copy_id}', headers=headers)
+    assert response.status_code == 200
+    assert lookup("SELECT status FROM books WHERE id = :id", id=book_id) == 'available'
+
+
+def test_withdraw_reserved_copy(client, auth_headers, lookup):
+    # prof_smith's upcoming reservation is held on the title's only copy
+    book_id, copy_id = lookup("""
+        SELECT ARRAY[book_id, copy_id] FROM reservations
+        WHERE reader_id = (SELECT id FROM readers WHERE email = 'prof.smith@university.edu')
+    """)
+    headers = auth_headers('worker_1')
+    response = client.delete(f'/api/copies/{copy_id}', headers=headers)
+    assert response.status_code == 400
+    assert lookup("SELECT status FROM book_copies WHERE id = :id", id=copy_id) == 'available'
+
+    new_copy_id = client.post(f'/api/books/{book_id}/copies', json={'count': 1}, headers=headers).json['copy_ids'][0]
+    response = client.delete(f'/api/copies/{copy_id}', headers=headers)
+    assert response.status_code == 200
+    assert lookup("SELECT copy_id FROM reservations WHERE book_id = :id", id=book_id) == new_copy_id
+
+
+def test_lookup_codes(client, auth_headers, lookup, sql_budget):
+    copy_barcode = lookup("""
+        SELECT c.barcode FROM book_copies c JOIN books b ON c.book_id = b.id WHERE b.title = '1Q84'
+    """)
+    headers = auth_headers('worker_1')
+    # ISBN-10 form of Clean Code, a copy barcode and an unknown code in one round trip
+    with sql_budget(queries=1, rows=2):
+        response = client.get(f'/api/books/lookup?code=0-13-235088-2&code={copy_barcode.lower()}&code=123',
+                              headers=headers)
+    assert response.status_code == 200
+    clean_code, copy, unknown = response.json['results']
+    assert clean_code['isbn13'] == '9780132350884'
+    assert clean_code['book']['title'] == 'Clean Code'
+    assert copy['book']['title'] == '1Q84'
+    assert copy['copy']['status'] == 'available'
+    assert unknown['book'] is None
+
+
+def test_catalog_exact_isbn(client, sql_budget):
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/books?isbn=0132350882')
+    assert [b['title'] for b in response.json['books']] == ['Clean Code']
@@ -0,0 +1,156 @@
+def test_loans_page(client, auth_headers, sql_budget):
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=10):
+        response = client.get('/api/loans', headers=headers)
+    assert response.status_code == 200
+    assert response.json['total'] == 4
+
+
+def test_books_ready_for_checkout(client, auth_headers, sql_budget):
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=5):
+        response = client.get('/api/loans/books', headers=headers)
+    assert response.status_code == 200
+
+
+def test_readers_for_loan(client, auth_headers, sql_budget):
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=8):
+        response = client.get('/api/loans/readers', headers=headers)
+    assert response.status_code == 200
+
+
+def test_create_loan(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = 'The Hobbit'")
+    reader_id = lookup("SELECT id FROM readers WHERE email = 'yuki@example.com'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=2, rows=2):
+        response = client.post('/api/loans', json={'book_id': book_id, 'reader_id': reader_id}, headers=headers)
+    assert response.status_code == 201
+
+
+def test_return_book(client, auth_headers, lookup, sql_budget):
+    loan_id = lookup("SELECT MIN(id) FROM loans WHERE status = 'borrowed'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=4, rows=4):
+        response = client.post(f'/api/loans/{loan_id}/return', headers=headers)
+    assert response.status_code == 200
+    # The copy is free again, but the booking keeps its due date
+    assert lookup("""
+        SELECT released_on = CURRENT_DATE AND end_date = CURRENT_DATE + 4
+        FROM reservations WHERE status = 'completed'
+    """) is True
+
+
+def test_reader_loans(client, auth_headers, sql_budget):
+    headers = auth_headers('prof_smith')
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/users/my-loans', headers=headers)
+    assert response.status_code == 200
+    with sql_budget(queries=1, rows=0):
+        response = client.get('/api/loans/active', headers=headers)
+    assert response.status_code == 200
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/loans/history', headers=headers)
+    assert response.status_code == 200
+
+
+def test_my_library(client, auth_headers, sql_budget):
+    headers = auth_headers('john_doe')
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/me/library', headers=headers)
+    assert response.status_code == 200
+    assert response.json['is_reader'] is True
+    assert len(response.json['active_loans']) == 1
+    assert [r['status'] for r in response.json['reservations']] == ['pending']
+    assert response.json['loan_history'] == {'loans': [], 'has_next': False, 'next_cursor': None}
+    assert 'private' in response.headers['Cache-Control']
+
+    response = client.get('/api/me/library', headers=dict(headers, **{'If-None-Match': response.headers['ETag']}))
+    assert response.status_code == 304
+
+
+def test_my_library_history_pages(app, client, auth_headers, monkeypatch):
+    from app import db
+
+    # A second return for prof_smith, stamped with a fraction json_agg would trim
+    with app.app_context():
+        db.session.execute("""
+            INSERT INTO loans (book_id, copy_id, reader_id, loan_date, return_date, status)
+            SELECT book_id, copy_id, reader_id, CURRENT_DATE - INTERVAL '10 days' + INTERVAL '0.5 seconds',
+                   CURRENT_DATE - INTERVAL '3 days', 'returned'
+            FROM loans
+            WHERE reader_id = (SELECT id FROM readers WHERE email = 'prof.smith@university.edu')
+        """)
+        db.session.commit()
+    monkeypatch.setattr('library.HISTORY_PAGE', 1)
+    headers = auth_headers('prof_smith')
+    first = client.get('/api/me/library', headers=headers).json['loan_history']
+    assert first['has_next'] is True
+    assert 'T00:00:00.500000,' in first['next_cursor']
+    assert 'cursor' not in first['loans'][0]
+
+    response = client.get(f"/api/me/library?cursor={first['next_cursor']}", headers=headers)
+    assert response.status_code == 200
+    second = response.json['loan_history']
+    assert second['has_next'] is False
+    assert second['loans'][0]['id'] != first['loans'][0]['id']
+
+
+def test_my_library_two_copies(app, client, auth_headers, lookup):
+    from app import db
+
+    # john_doe holds both copies of Dune, one checked out against a booking
+    # that ended ten days ago and one against a booking that runs five more
+    with app.app_context():
+        db.session.execute("""
+            WITH dune AS (
+                SELECT id FROM books WHERE title = 'Dune'
+            ), john AS (
+                SELECT id FROM readers WHERE email = 'john@example.com'
+            ), second_copy AS (
+                INSERT INTO book_copies (book_id) SELECT id FROM dune RETURNING id
+            ), copies AS (
+                SELECT c.id, 0 as n FROM book_copies c JOIN dune ON c.book_id = dune.id
+                UNION ALL
+                SELECT id, 1 FROM second_copy
+            ), booked AS (
+                INSERT INTO reservations (book_id, copy_id, reader_id, start_date, end_date, status)
+                SELECT dune.id, copies.id, john.id,
+                       CASE n WHEN 0 THEN CURRENT_DATE - 20 ELSE CURRENT_DATE - 3 END,
+                       CASE n WHEN 0 THEN CURRENT_DATE - 10 ELSE CURRENT_DATE + 5 END,
+                       'completed'
+                FROM dune, john, copies
+            )
+            INSERT INTO loans (book_id, copy_id, reader_id, loan_date, status)
+            SELECT dune.id, copies.id, john.id,
+                   CASE n WHEN 0 THEN CURRENT_DATE - 20 ELSE CURRENT_DATE - 3 END, 'borrowed'
+            FROM dune, john, copies
+        """)
+        db.session.commit()
+
+    response = client.get('/api/me/library', headers=auth_headers('john_doe'))
+    dune = [loan for loan in response.json['active_loans'] if loan['title'] == 'Dune']
+    assert sorted(loan['is_overdue'] for loan in dune) == [False, True]
+
+    user_id = lookup("SELECT id FROM users WHERE username = 'john_doe'")
+    response = client.get(f'/api/users/{user_id}/details', headers=auth_headers('admin'))
+    assert response.json['loan_stats']['overdue_loans'] == 1
+
+
+def test_archive_history(app, client, auth_headers, lookup, monkeypatch, sql_budget):
+    # Both seeded returns are older than 20 days
+    monkeypatch.setitem(app.config, 'RETENTION_DAYS', dict(app.config['RETENTION_DAYS'], loans=20))
+    result = app.test_cli_runner().invoke(args=['archive-history', '--table', 'loans', '--batch-size', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Archived 2 rows from loans' in result.output
+    assert lookup("SELECT COUNT(*) FROM loans WHERE status = 'returned'") == 0
+    assert lookup("SELECT COUNT(*) FROM sync_tombstones") == 0
+
+    headers = auth_headers('prof_smith')
+    with sql_budget(queries=1, rows=0):
+        response = client.get('/api/loans/history', headers=headers)
+    assert response.json == []
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/loans/history?include_archived=true', headers=headers)
+    assert len(response.json) == 1
@@ -0,0 +1,122 @@
+REQUEST = {
+    'first_name': 'Anna',
+    'last_name': 'Worker',
+    'address': '1 Library Lane',
+    'phone_number': '555-0199',
+}
+
+
+def test_pending_requests(client, auth_headers, sql_budget):
+    headers = auth_headers('worker_1')
+    # One page off the partial index, plus the queue length on the first page
+    with sql_budget(queries=2, rows=4):
+        response = client.get('/api/reader-requests?status=pending', headers=headers)
+    assert response.status_code == 200
+    assert response.json['totalCount'] == 3
+    assert response.json['has_next'] is False
+    created = [r['created_at'] for r in response.json['requests']]
+    assert created == sorted(created, reverse=True)
+
+
+def test_processed_requests(client, auth_headers, lookup, sql_budget):
+    pending = lookup("SELECT array_agg(id ORDER BY id) FROM reader_registration_requests WHERE status = 'pending'")
+    headers = auth_headers('worker_1')
+    client.post('/api/reader-requests/bulk-reject', json={'request_ids': pending, 'reason': 'Spam'}, headers=headers)
+    with sql_budget(queries=1, rows=3):
+        response = client.get('/api/reader-requests?status=processed', headers=headers)
+    assert [r['status'] for r in response.json['requests']] == ['rejected'] * 3
+    assert response.json['next_cursor'] is None
+
+    response = client.get('/api/reader-requests?status=pending&cursor=yesterday', headers=headers)
+    assert response.status_code == 400
+
+
+def test_create_request(client, auth_headers, sql_budget):
+    headers = auth_headers('worker_2')
+    with sql_budget(queries=1, rows=1):
+        response = client.post('/api/reader-requests', json=REQUEST, headers=headers)
+    assert response.status_code == 201
+
+
+def test_request_status_checks(client, auth_headers, sql_budget):
+    headers = auth_headers('tech_lead')
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/reader-requests/check', headers=headers)
+    assert response.json['has_pending_request'] is True
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/readers/check-status', headers=headers)
+    assert response.status_code == 200
+
+
+def test_approve_request(client, auth_headers, lookup, sql_budget):
+    request_id = lookup("SELECT MIN(id) FROM reader_registration_requests WHERE status = 'pending'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=1):
+        response = client.post(f'/api/reader-requests/{request_id}/approve', headers=headers)
+    assert response.status_code == 200
+
+
+def test_reject_request(client, auth_headers, lookup, sql_budget):
+    request_id = lookup("SELECT MAX(id) FROM reader_registration_requests WHERE status = 'pending'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=1):
+        response = client.post(f'/api/reader-requests/{request_id}/reject', json={'reason': 'Duplicate'},
+                               headers=headers)
+    assert response.status_code == 200
+
+
+def test_reader_lists(client, auth_headers, sql_budget):
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=8):
+        response = client.get('/readers', headers=headers)
+    assert response.status_code == 200
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/unregistered-users', headers=headers)
+    assert response.status_code == 200
+
+
+def test_reader_search(client, auth_headers, lookup, sql_budget):
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=2):
+        response = client.get('/api/loans/readers?q=smith', headers=headers)
+    assert {r['email'] for r in response.json['readers']} == {'jane@example.com', 'prof.smith@university.edu'}
+
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/readers?q=YUKI@example.com', headers=headers)
+    assert [r['last_name'] for r in response.json['readers']] == ['Tanaka']
+
+    with sql_budget(queries=1, rows=3):
+        response = client.get('/api/loans/readers?per_page=2&page=2', headers=headers)
+    assert len(response.json['readers']) == 2
+    assert response.json['has_next'] is True
+
+
+def test_bulk_approve_requests(client, auth_headers, lookup, sql_budget):
+    client.post('/api/reader-requests', json=REQUEST, headers=auth_headers('worker_2'))
+    pending = lookup("SELECT array_agg(id ORDER BY id) FROM reader_registration_requests WHERE status = 'pending'")
+    readers = lookup("SELECT COUNT(*) FROM readers")
+    headers = auth_headers('worker_1')
+    # Four pending requests and an unknown id in one statement
+    with sql_budget(queries=1, rows=5):
+        response = client.post('/api/reader-requests/bulk-approve',
+                               json={'request_ids': pending + [999999]}, headers=headers)
+    assert response.status_code == 200
+    results = {r['id']: r for r in response.json['results']}
+    assert results[999999]['error'] == 'Request not found or already processed'
+
+    # The seeded requests all come from users who are already readers
+    assert response.json['approved'] == 1
+    assert lookup("SELECT COUNT(*) FROM readers") == readers + 1
+    (approved,) = [r for r in response.json['results'] if r['error'] is None]
+    assert approved['card_number'] == lookup(
+        "SELECT card_number FROM readers WHERE id = :id", id=approved['reader_id'])
+
+
+def test_bulk_reject_requests(client, auth_headers, lookup, sql_budget):
+    pending = lookup("SELECT array_agg(id ORDER BY id) FROM reader_registration_requests WHERE status = 'pending'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=1, rows=3):
+        response = client.post('/api/reader-requests/bulk-reject',
+                               json={'request_ids': pending, 'reason': 'Semester closed'}, headers=headers)
+    assert response.json['rejected'] == 3
+    assert lookup("SELECT COUNT(*) FROM reader_registration_requests WHERE status = 'pending'") == 0
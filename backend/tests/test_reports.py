@@ -0,0 +1,55 @@
+from io import BytesIO
+
+import pytest
+
+# Reports are unpaginated, so the row budgets are the seed table sizes
+
+
+@pytest.mark.parametrize('path, rows', [
+    ('/api/reports/active-loans', 2),
+    ('/api/reports/overdue-loans', 2),
+    ('/api/reports/reader-activity', 8),
+    ('/api/reports/popular-books', 20),
+    ('/api/reports/user-statistics', 12),
+])
+def test_download_report(client, auth_headers, sql_budget, path, rows):
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=rows):
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('report_type, rows', [
+    ('loans', 4),
+    ('reservations', 5),
+    ('readers', 8),
+    ('overdue', 2),
+])
+def test_generate_pdf_report(client, auth_headers, sql_budget, report_type, rows):
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=rows):
+        response = client.get(f'/api/reports/generate?type={report_type}&period=year', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+
+
+@pytest.mark.parametrize('query', ['format=plain', 'format=directory&jobs=4'])
+def test_backup_rejects_unsupported_format(client, auth_headers, sql_budget, query):
+    # Without BACKUP_STAGING_DIR only the streamed custom format is offered
+    headers = auth_headers('admin')
+    with sql_budget(queries=0, rows=0):
+        response = client.get(f'/api/admin/database/backup?{query}', headers=headers)
+    assert response.status_code == 400
+
+
+def test_restore_rejects_plain_sql(client, auth_headers, sql_budget):
+    headers = auth_headers('admin')
+    with sql_budget(queries=0, rows=0):
+        response = client.post('/api/admin/database/restore', headers=headers, data={
+            'file': (BytesIO(b'-- PostgreSQL database dump\n'), 'library_backup.sql')})
+    assert response.status_code == 400
+
+
+def test_restore_status_unknown_job(client, auth_headers):
+    response = client.get(f'/api/admin/database/restore/{"0" * 32}', headers=auth_headers('admin'))
+    assert response.status_code == 404
@@ -0,0 +1,114 @@
+from datetime import date, timedelta
+
+
+def _dates(offset, days=7):
+    start = date.today() + timedelta(days=offset)
+    return {'start_date': start.isoformat(), 'end_date': (start + timedelta(days=days)).isoformat()}
+
+
+def test_create_reservation(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = 'Pride and Prejudice'")
+    headers = auth_headers('jane_smith')
+    with sql_budget(queries=3, rows=3):
+        response = client.post('/api/reservations', json=dict(_dates(1), book_id=book_id), headers=headers)
+    assert response.status_code == 201
+
+
+def test_create_reservation_conflict(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = '1Q84'")
+    headers = auth_headers('jane_smith')
+    with sql_budget(queries=2, rows=2):
+        response = client.post('/api/reservations', json=dict(_dates(6), book_id=book_id), headers=headers)
+    assert response.status_code == 400
+
+
+def test_reserve_title_on_loan(client, auth_headers, lookup, sql_budget):
+    # The title's only copy is out until tech_lead's booking ends in four days
+    book_id = lookup("SELECT book_id FROM loans WHERE status = 'borrowed' ORDER BY id LIMIT 1")
+    headers = auth_headers('jane_smith')
+    with sql_budget(queries=2, rows=2):
+        response = client.post('/api/reservations', json=dict(_dates(1), book_id=book_id), headers=headers)
+    assert response.status_code == 400
+    assert response.json['can_waitlist'] is True
+
+    response = client.post('/api/reservations', json=dict(_dates(10), book_id=book_id), headers=headers)
+    assert response.status_code == 201
+
+
+def test_waitlist_promoted_on_cancel(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = '1Q84'")
+    reader_id = lookup("SELECT id FROM readers WHERE email = 'jane@example.com'")
+    headers = auth_headers('jane_smith')
+    with sql_budget(queries=3, rows=3):
+        response = client.post('/api/reservations', json=dict(_dates(6), book_id=book_id, waitlist=True),
+                               headers=headers)
+    assert response.status_code == 202
+    assert response.json['position'] == 1
+
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/waitlist/user', headers=headers)
+    assert response.json[0]['status'] == 'waiting'
+
+    blocking_id = lookup("SELECT id FROM reservations WHERE book_id = :id AND status = 'pending'", id=book_id)
+    response = client.delete(f'/api/reservations/{blocking_id}', headers=auth_headers('worker_1'))
+    assert response.status_code == 200
+    assert lookup("""
+        SELECT COUNT(*) FROM reservations
+        WHERE book_id = :book_id AND reader_id = :reader_id AND status = 'pending'
+    """, book_id=book_id, reader_id=reader_id) == 1
+    assert client.get('/api/waitlist/user', headers=headers).json[0]['status'] == 'promoted'
+
+
+def test_admin_create_reservation(client, auth_headers, lookup, sql_budget):
+    book_id = lookup("SELECT id FROM books WHERE title = 'Neuromancer'")
+    reader_id = lookup("SELECT id FROM readers WHERE email = 'jane@example.com'")
+    headers = auth_headers('admin')
+    with sql_budget(queries=2, rows=2):
+        response = client.post('/api/reservations/admin/create',
+                               json=dict(_dates(3), book_id=book_id, reader_id=reader_id), headers=headers)
+    assert response.status_code == 201
+
+
+def test_cancel_reservation(client, auth_headers, lookup, sql_budget):
+    reservation_id = lookup("SELECT MIN(id) FROM reservations WHERE status = 'pending'")
+    headers = auth_headers('worker_1')
+    with sql_budget(queries=4, rows=4):
+        response = client.delete(f'/api/reservations/{reservation_id}', headers=headers)
+    assert response.status_code == 200
+
+
+def test_all_reservations_page(client, auth_headers, sql_budget):
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=10):
+        response = client.get('/api/reservations/all', headers=headers)
+    assert response.status_code == 200
+
+
+def test_reader_reservations(client, auth_headers, sql_budget):
+    headers = auth_headers('john_doe')
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/reservations/user', headers=headers)
+    assert response.status_code == 200
+    with sql_budget(queries=1, rows=1):
+        response = client.get('/api/users/my-reservations', headers=headers)
+    assert response.status_code == 200
+
+
+def test_expire_reservations(app, lookup):
+    from app import db
+
+    reservation_id = lookup("SELECT MIN(id) FROM reservations WHERE status = 'pending'")
+    with app.app_context():
+        db.session.execute("""
+            UPDATE reservations
+            SET start_date = CURRENT_DATE - 10, end_date = CURRENT_DATE - 1
+            WHERE id = :id
+        """, {'id': reservation_id})
+        db.session.commit()
+        db.session.remove()
+
+    result = app.test_cli_runner().invoke(args=['expire-reservations', '--batch-size', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Expired 1 reservations' in result.output
+    assert lookup("SELECT status FROM reservations WHERE id = :id", id=reservation_id) == 'expired'
+    assert lookup("SELECT COUNT(*) FROM reservations WHERE status = 'pending'") == 2
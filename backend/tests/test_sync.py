@@ -0,0 +1,30 @@
+def test_sync_pages_through_table(client, auth_headers, lookup, sql_budget):
+    headers = auth_headers('worker_1')
+    seen, since, has_more = [], '', True
+    while has_more:
+        # Horizon, then upserts and tombstones each fetched with limit + 1
+        with sql_budget(queries=3, rows=4):
+            response = client.get(f'/api/sync?tables=authors&limit=2&since={since}', headers=headers)
+        assert response.status_code == 200
+        seen += [row['id'] for row in response.json['changes']['authors']['upserted']]
+        since, has_more = response.json['next'], response.json['has_more']
+    assert len(seen) == len(set(seen)) == lookup("SELECT COUNT(*) FROM authors")
+
+
+def test_sync_returns_only_changes(client, auth_headers, lookup):
+    headers = auth_headers('worker_1')
+    since = client.get('/api/sync?tables=books,book_copies&limit=5000', headers=headers).json['next']
+
+    book_id = lookup("SELECT id FROM books WHERE title = 'Dune'")
+    copy_ids = client.post(f'/api/books/{book_id}/copies', json={'count': 1}, headers=headers).json['copy_ids']
+
+    # The new copy, and the title whose counts its trigger bumped
+    changes = client.get(f'/api/sync?tables=books,book_copies&since={since}', headers=headers).json['changes']
+    assert [row['id'] for row in changes['book_copies']['upserted']] == copy_ids
+    assert [row['id'] for row in changes['books']['upserted']] == [book_id]
+    assert changes['books']['deleted'] == []
+
+
+def test_sync_rejects_unknown_table(client, auth_headers):
+    response = client.get('/api/sync?tables=users', headers=auth_headers('admin'))
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+def test_register(client, sql_budget):
+    with sql_budget(queries=3, rows=2):
+        response = client.post('/api/auth/register', json={
+            'username': 'new_reader', 'email': 'new_reader@example.com', 'password': 'secret'})
+    assert response.status_code == 201
+
+
+def test_login(client, sql_budget):
+    with sql_budget(queries=1, rows=1):
+        response = client.post('/api/auth/login', json={'username': 'admin', 'password': 'admin'})
+    assert response.status_code == 200
+
+
+def test_list_users(client, auth_headers, sql_budget):
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=12):
+        response = client.get('/api/users', headers=headers)
+    assert response.status_code == 200
+    assert response.json['has_next'] is False
+
+
+def test_search_users(client, auth_headers, sql_budget):
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=3):
+        response = client.get('/api/users?q=worker_', headers=headers)
+    assert [u['username'] for u in response.json['users']] == ['worker_1', 'worker_2', 'worker_3']
+
+
+def test_promote_user(client, auth_headers, lookup, sql_budget):
+    user_id = lookup("SELECT id FROM users WHERE username = 'john_doe'")
+    headers = auth_headers('admin')
+    with sql_budget(queries=2, rows=1):
+        response = client.post(f'/api/users/{user_id}/promote', json={'role': 'worker'}, headers=headers)
+    assert response.status_code == 200
+
+
+def test_delete_reader_user(client, auth_headers, lookup, sql_budget):
+    # The reader profile is detached by the DELETE statement itself
+    user_id = lookup("SELECT id FROM users WHERE username = 'jane_smith'")
+    headers = auth_headers('admin')
+    with sql_budget(queries=2, rows=1):
+        response = client.delete(f'/api/users/{user_id}', headers=headers)
+    assert response.status_code == 200
+    assert lookup("SELECT user_id FROM readers WHERE email = 'jane@example.com'") is None
+
+
+def test_user_details(client, auth_headers, lookup, sql_budget):
+    user_id = lookup("SELECT id FROM users WHERE username = 'john_doe'")
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=1):
+        response = client.get(f'/api/users/{user_id}/details', headers=headers)
+    assert response.status_code == 200
+    assert response.json['loan_stats']['total_loans'] == 1
+    assert response.json['loan_stats']['active_loans'] == 1
+    assert response.json['loan_stats']['overdue_loans'] == 0
+
+
+def test_user_details_reborrowed_title(app, client, auth_headers, lookup):
+    from app import db
+
+    # An earlier, long finished booking of the title john_doe has on loan now
+    with app.app_context():
+        db.session.execute("""
+            INSERT INTO reservations (book_id, copy_id, reader_id, start_date, end_date, status)
+            SELECT book_id, copy_id, reader_id, CURRENT_DATE - 90, CURRENT_DATE - 76, 'completed'
+            FROM loans
+            WHERE reader_id = (SELECT id FROM readers WHERE email = 'john@example.com')
+        """)
+        db.session.commit()
+    user_id = lookup("SELECT id FROM users WHERE username = 'john_doe'")
+    response = client.get(f'/api/users/{user_id}/details', headers=auth_headers('admin'))
+    assert response.json['loan_stats']['overdue_loans'] == 0
+
+
+def test_user_loans(client, auth_headers, lookup, sql_budget):
+    user_id = lookup("SELECT id FROM users WHERE username = 'john_doe'")
+    headers = auth_headers('admin')
+    with sql_budget(queries=1, rows=1):
+        response = client.get(f'/api/users/{user_id}/loans', headers=headers)
+    assert response.status_code == 200
+    assert [loan['status'] for loan in response.json['loans']] == ['borrowed']
+    assert response.json['next_cursor'] is None
+
+    response = client.get(f'/api/users/{user_id}/loans?cursor=yesterday', headers=headers)
+    assert response.status_code == 400
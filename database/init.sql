@@ -1,8 +1,14 @@
 BEGIN;
 
+DROP TABLE IF EXISTS sync_tombstones CASCADE;
+DROP TABLE IF EXISTS loans_archive CASCADE;
+DROP TABLE IF EXISTS reservations_archive CASCADE;
+DROP TABLE IF EXISTS reader_registration_requests_archive CASCADE;
+DROP TABLE IF EXISTS reservation_waitlist CASCADE;
 DROP TABLE IF EXISTS loans CASCADE;
 DROP TABLE IF EXISTS reservations CASCADE;
 DROP TABLE IF EXISTS reader_registration_requests CASCADE;
+DROP TABLE IF EXISTS book_copies CASCADE;
 DROP TABLE IF EXISTS readers CASCADE;
 DROP TABLE IF EXISTS books CASCADE;
 DROP TABLE IF EXISTS authors CASCADE;
@@ -11,8 +17,12 @@ DROP TABLE IF EXISTS email_templates CASCADE;
 DROP TABLE IF EXISTS email_settings CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
 DROP MATERIALIZED VIEW IF EXISTS reader_summary;
+DROP SEQUENCE IF EXISTS reader_card_number_seq;
 DROP MATERIALIZED VIEW IF EXISTS book_genres;
 
+CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -21,6 +31,42 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+-- Canonical ISBN-13 for an ISBN-10/ISBN-13/EAN in any formatting, or NULL if
+-- the check digit is wrong. Kept in step with backend/isbn.py.
+CREATE OR REPLACE FUNCTION normalize_isbn(code TEXT)
+RETURNS VARCHAR(13) AS $$
+DECLARE
+    digits TEXT := UPPER(regexp_replace(code, '[\s-]', '', 'g'));
+    body TEXT;
+    total INTEGER := 0;
+BEGIN
+    IF digits ~ '^\d{9}[\dX]$' THEN
+        FOR i IN 1..10 LOOP
+            total := total + (11 - i) * CASE WHEN substr(digits, i, 1) = 'X' THEN 10
+                                             ELSE substr(digits, i, 1)::int END;
+        END LOOP;
+        IF total % 11 != 0 THEN
+            RETURN NULL;
+        END IF;
+        body := '978' || left(digits, 9);
+    ELSIF digits ~ '^97[89]\d{10}$' THEN
+        body := left(digits, 12);
+    ELSE
+        RETURN NULL;
+    END IF;
+
+    total := 0;
+    FOR i IN 1..12 LOOP
+        total := total + substr(body, i, 1)::int * CASE WHEN i % 2 = 0 THEN 3 ELSE 1 END;
+    END LOOP;
+    body := body || ((10 - total % 10) % 10)::text;
+    IF length(digits) = 13 AND body != digits THEN
+        RETURN NULL;
+    END IF;
+    RETURN body;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
 CREATE TABLE IF NOT EXISTS authors (
     id SERIAL PRIMARY KEY,
     first_name VARCHAR(100) NOT NULL,
@@ -42,16 +88,30 @@ CREATE TABLE IF NOT EXISTS books (
     title VARCHAR(200) NOT NULL,
     author_id INTEGER REFERENCES authors(id),
     isbn VARCHAR(20) UNIQUE,
+    isbn13 VARCHAR(13) GENERATED ALWAYS AS (normalize_isbn(isbn)) STORED,
     publisher_id INTEGER REFERENCES publishers(id),
     publication_year INTEGER,
     genre VARCHAR(100),
     status VARCHAR(20) DEFAULT 'available',
     description TEXT,
+    total_copies INTEGER NOT NULL DEFAULT 0,
+    available_copies INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT valid_publication_year CHECK (publication_year >= 1000 AND publication_year <= EXTRACT(YEAR FROM CURRENT_DATE))
 );
 
+-- Physical items of a title; books.total_copies/available_copies are kept in sync by triggers
+CREATE TABLE IF NOT EXISTS book_copies (
+    id SERIAL PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    barcode VARCHAR(32) UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'available',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT valid_copy_status CHECK (status IN ('available', 'borrowed', 'withdrawn'))
+);
+
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
     username VARCHAR(80) UNIQUE NOT NULL,
@@ -63,13 +123,16 @@ CREATE TABLE IF NOT EXISTS users (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Library card numbers (C000000001, ...) are handed out as readers are created
+CREATE SEQUENCE IF NOT EXISTS reader_card_number_seq;
+
 CREATE TABLE IF NOT EXISTS readers (
     id SERIAL PRIMARY KEY,
     first_name VARCHAR(100) NOT NULL,
     last_name VARCHAR(100) NOT NULL,
     address VARCHAR(200),
     email VARCHAR(100) UNIQUE,
-    card_number VARCHAR(50) UNIQUE,
+    card_number VARCHAR(50) UNIQUE DEFAULT 'C' || lpad(nextval('reader_card_number_seq')::text, 9, '0'),
     registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     phone_number VARCHAR(20),
     user_id INTEGER REFERENCES users(id),
@@ -80,18 +143,37 @@ CREATE TABLE IF NOT EXISTS readers (
 CREATE TABLE IF NOT EXISTS reservations (
     id SERIAL PRIMARY KEY,
     book_id INTEGER REFERENCES books(id),
+    copy_id INTEGER REFERENCES book_copies(id),
     reader_id INTEGER REFERENCES readers(id),
     reservation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     start_date DATE NOT NULL,
     end_date DATE NOT NULL,
     status VARCHAR(20) DEFAULT 'pending',
+    -- Day the copy came back on an early return; the booking stops holding
+    -- the copy from then on, while end_date stays the loan's due date
+    released_on DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Readers queued for a window that was fully booked; promoted to a reservation in FIFO order
+CREATE TABLE IF NOT EXISTS reservation_waitlist (
+    id SERIAL PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    reader_id INTEGER NOT NULL REFERENCES readers(id) ON DELETE CASCADE,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'waiting',
+    reservation_id INTEGER REFERENCES reservations(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT valid_waitlist_status CHECK (status IN ('waiting', 'promoted', 'cancelled', 'expired'))
+);
+
 CREATE TABLE IF NOT EXISTS loans (
     id SERIAL PRIMARY KEY,
     book_id INTEGER REFERENCES books(id),
+    copy_id INTEGER REFERENCES book_copies(id),
     reader_id INTEGER REFERENCES readers(id),
     loan_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     return_date TIMESTAMP,
@@ -115,11 +197,66 @@ CREATE TABLE IF NOT EXISTS reader_registration_requests (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- History past its retention period, moved here by `flask archive-history`.
+-- Same columns as the live table, plus archived_at; the move copies them by
+-- name (retention.ARCHIVE_COLUMNS), so a new live column needs adding there.
+CREATE TABLE IF NOT EXISTS loans_archive (
+    LIKE loans,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS reservations_archive (
+    LIKE reservations,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS reader_registration_requests_archive (
+    LIKE reader_registration_requests,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+-- Deleted row ids for /api/sync, which reads upserts off updated_at
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TRIGGER update_books_updated_at
     BEFORE UPDATE ON books
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_book_copies_updated_at
+    BEFORE UPDATE ON book_copies
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+-- Copies without a supplied barcode get one derived from their id
+CREATE OR REPLACE FUNCTION assign_copy_barcode()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.barcode IS NULL THEN
+        NEW.barcode := 'LIB' || lpad(NEW.id::text, 9, '0');
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assign_copy_barcode_trigger
+    BEFORE INSERT ON book_copies
+    FOR EACH ROW
+    EXECUTE FUNCTION assign_copy_barcode();
+
+CREATE TRIGGER update_reservation_waitlist_updated_at
+    BEFORE UPDATE ON reservation_waitlist
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
 CREATE TRIGGER update_authors_updated_at
     BEFORE UPDATE ON authors
     FOR EACH ROW
@@ -155,19 +292,153 @@ CREATE TRIGGER update_registration_requests_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Rows moved to an archive table are not deletions as far as mirrors are concerned
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('library.archiving', true) IS DISTINCT FROM 'on' THEN
+        INSERT INTO sync_tombstones (table_name, row_id) VALUES (TG_TABLE_NAME, OLD.id);
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER record_authors_tombstone
+    AFTER DELETE ON authors
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER record_publishers_tombstone
+    AFTER DELETE ON publishers
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER record_books_tombstone
+    AFTER DELETE ON books
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER record_book_copies_tombstone
+    AFTER DELETE ON book_copies
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER record_readers_tombstone
+    AFTER DELETE ON readers
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER record_reservations_tombstone
+    AFTER DELETE ON reservations
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER record_reservation_waitlist_tombstone
+    AFTER DELETE ON reservation_waitlist
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE TRIGGER record_loans_tombstone
+    AFTER DELETE ON loans
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
 CREATE INDEX idx_books_title ON books (title);
 CREATE INDEX idx_books_status ON books (status);
+CREATE INDEX idx_books_isbn13 ON books (isbn13);
 CREATE INDEX idx_books_title_lower ON books (LOWER(title));
 CREATE INDEX idx_authors_names ON authors (first_name, last_name);
 CREATE INDEX idx_readers_user_id ON readers (user_id);
+-- People search (search.py): exact card/e-mail lookups, substring matches via trigrams
+CREATE INDEX idx_readers_name ON readers (last_name, first_name, id);
+CREATE INDEX idx_readers_email_lower ON readers (LOWER(email));
+CREATE INDEX idx_readers_name_trgm ON readers USING gin ((first_name || ' ' || last_name) gin_trgm_ops);
+CREATE INDEX idx_readers_email_trgm ON readers USING gin (email gin_trgm_ops);
+CREATE INDEX idx_readers_card_trgm ON readers USING gin (card_number gin_trgm_ops);
+CREATE INDEX idx_users_email_lower ON users (LOWER(email));
+CREATE INDEX idx_users_username_trgm ON users USING gin (username gin_trgm_ops);
+CREATE INDEX idx_users_email_trgm ON users USING gin (email gin_trgm_ops);
 CREATE INDEX idx_reader_requests_user_status ON reader_registration_requests (user_id, status);
-CREATE INDEX idx_reader_requests_status ON reader_registration_requests (status);
-CREATE INDEX idx_reader_requests_created_at ON reader_registration_requests (created_at DESC);
+-- Moderation queue, newest first; processed requests use idx_reader_requests_processed
+CREATE INDEX idx_reader_requests_pending ON reader_registration_requests (created_at, id)
+WHERE status = 'pending';
 CREATE INDEX idx_reservations_book_status ON reservations (book_id, status);
 CREATE INDEX idx_loans_book_status ON loans (book_id, status);
 CREATE INDEX idx_loans_reader_status ON loans (reader_id, status);
+-- A reader's loan history, newest first, one keyset page at a time
+CREATE INDEX idx_loans_reader_history ON loans (reader_id, loan_date, id);
 CREATE INDEX idx_reservations_dates ON reservations (book_id, status, start_date, end_date)
-WHERE status != 'cancelled';
+WHERE status NOT IN ('cancelled', 'expired');
+-- Live bookings only; the expiry sweeper keeps this small
+CREATE INDEX idx_reservations_pending ON reservations (book_id, start_date, end_date)
+WHERE status = 'pending';
+CREATE INDEX idx_book_copies_book_status ON book_copies (book_id, status);
+CREATE INDEX idx_reservations_copy_dates ON reservations (copy_id, start_date, end_date)
+WHERE status NOT IN ('cancelled', 'expired');
+CREATE INDEX idx_loans_copy_status ON loans (copy_id, status);
+CREATE INDEX idx_waitlist_queue ON reservation_waitlist (book_id, created_at, id)
+WHERE status = 'waiting';
+CREATE UNIQUE INDEX idx_waitlist_reader_book ON reservation_waitlist (book_id, reader_id)
+WHERE status = 'waiting';
+-- (updated_at, id) keyset cursors for /api/sync
+CREATE INDEX idx_authors_updated_at ON authors (updated_at, id);
+CREATE INDEX idx_publishers_updated_at ON publishers (updated_at, id);
+CREATE INDEX idx_books_updated_at ON books (updated_at, id);
+CREATE INDEX idx_book_copies_updated_at ON book_copies (updated_at, id);
+CREATE INDEX idx_readers_updated_at ON readers (updated_at, id);
+CREATE INDEX idx_reservations_updated_at ON reservations (updated_at, id);
+CREATE INDEX idx_reservation_waitlist_updated_at ON reservation_waitlist (updated_at, id);
+CREATE INDEX idx_loans_updated_at ON loans (updated_at, id);
+CREATE INDEX idx_sync_tombstones_cursor ON sync_tombstones (table_name, deleted_at, id);
+-- Retention sweeps walk finished rows oldest first; the archives serve history lookups
+CREATE INDEX idx_loans_returned ON loans (return_date, id) WHERE status = 'returned';
+CREATE INDEX idx_reservations_finished ON reservations (end_date, id)
+WHERE status IN ('completed', 'cancelled', 'expired');
+CREATE INDEX idx_reader_requests_processed ON reader_registration_requests (processed_at, id)
+WHERE status IN ('approved', 'rejected');
+CREATE INDEX idx_loans_archive_reader ON loans_archive (reader_id, return_date);
+CREATE INDEX idx_reservations_archive_start ON reservations_archive (start_date);
+CREATE INDEX idx_reader_requests_archive_processed ON reader_registration_requests_archive (processed_at);
+
+CREATE OR REPLACE FUNCTION sync_book_copy_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE books
+        SET total_copies = total_copies - (OLD.status != 'withdrawn')::int,
+            available_copies = available_copies - (OLD.status = 'available')::int
+        WHERE id = OLD.book_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE books
+        SET total_copies = total_copies + (NEW.status != 'withdrawn')::int,
+            available_copies = available_copies + (NEW.status = 'available')::int
+        WHERE id = NEW.book_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sync_book_copy_counts_trigger
+AFTER INSERT OR DELETE OR UPDATE OF status, book_id ON book_copies
+FOR EACH ROW EXECUTE FUNCTION sync_book_copy_counts();
+
+-- books.status is derived from the copy counts so per-title filters keep working
+CREATE OR REPLACE FUNCTION derive_book_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.status := CASE
+        WHEN NEW.available_copies > 0 THEN 'available'
+        WHEN NEW.total_copies > 0 THEN 'borrowed'
+        ELSE 'unavailable'
+    END;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER derive_book_status_trigger
+BEFORE INSERT OR UPDATE OF total_copies, available_copies ON books
+FOR EACH ROW EXECUTE FUNCTION derive_book_status();
 
 CREATE MATERIALIZED VIEW reader_summary AS
 SELECT 
@@ -177,10 +448,15 @@ SELECT
     r.email,
     u.username,
     COUNT(l.id) as total_loans,
-    COUNT(CASE WHEN l.status = 'borrowed' THEN 1 END) as active_loans
+    COUNT(CASE WHEN l.status = 'borrowed' THEN 1 END) as active_loans,
+    GREATEST(MAX(l.loan_date), MAX(l.return_date)) as last_activity
 FROM readers r
 JOIN users u ON r.user_id = u.id
-LEFT JOIN loans l ON r.id = l.reader_id
+LEFT JOIN (
+    SELECT id, reader_id, status, loan_date, return_date FROM loans
+    UNION ALL
+    SELECT id, reader_id, status, loan_date, return_date FROM loans_archive
+) l ON r.id = l.reader_id
 GROUP BY r.id, r.first_name, r.last_name, r.email, u.username;
 
 CREATE UNIQUE INDEX idx_reader_summary_id ON reader_summary (id);
@@ -220,6 +496,9 @@ AFTER INSERT OR UPDATE OR DELETE ON books
 FOR EACH STATEMENT
 EXECUTE FUNCTION refresh_book_genres();
 
+-- Return type changed with book_copies, so CREATE OR REPLACE is not enough
+DROP FUNCTION IF EXISTS check_book_availability(INTEGER, DATE, DATE);
+
 CREATE OR REPLACE FUNCTION check_book_availability(
     p_book_id INTEGER,
     p_start_date DATE,
@@ -228,7 +507,8 @@ CREATE OR REPLACE FUNCTION check_book_availability(
     book_exists BOOLEAN,
     book_status VARCHAR(20),
     has_conflict BOOLEAN,
-    current_holder VARCHAR(200)
+    current_holder VARCHAR(200),
+    free_copy_id INTEGER
 ) AS $$
 BEGIN
     RETURN QUERY
@@ -237,6 +517,21 @@ BEGIN
         FROM books b
         WHERE b.id = p_book_id
     ),
+    free_copy AS (
+        SELECT c.id
+        FROM book_copies c
+        WHERE c.book_id = p_book_id
+        AND c.status != 'withdrawn'
+        AND NOT EXISTS (
+            SELECT 1 FROM reservations r
+            WHERE r.copy_id = c.id
+            AND r.status NOT IN ('cancelled', 'expired')
+            AND r.start_date <= p_end_date
+            AND LEAST(r.end_date, r.released_on - 1) >= p_start_date
+        )
+        ORDER BY c.id
+        LIMIT 1
+    ),
     conflict_check AS (
         SELECT 
             r.id,
@@ -244,16 +539,90 @@ BEGIN
         FROM reservations r
         JOIN readers rd ON r.reader_id = rd.id
         WHERE r.book_id = p_book_id
-        AND r.status != 'cancelled'
+        AND r.status NOT IN ('cancelled', 'expired')
         AND r.start_date <= p_end_date
-        AND r.end_date >= p_start_date
+        AND LEAST(r.end_date, r.released_on - 1) >= p_start_date
+        ORDER BY r.start_date
         LIMIT 1
     )
     SELECT 
         EXISTS (SELECT 1 FROM book_check) as book_exists,
         COALESCE((SELECT status FROM book_check), 'not_found')::VARCHAR(20) as book_status,
-        EXISTS (SELECT 1 FROM conflict_check) as has_conflict,
-        COALESCE((SELECT holder_name FROM conflict_check), NULL)::VARCHAR(200) as current_holder;
+        NOT EXISTS (SELECT 1 FROM free_copy) as has_conflict,
+        CASE WHEN NOT EXISTS (SELECT 1 FROM free_copy)
+            THEN (SELECT holder_name FROM conflict_check)
+        END::VARCHAR(200) as current_holder,
+        (SELECT id FROM free_copy) as free_copy_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Turns waitlist entries for a book into reservations, oldest first, for as
+-- long as a copy is free for their window. Entries that don't fit yet keep
+-- their place. Callers hold the circulation lock for the book.
+CREATE OR REPLACE FUNCTION promote_waitlist(p_book_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    entry RECORD;
+    v_start DATE;
+    v_copy_id INTEGER;
+    v_reservation_id INTEGER;
+    promoted INTEGER := 0;
+BEGIN
+    FOR entry IN
+        SELECT w.id, w.reader_id, w.start_date, w.end_date
+        FROM reservation_waitlist w
+        WHERE w.book_id = p_book_id
+        AND w.status = 'waiting'
+        AND w.end_date >= CURRENT_DATE
+        ORDER BY w.created_at, w.id
+        FOR UPDATE SKIP LOCKED
+    LOOP
+        v_start := GREATEST(entry.start_date, CURRENT_DATE);
+        SELECT a.free_copy_id INTO v_copy_id
+        FROM check_book_availability(p_book_id, v_start, entry.end_date) a;
+        CONTINUE WHEN v_copy_id IS NULL;
+
+        INSERT INTO reservations (book_id, copy_id, reader_id, start_date, end_date, status)
+        VALUES (p_book_id, v_copy_id, entry.reader_id, v_start, entry.end_date, 'pending')
+        RETURNING id INTO v_reservation_id;
+
+        UPDATE reservation_waitlist
+        SET status = 'promoted',
+            reservation_id = v_reservation_id
+        WHERE id = entry.id;
+        promoted := promoted + 1;
+    END LOOP;
+    RETURN promoted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Moves the live reservations held on a copy that just left circulation onto
+-- other free copies, earliest first. Returns how many found no free copy;
+-- the caller rolls back in that case. Callers hold the circulation lock.
+CREATE OR REPLACE FUNCTION reassign_copy_reservations(p_copy_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    booking RECORD;
+    v_copy_id INTEGER;
+    stranded INTEGER := 0;
+BEGIN
+    FOR booking IN
+        SELECT r.id, r.book_id, r.start_date, r.end_date
+        FROM reservations r
+        WHERE r.copy_id = p_copy_id
+        AND r.status = 'pending'
+        AND r.end_date >= CURRENT_DATE
+        ORDER BY r.start_date, r.id
+    LOOP
+        SELECT a.free_copy_id INTO v_copy_id
+        FROM check_book_availability(booking.book_id, GREATEST(booking.start_date, CURRENT_DATE), booking.end_date) a;
+        IF v_copy_id IS NULL THEN
+            stranded := stranded + 1;
+        ELSE
+            UPDATE reservations SET copy_id = v_copy_id WHERE id = booking.id;
+        END IF;
+    END LOOP;
+    RETURN stranded;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -582,8 +951,15 @@ INSERT INTO loans (book_id, reader_id, loan_date, return_date, status) VALUES
 (1, (SELECT id FROM readers WHERE email = 'john@example.com'), CURRENT_DATE - INTERVAL '20 days', NULL, 'borrowed'),
 (5, (SELECT id FROM readers WHERE email = 'yuki@example.com'), CURRENT_DATE - INTERVAL '60 days', CURRENT_DATE - INTERVAL '45 days', 'returned');
 
-UPDATE books SET status = 'borrowed' WHERE id IN (
-    SELECT book_id FROM loans WHERE status = 'borrowed'
+-- One copy per seeded title; circulation history is attached to it
+INSERT INTO book_copies (book_id)
+SELECT id FROM books ORDER BY id;
+
+UPDATE loans l SET copy_id = c.id FROM book_copies c WHERE c.book_id = l.book_id;
+UPDATE reservations r SET copy_id = c.id FROM book_copies c WHERE c.book_id = r.book_id;
+
+UPDATE book_copies SET status = 'borrowed' WHERE id IN (
+    SELECT copy_id FROM loans WHERE status = 'borrowed'
 );
 
 COMMIT;
\ No newline at end of file
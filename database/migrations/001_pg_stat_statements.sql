@@ -0,0 +1,3 @@
+-- Existing databases: init.sql only runs on a fresh volume.
+-- Requires shared_preload_libraries=pg_stat_statements (see docker-compose.yaml).
+CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
@@ -0,0 +1,152 @@
+-- Existing databases: multi-copy inventory (init.sql only runs on a fresh volume).
+-- Every existing title gets one copy that inherits its loans and reservations.
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS book_copies (
+    id SERIAL PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    status VARCHAR(20) NOT NULL DEFAULT 'available',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT valid_copy_status CHECK (status IN ('available', 'borrowed', 'withdrawn'))
+);
+
+ALTER TABLE books
+    ADD COLUMN IF NOT EXISTS total_copies INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS available_copies INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE loans ADD COLUMN IF NOT EXISTS copy_id INTEGER REFERENCES book_copies(id);
+ALTER TABLE reservations ADD COLUMN IF NOT EXISTS copy_id INTEGER REFERENCES book_copies(id);
+
+CREATE TRIGGER update_book_copies_updated_at
+    BEFORE UPDATE ON book_copies
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+INSERT INTO book_copies (book_id, status)
+SELECT b.id,
+    CASE WHEN EXISTS (SELECT 1 FROM loans l WHERE l.book_id = b.id AND l.status = 'borrowed')
+        THEN 'borrowed' ELSE 'available' END
+FROM books b
+ORDER BY b.id;
+
+UPDATE loans l SET copy_id = c.id FROM book_copies c WHERE c.book_id = l.book_id AND l.copy_id IS NULL;
+UPDATE reservations r SET copy_id = c.id FROM book_copies c WHERE c.book_id = r.book_id AND r.copy_id IS NULL;
+
+CREATE INDEX idx_book_copies_book_status ON book_copies (book_id, status);
+CREATE INDEX idx_reservations_copy_dates ON reservations (copy_id, start_date, end_date)
+WHERE status != 'cancelled';
+CREATE INDEX idx_loans_copy_status ON loans (copy_id, status);
+
+CREATE OR REPLACE FUNCTION sync_book_copy_counts()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE books
+        SET total_copies = total_copies - (OLD.status != 'withdrawn')::int,
+            available_copies = available_copies - (OLD.status = 'available')::int
+        WHERE id = OLD.book_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE books
+        SET total_copies = total_copies + (NEW.status != 'withdrawn')::int,
+            available_copies = available_copies + (NEW.status = 'available')::int
+        WHERE id = NEW.book_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sync_book_copy_counts_trigger
+AFTER INSERT OR DELETE OR UPDATE OF status, book_id ON book_copies
+FOR EACH ROW EXECUTE FUNCTION sync_book_copy_counts();
+
+-- books.status is derived from the copy counts so per-title filters keep working
+CREATE OR REPLACE FUNCTION derive_book_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.status := CASE
+        WHEN NEW.available_copies > 0 THEN 'available'
+        WHEN NEW.total_copies > 0 THEN 'borrowed'
+        ELSE 'unavailable'
+    END;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER derive_book_status_trigger
+BEFORE INSERT OR UPDATE OF total_copies, available_copies ON books
+FOR EACH ROW EXECUTE FUNCTION derive_book_status();
+
+UPDATE books b
+SET total_copies = counts.total,
+    available_copies = counts.available
+FROM (
+    SELECT book_id,
+        COUNT(*) FILTER (WHERE status != 'withdrawn') AS total,
+        COUNT(*) FILTER (WHERE status = 'available') AS available
+    FROM book_copies
+    GROUP BY book_id
+) counts
+WHERE counts.book_id = b.id;
+
+-- Return type changed with book_copies, so CREATE OR REPLACE is not enough
+DROP FUNCTION IF EXISTS check_book_availability(INTEGER, DATE, DATE);
+
+CREATE OR REPLACE FUNCTION check_book_availability(
+    p_book_id INTEGER,
+    p_start_date DATE,
+    p_end_date DATE
+) RETURNS TABLE (
+    book_exists BOOLEAN,
+    book_status VARCHAR(20),
+    has_conflict BOOLEAN,
+    current_holder VARCHAR(200),
+    free_copy_id INTEGER
+) AS $$
+BEGIN
+    RETURN QUERY
+    WITH book_check AS (
+        SELECT b.id, b.status
+        FROM books b
+        WHERE b.id = p_book_id
+    ),
+    free_copy AS (
+        SELECT c.id
+        FROM book_copies c
+        WHERE c.book_id = p_book_id
+        AND c.status != 'withdrawn'
+        AND NOT EXISTS (
+            SELECT 1 FROM reservations r
+            WHERE r.copy_id = c.id
+            AND r.status != 'cancelled'
+            AND r.start_date <= p_end_date
+            AND r.end_date >= p_start_date
+        )
+        ORDER BY c.id
+        LIMIT 1
+    ),
+    conflict_check AS (
+        SELECT 
+            r.id,
+            CAST(CONCAT(rd.first_name, ' ', rd.last_name) AS VARCHAR(200)) as holder_name
+        FROM reservations r
+        JOIN readers rd ON r.reader_id = rd.id
+        WHERE r.book_id = p_book_id
+        AND r.status != 'cancelled'
+        AND r.start_date <= p_end_date
+        AND r.end_date >= p_start_date
+        ORDER BY r.start_date
+        LIMIT 1
+    )
+    SELECT 
+        EXISTS (SELECT 1 FROM book_check) as book_exists,
+        COALESCE((SELECT status FROM book_check), 'not_found')::VARCHAR(20) as book_status,
+        NOT EXISTS (SELECT 1 FROM free_copy) as has_conflict,
+        CASE WHEN NOT EXISTS (SELECT 1 FROM free_copy)
+            THEN (SELECT holder_name FROM conflict_check)
+        END::VARCHAR(200) as current_holder,
+        (SELECT id FROM free_copy) as free_copy_id;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
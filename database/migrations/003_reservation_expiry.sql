@@ -0,0 +1,73 @@
+-- Existing databases: reservation expiry (init.sql only runs on a fresh volume).
+-- Run `flask expire-reservations` afterwards to expire the backlog in batches.
+BEGIN;
+
+DROP INDEX IF EXISTS idx_reservations_dates;
+CREATE INDEX idx_reservations_dates ON reservations (book_id, status, start_date, end_date)
+WHERE status NOT IN ('cancelled', 'expired');
+
+DROP INDEX IF EXISTS idx_reservations_copy_dates;
+CREATE INDEX idx_reservations_copy_dates ON reservations (copy_id, start_date, end_date)
+WHERE status NOT IN ('cancelled', 'expired');
+
+CREATE INDEX IF NOT EXISTS idx_reservations_pending ON reservations (book_id, start_date, end_date)
+WHERE status = 'pending';
+
+CREATE OR REPLACE FUNCTION check_book_availability(
+    p_book_id INTEGER,
+    p_start_date DATE,
+    p_end_date DATE
+) RETURNS TABLE (
+    book_exists BOOLEAN,
+    book_status VARCHAR(20),
+    has_conflict BOOLEAN,
+    current_holder VARCHAR(200),
+    free_copy_id INTEGER
+) AS $$
+BEGIN
+    RETURN QUERY
+    WITH book_check AS (
+        SELECT b.id, b.status
+        FROM books b
+        WHERE b.id = p_book_id
+    ),
+    free_copy AS (
+        SELECT c.id
+        FROM book_copies c
+        WHERE c.book_id = p_book_id
+        AND c.status != 'withdrawn'
+        AND NOT EXISTS (
+            SELECT 1 FROM reservations r
+            WHERE r.copy_id = c.id
+            AND r.status NOT IN ('cancelled', 'expired')
+            AND r.start_date <= p_end_date
+            AND r.end_date >= p_start_date
+        )
+        ORDER BY c.id
+        LIMIT 1
+    ),
+    conflict_check AS (
+        SELECT 
+            r.id,
+            CAST(CONCAT(rd.first_name, ' ', rd.last_name) AS VARCHAR(200)) as holder_name
+        FROM reservations r
+        JOIN readers rd ON r.reader_id = rd.id
+        WHERE r.book_id = p_book_id
+        AND r.status NOT IN ('cancelled', 'expired')
+        AND r.start_date <= p_end_date
+        AND r.end_date >= p_start_date
+        ORDER BY r.start_date
+        LIMIT 1
+    )
+    SELECT 
+        EXISTS (SELECT 1 FROM book_check) as book_exists,
+        COALESCE((SELECT status FROM book_check), 'not_found')::VARCHAR(20) as book_status,
+        NOT EXISTS (SELECT 1 FROM free_copy) as has_conflict,
+        CASE WHEN NOT EXISTS (SELECT 1 FROM free_copy)
+            THEN (SELECT holder_name FROM conflict_check)
+        END::VARCHAR(200) as current_holder,
+        (SELECT id FROM free_copy) as free_copy_id;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,67 @@
+-- Existing databases: reservation waitlist (init.sql only runs on a fresh volume).
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS reservation_waitlist (
+    id SERIAL PRIMARY KEY,
+    book_id INTEGER NOT NULL REFERENCES books(id) ON DELETE CASCADE,
+    reader_id INTEGER NOT NULL REFERENCES readers(id) ON DELETE CASCADE,
+    start_date DATE NOT NULL,
+    end_date DATE NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'waiting',
+    reservation_id INTEGER REFERENCES reservations(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT valid_waitlist_status CHECK (status IN ('waiting', 'promoted', 'cancelled', 'expired'))
+);
+
+CREATE TRIGGER update_reservation_waitlist_updated_at
+    BEFORE UPDATE ON reservation_waitlist
+    FOR EACH ROW
+    EXECUTE FUNCTION update_updated_at_column();
+
+CREATE INDEX idx_waitlist_queue ON reservation_waitlist (book_id, created_at, id)
+WHERE status = 'waiting';
+CREATE UNIQUE INDEX idx_waitlist_reader_book ON reservation_waitlist (book_id, reader_id)
+WHERE status = 'waiting';
+
+-- Turns waitlist entries for a book into reservations, oldest first, for as
+-- long as a copy is free for their window. Entries that don't fit yet keep
+-- their place. Callers hold the circulation lock for the book.
+CREATE OR REPLACE FUNCTION promote_waitlist(p_book_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    entry RECORD;
+    v_start DATE;
+    v_copy_id INTEGER;
+    v_reservation_id INTEGER;
+    promoted INTEGER := 0;
+BEGIN
+    FOR entry IN
+        SELECT w.id, w.reader_id, w.start_date, w.end_date
+        FROM reservation_waitlist w
+        WHERE w.book_id = p_book_id
+        AND w.status = 'waiting'
+        AND w.end_date >= CURRENT_DATE
+        ORDER BY w.created_at, w.id
+        FOR UPDATE SKIP LOCKED
+    LOOP
+        v_start := GREATEST(entry.start_date, CURRENT_DATE);
+        SELECT a.free_copy_id INTO v_copy_id
+        FROM check_book_availability(p_book_id, v_start, entry.end_date) a;
+        CONTINUE WHEN v_copy_id IS NULL;
+
+        INSERT INTO reservations (book_id, copy_id, reader_id, start_date, end_date, status)
+        VALUES (p_book_id, v_copy_id, entry.reader_id, v_start, entry.end_date, 'pending')
+        RETURNING id INTO v_reservation_id;
+
+        UPDATE reservation_waitlist
+        SET status = 'promoted',
+            reservation_id = v_reservation_id
+        WHERE id = entry.id;
+        promoted := promoted + 1;
+    END LOOP;
+    RETURN promoted;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,13 @@
+-- Existing databases: indexes for the paginated reader/user search
+-- (init.sql only runs on a fresh volume). pg_trgm ships with the postgres image.
+-- Builds CONCURRENTLY, so run it without a wrapping transaction (no psql -1).
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_name ON readers (last_name, first_name, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_email_lower ON readers (LOWER(email));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_name_trgm ON readers USING gin ((first_name || ' ' || last_name) gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_email_trgm ON readers USING gin (email gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_card_trgm ON readers USING gin (card_number gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email_lower ON users (LOWER(email));
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_username_trgm ON users USING gin (username gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email_trgm ON users USING gin (email gin_trgm_ops);
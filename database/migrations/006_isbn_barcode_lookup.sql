@@ -0,0 +1,65 @@
+-- Existing databases: normalized ISBN-13 and copy barcodes for scanner lookups
+-- (init.sql only runs on a fresh volume). Adding the generated column
+-- rewrites books once, which is the backfill.
+BEGIN;
+
+-- Canonical ISBN-13 for an ISBN-10/ISBN-13/EAN in any formatting, or NULL if
+-- the check digit is wrong. Kept in step with backend/isbn.py.
+CREATE OR REPLACE FUNCTION normalize_isbn(code TEXT)
+RETURNS VARCHAR(13) AS $$
+DECLARE
+    digits TEXT := UPPER(regexp_replace(code, '[\s-]', '', 'g'));
+    body TEXT;
+    total INTEGER := 0;
+BEGIN
+    IF digits ~ '^\d{9}[\dX]$' THEN
+        FOR i IN 1..10 LOOP
+            total := total + (11 - i) * CASE WHEN substr(digits, i, 1) = 'X' THEN 10
+                                             ELSE substr(digits, i, 1)::int END;
+        END LOOP;
+        IF total % 11 != 0 THEN
+            RETURN NULL;
+        END IF;
+        body := '978' || left(digits, 9);
+    ELSIF digits ~ '^97[89]\d{10}$' THEN
+        body := left(digits, 12);
+    ELSE
+        RETURN NULL;
+    END IF;
+
+    total := 0;
+    FOR i IN 1..12 LOOP
+        total := total + substr(body, i, 1)::int * CASE WHEN i % 2 = 0 THEN 3 ELSE 1 END;
+    END LOOP;
+    body := body || ((10 - total % 10) % 10)::text;
+    IF length(digits) = 13 AND body != digits THEN
+        RETURN NULL;
+    END IF;
+    RETURN body;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+ALTER TABLE books
+    ADD COLUMN IF NOT EXISTS isbn13 VARCHAR(13) GENERATED ALWAYS AS (normalize_isbn(isbn)) STORED;
+CREATE INDEX IF NOT EXISTS idx_books_isbn13 ON books (isbn13);
+
+ALTER TABLE book_copies ADD COLUMN IF NOT EXISTS barcode VARCHAR(32) UNIQUE;
+UPDATE book_copies SET barcode = 'LIB' || lpad(id::text, 9, '0') WHERE barcode IS NULL;
+
+-- Copies without a supplied barcode get one derived from their id
+CREATE OR REPLACE FUNCTION assign_copy_barcode()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.barcode IS NULL THEN
+        NEW.barcode := 'LIB' || lpad(NEW.id::text, 9, '0');
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER assign_copy_barcode_trigger
+    BEFORE INSERT ON book_copies
+    FOR EACH ROW
+    EXECUTE FUNCTION assign_copy_barcode();
+
+COMMIT;
@@ -0,0 +1,76 @@
+-- Existing databases: tombstones and updated_at indexes for /api/sync
+-- (init.sql only runs on a fresh volume).
+-- Builds CONCURRENTLY, so run it without a wrapping transaction (no psql -1).
+
+CREATE TABLE IF NOT EXISTS sync_tombstones (
+    id BIGSERIAL PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    row_id INTEGER NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sync_tombstones (table_name, row_id) VALUES (TG_TABLE_NAME, OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS record_authors_tombstone ON authors;
+CREATE TRIGGER record_authors_tombstone
+    AFTER DELETE ON authors
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS record_publishers_tombstone ON publishers;
+CREATE TRIGGER record_publishers_tombstone
+    AFTER DELETE ON publishers
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS record_books_tombstone ON books;
+CREATE TRIGGER record_books_tombstone
+    AFTER DELETE ON books
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS record_book_copies_tombstone ON book_copies;
+CREATE TRIGGER record_book_copies_tombstone
+    AFTER DELETE ON book_copies
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS record_readers_tombstone ON readers;
+CREATE TRIGGER record_readers_tombstone
+    AFTER DELETE ON readers
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS record_reservations_tombstone ON reservations;
+CREATE TRIGGER record_reservations_tombstone
+    AFTER DELETE ON reservations
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS record_reservation_waitlist_tombstone ON reservation_waitlist;
+CREATE TRIGGER record_reservation_waitlist_tombstone
+    AFTER DELETE ON reservation_waitlist
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+DROP TRIGGER IF EXISTS record_loans_tombstone ON loans;
+CREATE TRIGGER record_loans_tombstone
+    AFTER DELETE ON loans
+    FOR EACH ROW
+    EXECUTE FUNCTION record_sync_tombstone();
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_authors_updated_at ON authors (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_publishers_updated_at ON publishers (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_books_updated_at ON books (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_book_copies_updated_at ON book_copies (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_readers_updated_at ON readers (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservations_updated_at ON reservations (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservation_waitlist_updated_at ON reservation_waitlist (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loans_updated_at ON loans (updated_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sync_tombstones_cursor ON sync_tombstones (table_name, deleted_at, id);
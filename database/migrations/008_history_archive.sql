@@ -0,0 +1,62 @@
+-- Existing databases: archive tables and sweep indexes for the retention
+-- subsystem (init.sql only runs on a fresh volume).
+-- Builds CONCURRENTLY, so run it without a wrapping transaction (no psql -1).
+CREATE TABLE IF NOT EXISTS loans_archive (
+    LIKE loans,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS reservations_archive (
+    LIKE reservations,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS reader_registration_requests_archive (
+    LIKE reader_registration_requests,
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+
+CREATE OR REPLACE FUNCTION record_sync_tombstone()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('library.archiving', true) IS DISTINCT FROM 'on' THEN
+        INSERT INTO sync_tombstones (table_name, row_id) VALUES (TG_TABLE_NAME, OLD.id);
+    END IF;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Archived loans still count towards a reader's totals
+BEGIN;
+DROP MATERIALIZED VIEW IF EXISTS reader_summary;
+CREATE MATERIALIZED VIEW reader_summary AS
+SELECT 
+    r.id,
+    r.first_name,
+    r.last_name,
+    r.email,
+    u.username,
+    COUNT(l.id) as total_loans,
+    COUNT(CASE WHEN l.status = 'borrowed' THEN 1 END) as active_loans
+FROM readers r
+JOIN users u ON r.user_id = u.id
+LEFT JOIN (
+    SELECT id, reader_id, status FROM loans
+    UNION ALL
+    SELECT id, reader_id, status FROM loans_archive
+) l ON r.id = l.reader_id
+GROUP BY r.id, r.first_name, r.last_name, r.email, u.username;
+CREATE UNIQUE INDEX idx_reader_summary_id ON reader_summary (id);
+COMMIT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loans_returned ON loans (return_date, id) WHERE status = 'returned';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reservations_finished ON reservations (end_date, id)
+WHERE status IN ('completed', 'cancelled', 'expired');
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reader_requests_processed ON reader_registration_requests (processed_at, id)
+WHERE status IN ('approved', 'rejected');
+CREATE INDEX IF NOT EXISTS idx_loans_archive_reader ON loans_archive (reader_id, return_date);
+CREATE INDEX IF NOT EXISTS idx_reservations_archive_start ON reservations_archive (start_date);
+CREATE INDEX IF NOT EXISTS idx_reader_requests_archive_processed ON reader_registration_requests_archive (processed_at);
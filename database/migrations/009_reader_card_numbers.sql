@@ -0,0 +1,20 @@
+-- Existing databases: allocate library card numbers from a sequence
+-- (init.sql only runs on a fresh volume). Readers without a card get one.
+BEGIN;
+
+CREATE SEQUENCE IF NOT EXISTS reader_card_number_seq;
+
+-- Continue after the highest card already issued in the C000000001 format
+SELECT setval('reader_card_number_seq', GREATEST(
+    (SELECT MAX(substring(card_number FROM 2)::bigint) FROM readers WHERE card_number ~ '^C\d{9}$'),
+    1
+), EXISTS (SELECT 1 FROM readers WHERE card_number ~ '^C\d{9}$'));
+
+ALTER TABLE readers
+    ALTER COLUMN card_number SET DEFAULT 'C' || lpad(nextval('reader_card_number_seq')::text, 9, '0');
+
+UPDATE readers
+SET card_number = 'C' || lpad(nextval('reader_card_number_seq')::text, 9, '0')
+WHERE card_number IS NULL;
+
+COMMIT;
@@ -0,0 +1,10 @@
+-- Existing databases: partial index for the pending reader-request queue,
+-- replacing the status and created_at indexes the queue queries no longer
+-- use (init.sql only runs on a fresh volume). Run 008 first; it creates
+-- idx_reader_requests_processed for the processed queue.
+-- Builds CONCURRENTLY, so run it without a wrapping transaction (no psql -1).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reader_requests_pending ON reader_registration_requests (created_at, id)
+WHERE status = 'pending';
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_reader_requests_status;
+DROP INDEX CONCURRENTLY IF EXISTS idx_reader_requests_created_at;
@@ -0,0 +1,28 @@
+-- Existing databases: last_activity on reader_summary for the admin user
+-- view, and the index behind its paginated loan history (init.sql only runs
+-- on a fresh volume). Run 008 first; this view reads loans_archive.
+-- Builds CONCURRENTLY, so run it without a wrapping transaction (no psql -1).
+BEGIN;
+DROP MATERIALIZED VIEW IF EXISTS reader_summary;
+CREATE MATERIALIZED VIEW reader_summary AS
+SELECT 
+    r.id,
+    r.first_name,
+    r.last_name,
+    r.email,
+    u.username,
+    COUNT(l.id) as total_loans,
+    COUNT(CASE WHEN l.status = 'borrowed' THEN 1 END) as active_loans,
+    GREATEST(MAX(l.loan_date), MAX(l.return_date)) as last_activity
+FROM readers r
+JOIN users u ON r.user_id = u.id
+LEFT JOIN (
+    SELECT id, reader_id, status, loan_date, return_date FROM loans
+    UNION ALL
+    SELECT id, reader_id, status, loan_date, return_date FROM loans_archive
+) l ON r.id = l.reader_id
+GROUP BY r.id, r.first_name, r.last_name, r.email, u.username;
+CREATE UNIQUE INDEX idx_reader_summary_id ON reader_summary (id);
+COMMIT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_loans_reader_history ON loans (reader_id, loan_date, id);
@@ -0,0 +1,31 @@
+-- Existing databases: moves reservations off a withdrawn copy (init.sql only
+-- runs on a fresh volume).
+-- Moves the live reservations held on a copy that just left circulation onto
+-- other free copies, earliest first. Returns how many found no free copy;
+-- the caller rolls back in that case. Callers hold the circulation lock.
+CREATE OR REPLACE FUNCTION reassign_copy_reservations(p_copy_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    booking RECORD;
+    v_copy_id INTEGER;
+    stranded INTEGER := 0;
+BEGIN
+    FOR booking IN
+        SELECT r.id, r.book_id, r.start_date, r.end_date
+        FROM reservations r
+        WHERE r.copy_id = p_copy_id
+        AND r.status = 'pending'
+        AND r.end_date >= CURRENT_DATE
+        ORDER BY r.start_date, r.id
+    LOOP
+        SELECT a.free_copy_id INTO v_copy_id
+        FROM check_book_availability(booking.book_id, GREATEST(booking.start_date, CURRENT_DATE), booking.end_date) a;
+        IF v_copy_id IS NULL THEN
+            stranded := stranded + 1;
+        ELSE
+            UPDATE reservations SET copy_id = v_copy_id WHERE id = booking.id;
+        END IF;
+    END LOOP;
+    RETURN stranded;
+END;
+$$ LANGUAGE plpgsql;
@@ -13,7 +13,8 @@ const AddBook = () => {
     isbn: '',
     publisher: '',
     publication_year: '',
-    genre: ''
+    genre: '',
+    copies: 1
   });
   const [error, setError] = useState(null);
 
@@ -23,7 +24,7 @@ const AddBook = () => {
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
-      await api.post('/books', formData);
+      await api.post('/books', { ...formData, copies: Number(formData.copies) });
       navigate('/');
     } catch (err) {
       setError(err.response?.data?.error || 'Nie udało się dodać książki');
@@ -128,6 +129,19 @@ const AddBook = () => {
           />
         </div>
 
+        <div>
+          <label className="block mb-1">Liczba egzemplarzy</label>
+          <input
+            type="number"
+            name="copies"
+            min="1"
+            value={formData.copies}
+            onChange={handleChange}
+            className="w-full p-2 border rounded"
+            required
+          />
+        </div>
+
         <button
           type="submit"
           className="w-full bg-blue-500 text-white py-2 px-4 rounded hover:bg-blue-600"
@@ -8,6 +8,10 @@ const AdminDashboard = () => {
   const navigate = useNavigate();
   const [backupStatus, setBackupStatus] = useState('');
   const [error, setError] = useState('');
+  const [restoreFile, setRestoreFile] = useState(null);
+  const [restoreJobs, setRestoreJobs] = useState(4);
+  const [restoreJob, setRestoreJob] = useState(null);
+  const [restoreError, setRestoreError] = useState('');
 
   // Check if user is admin
   useEffect(() => {
@@ -16,13 +20,49 @@ const AdminDashboard = () => {
     }
   }, [user, navigate]);
 
+  // Poll the background restore until it completes or fails
+  useEffect(() => {
+    if (!restoreJob || restoreJob.status !== 'running') return;
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.get(`/api/admin/database/restore/${restoreJob.id}`);
+        setRestoreJob(response.data);
+      } catch (err) {
+        console.error('Błąd pobierania postępu odtwarzania:', err);
+      }
+    }, 2000);
+    return () => clearTimeout(timer);
+  }, [restoreJob]);
+
+  const handleRestoreDatabase = async () => {
+    if (!restoreFile) return;
+    if (!window.confirm('Odtworzenie nadpisze wszystkie dane w bazie. Kontynuować?')) return;
+
+    try {
+      setRestoreError('');
+      const formData = new FormData();
+      formData.append('file', restoreFile);
+      formData.append('jobs', restoreJobs);
+      const response = await api.post('/api/admin/database/restore', formData);
+      setRestoreJob({ id: response.data.job_id, status: 'running', running: [], finished: [] });
+    } catch (err) {
+      setRestoreError(err.response?.data?.error || 'Nie udało się rozpocząć odtwarzania bazy danych');
+      console.error('Błąd odtwarzania bazy danych:', err);
+    }
+  };
+
   const handleBackupDatabase = async () => {
     try {
       setBackupStatus('Tworzenie kopii zapasowej...');
       setError('');
 
       const response = await api.get('/api/admin/database/backup', {
-        responseType: 'blob'
+        responseType: 'blob',
+        // The dump is streamed, so the total size is not known in advance
+        onDownloadProgress: (event) => {
+          const megabytes = (event.loaded / (1024 * 1024)).toFixed(1);
+          setBackupStatus(`Pobieranie kopii zapasowej... ${megabytes} MB`);
+        }
       });
 
       // Create a download link
@@ -32,7 +72,7 @@ const AdminDashboard = () => {
       
       // Get filename from response headers or use default
       const contentDisposition = response.headers['content-disposition'];
-      let filename = 'library_backup.sql';
+      let filename = 'library_backup.dump';
       if (contentDisposition) {
         const filenameMatch = contentDisposition.match(/filename="?([^"]+)"?/);
         if (filenameMatch) {
@@ -84,7 +124,71 @@ const AdminDashboard = () => {
           </div>
           
           <div className="text-sm text-gray-600">
-            <p>Ta operacja utworzy pełną kopię zapasową bazy danych w formacie SQL.</p>
+            <p>Ta operacja utworzy pełną, skompresowaną kopię zapasową bazy danych (format pg_dump, do odtworzenia za pomocą pg_restore).</p>
+          </div>
+        </div>
+      </div>
+
+      <div className="bg-white shadow rounded-lg p-6 mt-6">
+        <h2 className="text-xl font-semibold mb-4">Odtwarzanie Bazy Danych</h2>
+
+        <div className="space-y-4">
+          <div className="flex items-center space-x-4">
+            <input
+              type="file"
+              accept=".dump"
+              onChange={(e) => setRestoreFile(e.target.files[0] || null)}
+            />
+            <label className="text-sm">
+              Równoległe zadania
+              <input
+                type="number"
+                min="1"
+                value={restoreJobs}
+                onChange={(e) => setRestoreJobs(e.target.value)}
+                className="ml-2 w-16 border rounded px-2 py-1"
+              />
+            </label>
+            <button
+              onClick={handleRestoreDatabase}
+              disabled={!restoreFile || restoreJob?.status === 'running'}
+              className="bg-red-500 text-white px-4 py-2 rounded hover:bg-red-600 disabled:opacity-50"
+            >
+              Odtwórz Bazę Danych
+            </button>
+          </div>
+
+          {restoreError && (
+            <p className="text-sm text-red-600">{restoreError}</p>
+          )}
+
+          {restoreJob && (
+            <div className="text-sm">
+              <p>
+                {restoreJob.status === 'running' && 'Odtwarzanie w toku...'}
+                {restoreJob.status === 'completed' && 'Odtwarzanie zakończone pomyślnie.'}
+                {restoreJob.status === 'failed' && `Odtwarzanie nie powiodło się: ${restoreJob.error}`}
+                {restoreJob.elapsed_seconds !== undefined && ` (${restoreJob.elapsed_seconds.toFixed(1)} s)`}
+              </p>
+              <p>Ukończone elementy: {restoreJob.finished.length}</p>
+              {restoreJob.running.length > 0 && (
+                <p>W trakcie: {restoreJob.running.join(', ')}</p>
+              )}
+              {restoreJob.status !== 'running' && (
+                <ul className="mt-2 text-gray-600">
+                  {[...restoreJob.finished]
+                    .sort((a, b) => b.seconds - a.seconds)
+                    .slice(0, 10)
+                    .map((entry) => (
+                      <li key={entry.item}>{entry.seconds.toFixed(1)} s — {entry.item}</li>
+                    ))}
+                </ul>
+              )}
+            </div>
+          )}
+
+          <div className="text-sm text-gray-600">
+            <p>Przyjmuje kopię w formacie pg_dump (.dump). Indeksy i ograniczenia są tworzone po wczytaniu wszystkich danych.</p>
           </div>
         </div>
       </div>
@@ -157,6 +157,9 @@ const BookList = () => {
               <p className="text-sm text-gray-500">Wydawnictwo: {book.publisher}</p>
               <p className="text-sm text-gray-500">Rok wydania: {book.year}</p>
               <p className="text-sm text-gray-500">Gatunek: {book.genre}</p>
+              <p className="text-sm text-gray-500">
+                Egzemplarze: {book.available_copies} / {book.total_copies} dostępne
+              </p>
               <div className="mt-4 flex justify-between items-center">
                 <span className={`px-2 py-1 rounded text-sm ${
                   book.status === 'available' ? 'bg-green-100 text-green-800' : 'bg-red-100 text-red-800'
@@ -15,6 +15,8 @@ const LoanBook = () => {
   const [error, setError] = useState('');
   const [success, setSuccess] = useState('');
   const [loading, setLoading] = useState(true);
+  const [readerSearch, setReaderSearch] = useState('');
+  const [matchingReaders, setMatchingReaders] = useState(null);
 
   useEffect(() => {
     const fetchBooks = async () => {
@@ -37,6 +39,25 @@ const LoanBook = () => {
     fetchBooks();
   }, [user, navigate]);
 
+  // Look readers up on the server by card number, name or email
+  useEffect(() => {
+    if (!readerSearch.trim()) {
+      setMatchingReaders(null);
+      return;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const response = await api.get('/api/loans/readers', {
+          params: { q: readerSearch.trim(), per_page: 50 }
+        });
+        setMatchingReaders(new Set(response.data.readers.map(r => String(r.id))));
+      } catch (err) {
+        setError('Nie udało się wyszukać czytelników');
+      }
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [readerSearch]);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -91,6 +112,17 @@ const LoanBook = () => {
       {success && <div className="text-green-600 mb-4">{success}</div>}
       
       <form onSubmit={handleSubmit} className="space-y-4">
+        <div>
+          <label className="block mb-1">Szukaj Czytelnika</label>
+          <input
+            type="text"
+            placeholder="Numer karty, imię i nazwisko lub email"
+            value={readerSearch}
+            onChange={(e) => setReaderSearch(e.target.value)}
+            className="w-full p-2 border rounded"
+          />
+        </div>
+
         <div>
           <label className="block mb-1">Wybierz Czytelnika *</label>
           <select
@@ -100,7 +132,9 @@ const LoanBook = () => {
             required
           >
             <option value="">Wybierz czytelnika</option>
-            {Object.entries(booksByReader).map(([readerId, { reader_name }]) => (
+            {Object.entries(booksByReader)
+              .filter(([readerId]) => !matchingReaders || matchingReaders.has(readerId))
+              .map(([readerId, { reader_name }]) => (
               <option key={readerId} value={readerId}>
                 {reader_name}
               </option>
@@ -12,32 +12,62 @@ const ManageReaderRequests = () => {
   const [showRejectModal, setShowRejectModal] = useState(false);
   const [selectedRequestId, setSelectedRequestId] = useState(null);
   const navigate = useNavigate();
-  const [currentPage, setCurrentPage] = useState(1);
-  const [totalPages, setTotalPages] = useState(1);
   const [activeTab, setActiveTab] = useState('pending');
-  const [pendingCurrentPage, setPendingCurrentPage] = useState(1);
-  const [processedCurrentPage, setProcessedCurrentPage] = useState(1);
-  const [pendingTotalPages, setPendingTotalPages] = useState(1);
-  const [processedTotalPages, setProcessedTotalPages] = useState(1);
+  const [pendingCount, setPendingCount] = useState(0);
+  const [pendingCursor, setPendingCursor] = useState(null);
+  const [processedCursor, setProcessedCursor] = useState(null);
+  const [includeArchived, setIncludeArchived] = useState(false);
+  const [selectedIds, setSelectedIds] = useState([]);
+  const [bulkResult, setBulkResult] = useState('');
+
+  // Both queues are keyset-paginated: the first page replaces the list and
+  // "load more" appends the page after the last cursor
+  const fetchQueue = useCallback(async (status, cursor = null) => {
+    const response = await api.get('/api/reader-requests', {
+      params: {
+        status,
+        ...(cursor ? { cursor } : {}),
+        ...(status === 'processed' && includeArchived ? { include_archived: true } : {})
+      }
+    });
+    return response.data;
+  }, [includeArchived]);
 
   const fetchRequests = useCallback(async () => {
     try {
-      const [pendingRes, processedRes] = await Promise.all([
-        api.get(`/api/reader-requests?status=pending&page=${pendingCurrentPage}`),
-        api.get(`/api/reader-requests?status=processed&page=${processedCurrentPage}`)
+      const [pendingData, processedData] = await Promise.all([
+        fetchQueue('pending'),
+        fetchQueue('processed')
       ]);
-      
-      setPendingRequests(pendingRes.data?.requests || []);
-      setPendingTotalPages(pendingRes.data?.totalPages || 1);
-      setProcessedRequests(processedRes.data?.requests || []);
-      setProcessedTotalPages(processedRes.data?.totalPages || 1);
+
+      setPendingRequests(pendingData.requests || []);
+      setPendingCursor(pendingData.next_cursor);
+      setPendingCount(pendingData.totalCount || 0);
+      setProcessedRequests(processedData.requests || []);
+      setProcessedCursor(processedData.next_cursor);
     } catch (err) {
       console.error('Błąd podczas pobierania wniosków:', err);
       setError('Nie udało się pobrać wniosków czytelników');
       setPendingRequests([]);
       setProcessedRequests([]);
     }
-  }, [pendingCurrentPage, processedCurrentPage]);
+  }, [fetchQueue]);
+
+  const loadMore = async (status) => {
+    try {
+      if (status === 'pending') {
+        const data = await fetchQueue('pending', pendingCursor);
+        setPendingRequests(prev => [...prev, ...data.requests]);
+        setPendingCursor(data.next_cursor);
+      } else {
+        const data = await fetchQueue('processed', processedCursor);
+        setProcessedRequests(prev => [...prev, ...data.requests]);
+        setProcessedCursor(data.next_cursor);
+      }
+    } catch (err) {
+      setError('Nie udało się pobrać kolejnych wniosków');
+    }
+  };
 
   useEffect(() => {
     if (user.role !== 'admin' && user.role !== 'worker') {
@@ -55,6 +85,31 @@ const ManageReaderRequests = () => {
     }
   };
 
+  const toggleSelected = (requestId) => {
+    setSelectedIds(prev =>
+      prev.includes(requestId) ? prev.filter(id => id !== requestId) : [...prev, requestId]
+    );
+  };
+
+  const summarizeBulk = (data, verb) => {
+    const failures = data.results.filter(r => r.error);
+    setBulkResult(
+      `${verb}: ${data.results.length - failures.length}, pominięto: ${failures.length}` +
+      (failures.length ? ` (${failures.map(r => `#${r.id}: ${r.error}`).join('; ')})` : '')
+    );
+    setSelectedIds([]);
+    fetchRequests();
+  };
+
+  const handleBulkApprove = async () => {
+    try {
+      const response = await api.post('/api/reader-requests/bulk-approve', { request_ids: selectedIds });
+      summarizeBulk(response.data, 'Zatwierdzono');
+    } catch (err) {
+      setError('Nie udało się zatwierdzić zaznaczonych wniosków');
+    }
+  };
+
   const openRejectModal = (requestId) => {
     setSelectedRequestId(requestId);
     setShowRejectModal(true);
@@ -68,13 +123,22 @@ const ManageReaderRequests = () => {
     }
 
     try {
-      await api.post(`/api/reader-requests/${selectedRequestId}/reject`, {
-        reason: rejectionReason
-      });
+      // Without a single request selected the modal rejects every checked one
+      if (selectedRequestId === null) {
+        const response = await api.post('/api/reader-requests/bulk-reject', {
+          request_ids: selectedIds,
+          reason: rejectionReason
+        });
+        summarizeBulk(response.data, 'Odrzucono');
+      } else {
+        await api.post(`/api/reader-requests/${selectedRequestId}/reject`, {
+          reason: rejectionReason
+        });
+        fetchRequests();
+      }
       setShowRejectModal(false);
       setRejectionReason('');
       setSelectedRequestId(null);
-      fetchRequests();
     } catch (err) {
       setError('Nie udało się odrzucić wniosku');
     }
@@ -113,40 +177,31 @@ const ManageReaderRequests = () => {
     </div>
   );
 
-  const Pagination = () => (
-    <div className="flex justify-center mt-4 space-x-2">
-      <button
-        onClick={() => setCurrentPage(p => Math.max(1, p - 1))}
-        disabled={currentPage === 1}
-        className={`px-3 py-1 rounded ${
-          currentPage === 1 
-            ? 'bg-gray-300 cursor-not-allowed' 
-            : 'bg-blue-500 text-white hover:bg-blue-600'
-        }`}
-      >
-        Poprzednia
-      </button>
-      <span className="px-4 py-1">
-        Strona {currentPage} z {totalPages}
-      </span>
-      <button
-        onClick={() => setCurrentPage(p => Math.min(totalPages, p + 1))}
-        disabled={currentPage === totalPages}
-        className={`px-3 py-1 rounded ${
-          currentPage === totalPages 
-            ? 'bg-gray-300 cursor-not-allowed' 
-            : 'bg-blue-500 text-white hover:bg-blue-600'
-        }`}
-      >
-        Następna
-      </button>
-    </div>
+  const LoadMore = ({ status, cursor }) => (
+    cursor ? (
+      <div className="flex justify-center mt-4">
+        <button
+          onClick={() => loadMore(status)}
+          className="px-3 py-1 rounded bg-blue-500 text-white hover:bg-blue-600"
+        >
+          Załaduj więcej
+        </button>
+      </div>
+    ) : null
   );
 
   const RequestCard = ({ request, isPending }) => (
     <div className="border p-4 rounded shadow">
       <div className="flex justify-between items-start">
-        <div>
+        {isPending && (
+          <input
+            type="checkbox"
+            checked={selectedIds.includes(request.id)}
+            onChange={() => toggleSelected(request.id)}
+            className="mt-1 mr-3"
+          />
+        )}
+        <div className="flex-1">
           <p className="font-bold">{request.username}</p>
           <p className="text-gray-600">{request.email}</p>
           <p>Adres: {request.address}</p>
@@ -206,7 +261,7 @@ const ManageReaderRequests = () => {
           }`}
           onClick={() => setActiveTab('pending')}
         >
-          Oczekujące wnioski ({pendingRequests.length})
+          Oczekujące wnioski ({pendingCount})
         </button>
         <button
           className={`py-2 px-4 ${
@@ -223,23 +278,58 @@ const ManageReaderRequests = () => {
       <div className="grid gap-4">
         {activeTab === 'pending' ? (
           <>
+            {pendingRequests.length > 0 && (
+              <div className="flex items-center space-x-2">
+                <button
+                  onClick={() => setSelectedIds(
+                    selectedIds.length === pendingRequests.length ? [] : pendingRequests.map(r => r.id)
+                  )}
+                  className="px-3 py-1 bg-gray-200 rounded hover:bg-gray-300"
+                >
+                  {selectedIds.length === pendingRequests.length ? 'Odznacz wszystkie' : 'Zaznacz wszystkie'}
+                </button>
+                <button
+                  onClick={handleBulkApprove}
+                  disabled={selectedIds.length === 0}
+                  className="px-3 py-1 bg-green-500 text-white rounded hover:bg-green-600 disabled:opacity-50"
+                >
+                  Zatwierdź zaznaczone ({selectedIds.length})
+                </button>
+                <button
+                  onClick={() => openRejectModal(null)}
+                  disabled={selectedIds.length === 0}
+                  className="px-3 py-1 bg-red-500 text-white rounded hover:bg-red-600 disabled:opacity-50"
+                >
+                  Odrzuć zaznaczone
+                </button>
+              </div>
+            )}
+            {bulkResult && <p className="text-sm text-gray-700">{bulkResult}</p>}
             {pendingRequests.map(request => (
               <RequestCard key={request.id} request={request} isPending={true} />
             ))}
             {pendingRequests.length === 0 && (
               <p className="text-gray-500 text-center">Brak oczekujących wniosków</p>
             )}
+            <LoadMore status="pending" cursor={pendingCursor} />
           </>
         ) : (
           <>
+            <label className="flex items-center gap-2 text-sm">
+              <input
+                type="checkbox"
+                checked={includeArchived}
+                onChange={(e) => setIncludeArchived(e.target.checked)}
+              />
+              Uwzględnij archiwum
+            </label>
             {processedRequests.map(request => (
               <RequestCard key={request.id} request={request} isPending={false} />
             ))}
-            {processedRequests.length === 0 ? (
+            {processedRequests.length === 0 && (
               <p className="text-gray-500 text-center">Brak przetworzonych wniosków</p>
-            ) : (
-              <Pagination />
             )}
+            <LoadMore status="processed" cursor={processedCursor} />
           </>
         )}
       </div>
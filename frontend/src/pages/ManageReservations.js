@@ -17,7 +17,8 @@ const ManageReservations = () => {
   const [filters, setFilters] = useState({
     status: '',
     reader_name: '',
-    book_title: ''
+    book_title: '',
+    include_archived: false
   });
   const [debouncedFilters, setDebouncedFilters] = useState(filters);
 
@@ -65,7 +66,7 @@ const ManageReservations = () => {
         api.get('/api/loans/readers')
       ]);
       setAvailableBooks(booksRes.data.books);
-      setReaders(readersRes.data);
+      setReaders(readersRes.data.readers);
     } catch (err) {
       setError('Nie udało się pobrać danych formularza');
     }
@@ -160,6 +161,7 @@ const ManageReservations = () => {
             <option value="approved">Zatwierdzone</option>
             <option value="rejected">Odrzucone</option>
             <option value="cancelled">Anulowane</option>
+            <option value="expired">Wygasłe</option>
           </select>
 
           <select
@@ -173,6 +175,15 @@ const ManageReservations = () => {
             <option value="this_week">Ten tydzień</option>
             <option value="next_week">Następny tydzień</option>
           </select>
+
+          <label className="flex items-center gap-2">
+            <input
+              type="checkbox"
+              checked={filters.include_archived}
+              onChange={(e) => setFilters(prev => ({ ...prev, include_archived: e.target.checked }))}
+            />
+            Uwzględnij archiwum
+          </label>
         </div>
       </div>
 
@@ -191,7 +202,8 @@ const ManageReservations = () => {
               <p className="text-sm text-gray-500">Status: {
                 reservation.status === 'pending' ? 'Oczekująca' :
                 reservation.status === 'approved' ? 'Zatwierdzona' :
-                reservation.status === 'rejected' ? 'Odrzucona' : 'Anulowana'
+                reservation.status === 'rejected' ? 'Odrzucona' :
+                reservation.status === 'expired' ? 'Wygasła' : 'Anulowana'
               }</p>
             </div>
           ))}
@@ -5,36 +5,52 @@ import { useNavigate } from 'react-router-dom';
 
 const ManageUsers = () => {
   const [users, setUsers] = useState([]);
+  const [search, setSearch] = useState('');
+  const [debouncedSearch, setDebouncedSearch] = useState('');
+  const [currentPage, setCurrentPage] = useState(1);
+  const [hasNext, setHasNext] = useState(false);
   const [error, setError] = useState('');
   const [showModal, setShowModal] = useState(false);
   const [userDetails, setUserDetails] = useState(null);
+  const [userLoans, setUserLoans] = useState([]);
+  const [loansCursor, setLoansCursor] = useState(null);
   const { user } = useAuth();
   const navigate = useNavigate();
 
+  // Debounce search so each keystroke doesn't hit the server
+  useEffect(() => {
+    const timer = setTimeout(() => {
+      setDebouncedSearch(search);
+      setCurrentPage(1);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [search]);
+
+  const fetchUsers = async () => {
+    try {
+      const response = await api.get('/api/users', {
+        params: { q: debouncedSearch, page: currentPage }
+      });
+      setUsers(response.data.users);
+      setHasNext(response.data.has_next);
+    } catch (err) {
+      setError('Nie udało się pobrać użytkowników');
+    }
+  };
+
   useEffect(() => {
     if (user?.role !== 'admin') {
       navigate('/');
       return;
     }
-
-    const fetchUsers = async () => {
-      try {
-        const response = await api.get('/api/users');
-        setUsers(response.data);
-      } catch (err) {
-        setError('Nie udało się pobrać użytkowników');
-      }
-    };
-
     fetchUsers();
-  }, [user, navigate]);
+  }, [user, navigate, debouncedSearch, currentPage]);
 
   const handlePromote = async (userId, newRole) => {
     try {
       await api.post(`/api/users/${userId}/promote`, { role: newRole });
       // Refresh user list
-      const response = await api.get('/api/users');
-      setUsers(response.data);
+      await fetchUsers();
     } catch (err) {
       setError('Nie udało się awansować użytkownika');
     }
@@ -51,16 +67,38 @@ const ManageUsers = () => {
     }
   };
 
+  const fetchUserLoans = async (userId, cursor) => {
+    const response = await api.get(`/api/users/${userId}/loans`, {
+      params: { cursor: cursor || undefined }
+    });
+    setUserLoans(prev => cursor ? [...prev, ...response.data.loans] : response.data.loans);
+    setLoansCursor(response.data.next_cursor);
+  };
+
   const handleInspect = async (userId) => {
     try {
       const response = await api.get(`/api/users/${userId}/details`);
       setUserDetails(response.data);
+      if (response.data.reader_profile) {
+        await fetchUserLoans(userId, null);
+      } else {
+        setUserLoans([]);
+        setLoansCursor(null);
+      }
       setShowModal(true);
     } catch (err) {
       setError('Nie udało się pobrać szczegółów użytkownika');
     }
   };
 
+  const handleMoreLoans = async () => {
+    try {
+      await fetchUserLoans(userDetails.id, loansCursor);
+    } catch (err) {
+      setError('Nie udało się pobrać historii wypożyczeń');
+    }
+  };
+
   const UserDetailsModal = () => (
     <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center p-4">
       <div className="bg-white rounded-lg p-6 max-w-2xl w-full">
@@ -80,17 +118,34 @@ const ManageUsers = () => {
                 <p>Data rejestracji: {new Date(userDetails.reader_profile.registration_date).toLocaleDateString()}</p>
               </div>
             )}
-            {userDetails.loan_history && (
+            {userDetails.loan_stats && (
               <div className="border-t pt-4">
                 <h4 className="font-bold mb-2">Historia Wypożyczeń</h4>
-                <div className="max-h-40 overflow-y-auto">
-                  {userDetails.loan_history.map((loan, index) => (
-                    <div key={index} className="mb-2 p-2 bg-gray-50 rounded">
+                <p>Wszystkie wypożyczenia: {userDetails.loan_stats.total_loans}</p>
+                <p>Aktywne: {userDetails.loan_stats.active_loans}</p>
+                <p>Przeterminowane: {userDetails.loan_stats.overdue_loans}</p>
+                <p>
+                  Ostatnia aktywność:{' '}
+                  {userDetails.loan_stats.last_activity
+                    ? new Date(userDetails.loan_stats.last_activity).toLocaleDateString()
+                    : 'brak'}
+                </p>
+                <div className="max-h-40 overflow-y-auto mt-2">
+                  {userLoans.map(loan => (
+                    <div key={loan.id} className="mb-2 p-2 bg-gray-50 rounded">
                       <p>Książka: {loan.book_title}</p>
                       <p>Data: {new Date(loan.loan_date).toLocaleDateString()}</p>
                       <p>Status: {loan.status}</p>
                     </div>
                   ))}
+                  {loansCursor && (
+                    <button
+                      onClick={handleMoreLoans}
+                      className="w-full px-4 py-2 bg-gray-200 rounded hover:bg-gray-300"
+                    >
+                      Załaduj więcej
+                    </button>
+                  )}
                 </div>
               </div>
             )}
@@ -113,6 +168,13 @@ const ManageUsers = () => {
   return (
     <div className="container mx-auto p-4">
       <h1 className="text-2xl font-bold mb-4">Zarządzanie Użytkownikami</h1>
+      <input
+        type="text"
+        placeholder="Szukaj po nazwie użytkownika lub emailu..."
+        value={search}
+        onChange={(e) => setSearch(e.target.value)}
+        className="w-full p-2 border rounded mb-4"
+      />
       <div className="grid gap-4">
         {users.map(user => (
           <div key={user.id} className="border p-4 rounded shadow">
@@ -160,6 +222,23 @@ const ManageUsers = () => {
           </div>
         ))}
       </div>
+      <div className="mt-6 flex justify-center gap-4">
+        <button
+          onClick={() => setCurrentPage(p => Math.max(1, p - 1))}
+          disabled={currentPage === 1}
+          className="px-4 py-2 bg-gray-200 rounded disabled:opacity-50"
+        >
+          Poprzednia
+        </button>
+        <span className="px-4 py-2">Strona {currentPage}</span>
+        <button
+          onClick={() => setCurrentPage(p => p + 1)}
+          disabled={!hasNext}
+          className="px-4 py-2 bg-gray-200 rounded disabled:opacity-50"
+        >
+          Następna
+        </button>
+      </div>
       {showModal && <UserDetailsModal />}
     </div>
   );
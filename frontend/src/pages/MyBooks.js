@@ -10,44 +10,65 @@ const MyBooks = () => {
   const [reservationError, setReservationError] = useState('');
   const [historyError, setHistoryError] = useState('');
   const [loanHistory, setLoanHistory] = useState([]);
+  const [showArchived, setShowArchived] = useState(false);
   const [activeTab, setActiveTab] = useState('loans');
   const [success, setSuccess] = useState('');
   const [reservations, setReservations] = useState([]);
+  const [waitlist, setWaitlist] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
 
-  const fetchLoans = async () => {
+  // One request for every panel; after our own changes skip the browser's
+  // short-lived copy so the list reflects them straight away
+  const fetchLibrary = async ({ fresh = false, includeArchived = showArchived } = {}) => {
     try {
-      const response = await api.get('/api/loans/active');
-      setLoans(response.data);
+      const response = await api.get('/api/me/library', {
+        params: includeArchived ? { include_archived: true } : {},
+        headers: fresh ? { 'Cache-Control': 'no-cache' } : {}
+      });
+      setLoans(response.data.active_loans);
+      setReservations(response.data.reservations);
+      setWaitlist(response.data.waitlist);
+      setLoanHistory(response.data.loan_history.loans);
+      setHistoryCursor(response.data.loan_history.next_cursor);
       setError('');
+      setReservationError('');
+      setHistoryError('');
     } catch (err) {
       setError('Nie udało się pobrać wypożyczeń');
     }
   };
 
-  const fetchReservations = async () => {
-    setLoadingReservations(true);
+  const fetchMoreHistory = async () => {
     try {
-      const response = await api.get('/api/reservations/user');
-      setReservations(response.data);
-      setReservationError('');
+      const response = await api.get('/api/me/library', {
+        params: {
+          cursor: historyCursor,
+          ...(showArchived ? { include_archived: true } : {})
+        }
+      });
+      setLoanHistory(prev => [...prev, ...response.data.loan_history.loans]);
+      setHistoryCursor(response.data.loan_history.next_cursor);
+      setHistoryError('');
     } catch (err) {
-      setReservationError('Nie udało się pobrać rezerwacji');
-      console.error('Error fetching reservations:', err);
-    } finally {
-      setLoadingReservations(false);
+      setHistoryError('Nie udało się pobrać historii wypożyczeń');
     }
   };
 
-  const fetchLoanHistory = async () => {
+  const showArchivedHistory = async () => {
+    setShowArchived(true);
     setLoadingHistory(true);
+    await fetchLibrary({ includeArchived: true });
+    setLoadingHistory(false);
+  };
+
+  const handleLeaveWaitlist = async (entryId) => {
     try {
-      const response = await api.get('/api/loans/history');
-      setLoanHistory(response.data);
-      setHistoryError('');
+      await api.delete(`/api/waitlist/${entryId}`);
+      setSuccess('Opuszczono kolejkę oczekujących');
+      await fetchLibrary({ fresh: true });
+      setTimeout(() => setSuccess(''), 3000);
     } catch (err) {
-      setHistoryError('Nie udało się pobrać historii wypożyczeń');
-    } finally {
-      setLoadingHistory(false);
+      setReservationError('Nie udało się opuścić kolejki');
     }
   };
 
@@ -55,7 +76,9 @@ const MyBooks = () => {
     try {
       await api.delete(`/api/reservations/${reservationId}`);
       setSuccess('Rezerwacja została anulowana');
-      await fetchReservations();
+      setLoadingReservations(true);
+      await fetchLibrary({ fresh: true });
+      setLoadingReservations(false);
       setTimeout(() => setSuccess(''), 3000);
     } catch (err) {
       setReservationError('Nie udało się anulować rezerwacji');
@@ -66,11 +89,7 @@ const MyBooks = () => {
   useEffect(() => {
     const fetchData = async () => {
       setLoading(true);
-      await Promise.all([
-        fetchLoans(),
-        fetchReservations(),
-        fetchLoanHistory()
-      ]);
+      await fetchLibrary();
       setLoading(false);
     };
     
@@ -128,7 +147,8 @@ const MyBooks = () => {
                 <p className="text-sm text-gray-500">Status: {
                   reservation.status === 'pending' ? 'Oczekująca' :
                   reservation.status === 'approved' ? 'Zatwierdzona' :
-                  reservation.status === 'rejected' ? 'Odrzucona' : 'Anulowana'
+                  reservation.status === 'rejected' ? 'Odrzucona' :
+                  reservation.status === 'expired' ? 'Wygasła' : 'Anulowana'
                 }</p>
               </div>
             ))}
@@ -136,8 +156,47 @@ const MyBooks = () => {
         )}
       </div>
 
+      {waitlist.length > 0 && (
+        <div className="mb-6">
+          <h2 className="text-xl font-semibold mb-4">Kolejka Oczekujących</h2>
+          <div className="space-y-4">
+            {waitlist.map(entry => (
+              <div key={entry.id} className="border rounded-lg p-4 shadow-sm">
+                <h3 className="text-lg font-semibold">{entry.book_title}</h3>
+                <p className="text-sm text-gray-500">
+                  Termin: {new Date(entry.start_date).toLocaleDateString()} - {new Date(entry.end_date).toLocaleDateString()}
+                </p>
+                {entry.status === 'waiting' ? (
+                  <div className="flex justify-between items-center mt-2">
+                    <p className="text-sm text-gray-500">Pozycja w kolejce: {entry.position}</p>
+                    <button
+                      onClick={() => handleLeaveWaitlist(entry.id)}
+                      className="bg-red-500 text-white px-4 py-1 rounded hover:bg-red-600"
+                    >
+                      Opuść kolejkę
+                    </button>
+                  </div>
+                ) : (
+                  <p className="text-sm text-green-600 mt-2">Termin się zwolnił - rezerwacja została utworzona</p>
+                )}
+              </div>
+            ))}
+          </div>
+        </div>
+      )}
+
       <div>
-        <h2 className="text-xl font-semibold mb-4">Historia Wypożyczeń</h2>
+        <div className="flex justify-between items-center mb-4">
+          <h2 className="text-xl font-semibold">Historia Wypożyczeń</h2>
+          {!showArchived && (
+            <button
+              onClick={showArchivedHistory}
+              className="text-sm text-blue-600 hover:underline"
+            >
+              Pokaż starsze wypożyczenia
+            </button>
+          )}
+        </div>
         {loadingHistory ? (
           <div>Ładowanie...</div>
         ) : historyError ? (
@@ -154,6 +213,14 @@ const MyBooks = () => {
                 <p className="text-sm text-gray-500">Zwrócono: {new Date(item.return_date).toLocaleDateString()}</p>
               </div>
             ))}
+            {historyCursor && (
+              <button
+                onClick={fetchMoreHistory}
+                className="w-full px-4 py-2 bg-gray-200 rounded hover:bg-gray-300"
+              >
+                Załaduj więcej
+              </button>
+            )}
           </div>
         )}
       </div>
@@ -21,6 +21,7 @@ const ReserveBook = () => {
   const [userReservations, setUserReservations] = useState([]);
   const [reservationDates, setReservationDates] = useState({});
   const [dateErrors, setDateErrors] = useState({});
+  const [waitlistOffers, setWaitlistOffers] = useState({});
   const navigate = useNavigate();
   const { user } = useAuth();
 
@@ -45,10 +46,12 @@ const ReserveBook = () => {
     }
   }, [searchTitle, searchAuthor, currentPage]);
 
-  const fetchUserReservations = async () => {
+  const fetchUserReservations = async (fresh = false) => {
     try {
-      const response = await api.get('/api/reservations/user');
-      setUserReservations(response.data);
+      const response = await api.get('/api/me/library', {
+        headers: fresh ? { 'Cache-Control': 'no-cache' } : {}
+      });
+      setUserReservations(response.data.reservations);
     } catch (err) {
       console.error('Nie udało się pobrać rezerwacji użytkownika:', err);
     }
@@ -77,7 +80,7 @@ const ReserveBook = () => {
     await fetchExistingReservations(book.id);
   };
 
-  const handleReserve = async (bookId) => {
+  const handleReserve = async (bookId, waitlist = false) => {
     const dates = reservationDates[bookId];
     if (!dates || !dates.start_date || !dates.end_date) {
       setError('Proszę wybrać daty rezerwacji');
@@ -95,15 +98,16 @@ const ReserveBook = () => {
       end.setHours(12, 0, 0, 0);
 
       // Validate dates one more time before submitting
-      if (!isValidReservation(bookId)) {
+      if (!waitlist && !isValidReservation(bookId)) {
         setError('Wybrane daty są nieprawidłowe');
         return;
       }
 
-      await api.post('/api/reservations', {
+      const response = await api.post('/api/reservations', {
         book_id: bookId,
         start_date: start.toISOString().split('T')[0],
-        end_date: end.toISOString().split('T')[0]
+        end_date: end.toISOString().split('T')[0],
+        waitlist
       });
 
       // Clear the dates for this book
@@ -113,12 +117,15 @@ const ReserveBook = () => {
         return newDates;
       });
 
-      setSuccess('Rezerwacja została utworzona pomyślnie');
+      setWaitlistOffers(prev => ({ ...prev, [bookId]: false }));
+      setSuccess(response.status === 202
+        ? `Dodano do kolejki oczekujących (pozycja ${response.data.position}). Rezerwacja zostanie utworzona automatycznie, gdy termin się zwolni.`
+        : 'Rezerwacja została utworzona pomyślnie');
       
       // Refresh the list of available books and user reservations
       await Promise.all([
         fetchBooks(),
-        fetchUserReservations()
+        fetchUserReservations(true)
       ]);
 
       // Navigate to my-books page after a short delay
@@ -128,6 +135,9 @@ const ReserveBook = () => {
     } catch (err) {
       console.error('Error creating reservation:', err);
       setError(err.response?.data?.error || 'Nie udało się utworzyć rezerwacji');
+      if (err.response?.data?.can_waitlist) {
+        setWaitlistOffers(prev => ({ ...prev, [bookId]: true }));
+      }
       // Clear success message if there was an error
       setSuccess('');
     }
@@ -280,6 +290,15 @@ const ReserveBook = () => {
                 >
                   Zarezerwuj
                 </button>
+
+                {waitlistOffers[book.id] && (
+                  <button
+                    onClick={() => handleReserve(book.id, true)}
+                    className="w-full mt-2 py-2 px-4 rounded bg-yellow-500 text-white hover:bg-yellow-600"
+                  >
+                    Dołącz do kolejki oczekujących
+                  </button>
+                )}
               </div>
             </div>
           ))}